@@ -5,69 +5,46 @@
 """
 
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    generate_latest,
+    multiprocess,
+)
+from metrics import MetricsMiddleware
 from routes.home import home_route
 from routes.user import user_route
 from routes.event import event_router
 from routes.balance import balance_of_user_route
 from routes.ml import ml_router
 from routes.history_of_ml_transaction import history_router
-from database.create_tables import init_db, engine
+from database.create_tables import engine
 from database.config import get_settings
-from models.user import MLModel
-from sqlmodel import Session, select
-import uvicorn
+from database.routing import LAST_WRITE_HEADER, ReadYourWritesMiddleware
+from database.migrations import bootstrap, verify_schema
+from startup_profile import timed_step
+from maintenance import maintenance_loop
+from task_state import TASK_STATE_FANOUT, task_state_feed
+import asyncio
 import logging
 import os
 
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
-DEFAULT_OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "gemma3:1b")
-LEGACY_MODEL_NAMES = {"gemma3:270M-F16"}
-
-
-def create_default_ml_model():
-    """Создаёт ML-модель по умолчанию, если она не существует."""
-    with Session(engine) as session:
-        existing = session.exec(
-            select(MLModel).where(MLModel.name == DEFAULT_OLLAMA_MODEL)
-        ).first()
-        if not existing:
-            legacy_model = session.exec(
-                select(MLModel).where(MLModel.name.in_(LEGACY_MODEL_NAMES))
-            ).first()
-            if legacy_model:
-                legacy_model.name = DEFAULT_OLLAMA_MODEL
-                legacy_model.file_path = f"/models/{DEFAULT_OLLAMA_MODEL}"
-                session.add(legacy_model)
-                session.commit()
-                logger.info(
-                    "Legacy ML model renamed to default model: %s",
-                    DEFAULT_OLLAMA_MODEL,
-                )
-            else:
-                ml_model = MLModel(
-                    name=DEFAULT_OLLAMA_MODEL,
-                    version="1.0.0",
-                    description="Default ML model for text processing",
-                    file_path=f"/models/{DEFAULT_OLLAMA_MODEL}",
-                    user_id=1  # системный пользователь
-                )
-                session.add(ml_model)
-                session.commit()
-                logger.info("Default ML model created: %s", DEFAULT_OLLAMA_MODEL)
-        else:
-            logger.info("ML model already exists: %s", DEFAULT_OLLAMA_MODEL)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Контекстный менеджер жизненного цикла приложения.
     
-    Выполняет инициализацию базы данных при запуске приложения
-    и корректное завершение работы при остановке.
+    Проверяет при запуске, что схема БД подготовлена командой
+    `python -m database.migrations upgrade` (DDL здесь не выполняется),
+    запускает приём изменений состояния задач от других процессов
+    (TASK_STATE_FANOUT) и периодическую очистку данных задач
+    (maintenance.py), корректно завершает работу при остановке.
     
     Args:
         app: Экземпляр FastAPI приложения.
@@ -76,22 +53,39 @@ async def lifespan(app: FastAPI):
         None: Контроль передаётся основному приложению.
     
     Raises:
-        Exception: Если инициализация базы данных не удалась.
+        SchemaVersionError: Если миграции схемы БД не применены.
     """
     try:
-        logger.info("Initializing database...")
-        init_db()
-        logger.info("Creating default ML model...")
-        create_default_ml_model()
+        with timed_step("verify_schema"):
+            version = verify_schema(engine)
+        logger.info(f"Database schema version {version}")
+        if TASK_STATE_FANOUT:
+            task_state_feed.start(asyncio.get_running_loop())
+        maintenance_loop.start()
         logger.info("Application startup completed successfully")
         yield
     except Exception as e:
         logger.error(f"Startup failed: {str(e)}")
         raise
     finally:
+        await maintenance_loop.stop()
+        task_state_feed.stop()
         logger.info("Application shutting down...")
 
 
+async def metrics_endpoint(request: Request) -> Response:
+    """Отдаёт метрики в формате Prometheus.
+
+    При запуске нескольких воркеров (serve.py) метрики всех процессов
+    собираются из PROMETHEUS_MULTIPROC_DIR, иначе — метрики процесса.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 def create_application() -> FastAPI:
     """Создаёт и настраивает FastAPI приложение.
     
@@ -117,7 +111,11 @@ def create_application() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=[LAST_WRITE_HEADER],
     )
+    app.add_middleware(ReadYourWritesMiddleware)
+    app.add_middleware(MetricsMiddleware)
+    app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
 
     # Register routes
     app.include_router(home_route, tags=['Home'])
@@ -138,11 +136,16 @@ def create_application() -> FastAPI:
     return app
 
 
-app = create_application()
+with timed_step("create_application"):
+    app = create_application()
 
 
 if __name__ == '__main__':
+    # Сервер для разработки; в production — serve.py
+    import uvicorn
+
     logging.basicConfig(level=logging.DEBUG)
+    bootstrap(engine)
     uvicorn.run(
         'api:app',
         host='0.0.0.0',
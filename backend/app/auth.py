@@ -6,8 +6,8 @@
 
 from datetime import datetime, timedelta
 from typing import Optional
+import secrets
 
-import bcrypt
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
@@ -31,6 +31,9 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     Returns:
         bool: True если пароль совпадает с хешем, иначе False.
     """
+    # bcrypt нужен только при входе и регистрации: импорт не замедляет старт
+    import bcrypt
+
     return bcrypt.checkpw(
         plain_password.encode('utf-8'),
         hashed_password.encode('utf-8')
@@ -46,6 +49,8 @@ def get_password_hash(password: str) -> str:
     Returns:
         str: Хешированный пароль.
     """
+    import bcrypt
+
     salt = bcrypt.gensalt()
     hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
     return hashed.decode('utf-8')
@@ -167,3 +172,54 @@ async def get_current_active_user(
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
+
+
+async def get_current_user_or_worker(
+    token: str = Depends(oauth2_scheme),
+    session: Session = Depends(get_session)
+) -> Optional[User]:
+    """Допускает активного пользователя или ML-воркер.
+
+    Воркер передаёт в заголовке Authorization служебный токен
+    WORKER_API_TOKEN вместо JWT пользователя.
+
+    Args:
+        token: JWT пользователя или служебный токен воркера.
+        session: Сессия базы данных.
+
+    Returns:
+        Optional[User]: Пользователь; None для запроса воркера.
+
+    Raises:
+        HTTPException: Если токен не принадлежит ни воркеру, ни
+            активному пользователю.
+    """
+    if _is_worker_token(token):
+        return None
+    user = await get_current_user(token, session)
+    return await get_current_active_user(user)
+
+
+async def verify_worker_token(token: str = Depends(oauth2_scheme)) -> None:
+    """Допускает только ML-воркер со служебным токеном WORKER_API_TOKEN.
+
+    Args:
+        token: Токен из заголовка Authorization.
+
+    Raises:
+        HTTPException: Если токен не задан в настройках или не совпадает.
+    """
+    if not _is_worker_token(token):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid worker token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+def _is_worker_token(token: str) -> bool:
+    """Совпадает ли токен со служебным токеном воркера (если он задан)."""
+    worker_token = settings.WORKER_API_TOKEN
+    return bool(worker_token) and secrets.compare_digest(
+        token.encode(), worker_token.encode()
+    )
@@ -1,10 +1,12 @@
 """Пакет инициализации слоя базы данных приложения.
 
-Реэкспортирует движок, фабрику сессий и функцию первичной инициализации таблиц.
+Реэкспортирует движок, фабрики сессий (основной базы и чтения с реплики)
+и функцию первичной инициализации таблиц.
 """
 
 # Инициализация базы данных
 from .create_tables import engine, get_session, init_db
+from .routing import get_read_session
 
 # Весь испорт при app.database import *
-__all__ = ["engine", "get_session", "init_db"]
+__all__ = ["engine", "get_session", "get_read_session", "init_db"]
@@ -6,7 +6,7 @@
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from functools import lru_cache
-from typing import Optional
+from typing import Literal, Optional, Union
 
 
 class Settings(BaseSettings):
@@ -21,6 +21,13 @@ class Settings(BaseSettings):
         DB_USER: Имя пользователя базы данных.
         DB_PASS: Пароль пользователя базы данных.
         DB_NAME: Название базы данных.
+        DB_POOL_SIZE: Постоянные соединения в пуле одного процесса.
+        DB_MAX_OVERFLOW: Дополнительные соединения сверх пула при пиках.
+        DB_POOL_TIMEOUT: Ожидание свободного соединения в секундах.
+        DB_POOL_PRE_PING: Проверять соединение перед выдачей из пула.
+        DB_POOL_RECYCLE: Максимальный возраст соединения в секундах.
+        DB_STATEMENT_TIMEOUT_MS: Таймаут SQL-запроса в PostgreSQL (0 — без него).
+        DB_ECHO: Логирование SQL: false, true или debug (с результатами).
         APP_NAME: Название приложения.
         DEBUG: Режим отладки.
         API_VERSION: Версия API.
@@ -28,6 +35,8 @@ class Settings(BaseSettings):
         SECRET_KEY: Секретный ключ для JWT.
         ALGORITHM: Алгоритм шифрования JWT.
         ACCESS_TOKEN_EXPIRE_MINUTES: Время жизни токена в минутах.
+        WORKER_API_TOKEN: Токен ML-воркера для служебных эндпоинтов
+            (None — доступ только пользователям).
     """
     
     # DataBase setting
@@ -37,6 +46,16 @@ class Settings(BaseSettings):
     DB_PASS: Optional[str] = None
     DB_NAME: Optional[str] = None
 
+    # Connection pool settings (на каждый процесс uvicorn: суммарно
+    # workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) < max_connections Postgres)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_PRE_PING: bool = True
+    DB_POOL_RECYCLE: int = 1800
+    DB_STATEMENT_TIMEOUT_MS: int = 0
+    DB_ECHO: Union[bool, Literal["debug"]] = False
+
     # Application settings
     APP_NAME: Optional[str] = None
     DEBUG: Optional[bool] = None
@@ -48,6 +67,9 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
 
+    # Service settings
+    WORKER_API_TOKEN: Optional[str] = None
+
     @property
     def DATABASE_URL_asyncpg(self):
         """Возвращает URL для подключения к БД через asyncpg.
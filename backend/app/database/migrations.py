@@ -0,0 +1,334 @@
+"""Версионные миграции схемы БД и начальные данные.
+
+Схема готовится отдельной командой до запуска процессов API:
+
+    python -m database.migrations upgrade   # миграции и модель по умолчанию
+    python -m database.migrations current   # текущая и ожидаемая версии
+
+Процессы API при старте только сверяют версию схемы (verify_schema),
+поэтому новые реплики готовы к работе без DDL и не состязаются за него.
+
+Номер применённой версии хранится в таблице schema_version. Миграции
+и создание модели по умолчанию выполняются в одной транзакции под
+advisory-блокировкой PostgreSQL: при одновременном запуске нескольких
+реплик их применяет одна, остальные дожидаются её и видят актуальную
+версию и уже созданную модель.
+
+Первая миграция создаёт недостающие таблицы по текущим моделям, поэтому
+на новой БД последующие миграции находят свои изменения уже сделанными
+и обязаны быть идемпотентными (см. _add_missing_columns).
+"""
+
+from dataclasses import dataclass
+from typing import Callable
+from sqlalchemy import Column, Integer, MetaData, Table, inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlmodel import Session, SQLModel, select
+from models.user import MLModel, MLPredictionHistory, SentenceCorrection
+# Все модули с таблицами: create_all и связи моделей (User.events)
+# должны видеть их и при запуске команды отдельно от API
+import models.event  # noqa: F401
+import argparse
+import logging
+import os
+import sys
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "gemma3:1b")
+LEGACY_MODEL_NAMES = {"gemma3:270M-F16"}
+# Инструкции передаёт воркер в неизменном системном промпте; шаблон
+# только обрамляет текст, чтобы общий префикс запросов не менялся
+DEFAULT_PROMPT_TEMPLATE = "Текст: {text}\n\nИсправленный текст:"
+DEFAULT_GENERATION_OPTIONS = {
+    "temperature": 0,
+    "num_ctx": 2048,
+    "stop": ["\n\n"],
+    # Исправленный текст примерно равен входу: бюджет токенов с запасом
+    "num_predict_ratio": 1.5,
+    "num_predict_min": 16,
+    "num_predict_max": 512,
+}
+
+# Ключ pg_advisory_xact_lock, общий для всех процессов, применяющих миграции
+MIGRATION_LOCK_KEY = 0x6576_706C_616E  # "evplan"
+
+_version_metadata = MetaData()
+schema_version = Table(
+    "schema_version",
+    _version_metadata,
+    Column("version", Integer, nullable=False),
+)
+
+
+class SchemaVersionError(RuntimeError):
+    """Схема БД не соответствует версии, ожидаемой приложением."""
+
+
+@dataclass(frozen=True)
+class Migration:
+    """
+    Шаг изменения схемы.
+
+    Атрибуты:
+        version: Номер версии схемы после применения шага
+        description: Краткое описание изменения
+        apply: Функция, выполняющая изменение в переданном соединении
+    """
+    version: int
+    description: str
+    apply: Callable[[Connection], None]
+
+
+def _add_missing_columns(
+    connection: Connection, table: Table, names: list[str]
+) -> None:
+    """Добавляет в таблицу столбцы модели, которых ещё нет в БД."""
+    existing = {
+        column["name"] for column in inspect(connection).get_columns(table.name)
+    }
+    quote = connection.dialect.identifier_preparer.quote
+    for name in names:
+        if name in existing:
+            continue
+        column = table.c[name]
+        column_type = column.type.compile(dialect=connection.dialect)
+        connection.exec_driver_sql(
+            f"ALTER TABLE {quote(table.name)} "
+            f"ADD COLUMN {quote(column.name)} {column_type}"
+        )
+        logger.info(f"Column {table.name}.{name} added")
+
+
+def _create_tables(connection: Connection) -> None:
+    SQLModel.metadata.create_all(connection)
+
+
+def _add_prompt_settings(connection: Connection) -> None:
+    _add_missing_columns(
+        connection,
+        MLModel.__table__,
+        ["prompt_template", "generation_options"],
+    )
+
+
+def _add_inference_metrics(connection: Connection) -> None:
+    _add_missing_columns(
+        connection,
+        MLPredictionHistory.__table__,
+        [
+            "total_duration",
+            "load_duration",
+            "prompt_eval_count",
+            "prompt_eval_duration",
+            "eval_count",
+            "eval_duration",
+        ],
+    )
+
+
+def _scope_sentence_cache(connection: Connection) -> None:
+    # Кэш без владельца записей нельзя дополнить: исправления из него
+    # не восстанавливаются и просто пересоздаются при следующих запросах
+    table = SentenceCorrection.__table__
+    columns = {
+        column["name"] for column in inspect(connection).get_columns(table.name)
+    }
+    if "user_id" in columns:
+        return
+    table.drop(connection)
+    table.create(connection)
+    logger.info(f"Table {table.name} recreated with per-user scope")
+
+
+def _backfill_default_model_settings(connection: Connection) -> None:
+    # Миграция 2 добавила столбцы, но модель по умолчанию, созданная
+    # до неё, осталась без шаблона и параметров генерации
+    table = MLModel.__table__
+    for name, value in (
+        ("prompt_template", DEFAULT_PROMPT_TEMPLATE),
+        ("generation_options", DEFAULT_GENERATION_OPTIONS),
+    ):
+        updated = connection.execute(
+            table.update()
+            .where(
+                table.c.name.in_({DEFAULT_OLLAMA_MODEL} | LEGACY_MODEL_NAMES),
+                table.c[name].is_(None),
+            )
+            .values({name: value})
+        ).rowcount
+        if updated:
+            logger.info(f"Default {name} set for {updated} model(s)")
+
+
+MIGRATIONS = [
+    Migration(1, "create tables", _create_tables),
+    Migration(2, "prompt template and generation options per model",
+              _add_prompt_settings),
+    Migration(3, "Ollama timing metrics per prediction", _add_inference_metrics),
+    Migration(4, "per-user sentence correction cache with expiry",
+              _scope_sentence_cache),
+    Migration(5, "prompt settings for the existing default model",
+              _backfill_default_model_settings),
+]
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def current_version(connection: Connection) -> int:
+    """
+    Возвращает версию схемы БД.
+
+    Args:
+        connection: Соединение с БД
+
+    Returns:
+        int: Номер последней применённой миграции; 0 для БД без
+            таблицы schema_version (новой или созданной до миграций)
+    """
+    if not inspect(connection).has_table(schema_version.name):
+        return 0
+    version = connection.execute(select(schema_version.c.version)).scalar()
+    return version or 0
+
+
+def upgrade(engine: Engine, seed: bool = False) -> int:
+    """
+    Применяет недостающие миграции.
+
+    Args:
+        engine: Движок базы данных
+        seed: Создать также модель по умолчанию (в той же транзакции)
+
+    Returns:
+        int: Версия схемы после применения
+    """
+    with engine.begin() as connection:
+        if connection.dialect.name == "postgresql":
+            # Блокировка снимается вместе с завершением транзакции
+            connection.execute(
+                text("SELECT pg_advisory_xact_lock(:key)"),
+                {"key": MIGRATION_LOCK_KEY},
+            )
+        _version_metadata.create_all(connection)
+        version = current_version(connection)
+        for migration in MIGRATIONS:
+            if migration.version <= version:
+                continue
+            logger.info(
+                f"Applying migration {migration.version}: {migration.description}"
+            )
+            migration.apply(connection)
+            version = migration.version
+
+        connection.execute(schema_version.delete())
+        connection.execute(schema_version.insert().values(version=version))
+        if seed:
+            create_default_ml_model(connection)
+    return version
+
+
+def create_default_ml_model(connection: Connection) -> None:
+    """
+    Создаёт ML-модель по умолчанию, если она не существует.
+
+    Args:
+        connection: Соединение в транзакции миграций; изменения
+            фиксируются вместе с ней
+    """
+    with Session(bind=connection) as session:
+        existing = session.exec(
+            select(MLModel).where(MLModel.name == DEFAULT_OLLAMA_MODEL)
+        ).first()
+        if not existing:
+            legacy_model = session.exec(
+                select(MLModel).where(MLModel.name.in_(LEGACY_MODEL_NAMES))
+            ).first()
+            if legacy_model:
+                legacy_model.name = DEFAULT_OLLAMA_MODEL
+                legacy_model.file_path = f"/models/{DEFAULT_OLLAMA_MODEL}"
+                session.add(legacy_model)
+                session.commit()
+                logger.info(
+                    "Legacy ML model renamed to default model: %s",
+                    DEFAULT_OLLAMA_MODEL,
+                )
+            else:
+                ml_model = MLModel(
+                    name=DEFAULT_OLLAMA_MODEL,
+                    version="1.0.0",
+                    description="Default ML model for text processing",
+                    prompt_template=DEFAULT_PROMPT_TEMPLATE,
+                    generation_options=DEFAULT_GENERATION_OPTIONS,
+                    file_path=f"/models/{DEFAULT_OLLAMA_MODEL}",
+                    user_id=1  # системный пользователь
+                )
+                session.add(ml_model)
+                session.commit()
+                logger.info("Default ML model created: %s", DEFAULT_OLLAMA_MODEL)
+        else:
+            logger.info("ML model already exists: %s", DEFAULT_OLLAMA_MODEL)
+
+
+def bootstrap(engine: Engine) -> int:
+    """
+    Готовит БД к работе: миграции и модель по умолчанию.
+
+    Args:
+        engine: Движок базы данных
+
+    Returns:
+        int: Версия схемы после применения миграций
+    """
+    return upgrade(engine, seed=True)
+
+
+def verify_schema(engine: Engine) -> int:
+    """
+    Проверяет, что схема БД подготовлена для этой версии приложения.
+
+    Args:
+        engine: Движок базы данных
+
+    Returns:
+        int: Версия схемы БД
+
+    Raises:
+        SchemaVersionError: Если миграции не применены
+    """
+    with engine.connect() as connection:
+        version = current_version(connection)
+    if version < LATEST_VERSION:
+        raise SchemaVersionError(
+            f"Database schema version {version}, expected {LATEST_VERSION}: "
+            "run `python -m database.migrations upgrade`"
+        )
+    if version > LATEST_VERSION:
+        # Схему уже обновила более новая версия приложения (например,
+        # при откате релиза): миграции только добавляют, работать можно
+        logger.warning(
+            f"Database schema version {version} is newer than {LATEST_VERSION}"
+        )
+    return version
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Database schema migrations")
+    parser.add_argument(
+        "command", choices=["upgrade", "current"], nargs="?", default="upgrade"
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    from database.create_tables import engine
+
+    if args.command == "current":
+        with engine.connect() as connection:
+            print(f"{current_version(connection)} (latest {LATEST_VERSION})")
+        return 0
+    version = bootstrap(engine)
+    logger.info(f"Database schema is at version {version}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""Маршрутизация сессий БД между основной базой и репликой чтения.
+
+Эндпоинты, которые только читают данные пользователя, получают сессию
+через get_read_session: она открывается на реплике (DATABASE_REPLICA_URL),
+а основная база остаётся для списаний, пополнений и записи результатов.
+Без DATABASE_REPLICA_URL все сессии открываются на основной базе.
+
+Реплика отстаёт от основной базы, поэтому вызывающий, который только что
+что-то изменил, в течение READ_YOUR_WRITES_SECONDS читает из основной базы
+и видит свои изменения. Запись учитывается двумя способами:
+- в памяти процесса по токену авторизации (ReadYourWritesMiddleware);
+- по заголовку X-Last-Write: его ответ на изменяющий запрос возвращает
+  клиенту, а клиент передаёт в следующих запросах, — так окно действует
+  и в других процессах API.
+"""
+
+from typing import Generator, Mapping, Optional
+from fastapi import Request
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, create_engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from database.config import get_settings
+from database.create_tables import engine, engine_options
+from metrics import instrument_engine
+import hashlib
+import os
+import threading
+import time
+
+REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+LAST_WRITE_HEADER = "X-Last-Write"
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+replica_engine: Optional[Engine] = (
+    create_engine(REPLICA_URL, **engine_options(get_settings(), REPLICA_URL))
+    if REPLICA_URL else None
+)
+if replica_engine is not None:
+    instrument_engine(replica_engine, "replica")
+
+
+class WriteTracker:
+    """
+    Время последней записи по вызывающим в пределах окна.
+
+    Записи старше окна удаляются при каждой отметке, поэтому
+    словарь ограничен числом недавно писавших вызывающих.
+    """
+
+    def __init__(self, window: float = READ_YOUR_WRITES_SECONDS):
+        self.window = window
+        self._deadlines: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def mark(self, key: str) -> None:
+        """Отмечает запись вызывающего."""
+        now = time.monotonic()
+        with self._lock:
+            self._deadlines = {
+                caller: deadline
+                for caller, deadline in self._deadlines.items()
+                if deadline > now
+            }
+            self._deadlines[key] = now + self.window
+
+    def recent(self, key: str) -> bool:
+        """Писал ли вызывающий в пределах окна."""
+        with self._lock:
+            return self._deadlines.get(key, 0.0) > time.monotonic()
+
+
+recent_writes = WriteTracker()
+
+
+def caller_key(authorization: Optional[str]) -> Optional[str]:
+    """Ключ вызывающего: хеш заголовка Authorization (сам токен не хранится)."""
+    if not authorization:
+        return None
+    return hashlib.sha256(authorization.encode("utf-8")).hexdigest()
+
+
+def wrote_recently(headers: Mapping[str, str]) -> bool:
+    """
+    Проверяет, изменял ли вызывающий данные в пределах окна.
+
+    Args:
+        headers: Заголовки запроса
+
+    Returns:
+        bool: True, если запись отмечена в этом процессе или клиент
+            передал недавнее время записи в X-Last-Write
+    """
+    key = caller_key(headers.get("authorization"))
+    if key and recent_writes.recent(key):
+        return True
+    try:
+        last_write = float(headers.get(LAST_WRITE_HEADER, ""))
+    except ValueError:
+        return False
+    return time.time() - last_write < recent_writes.window
+
+
+def read_engine(headers: Mapping[str, str]) -> Engine:
+    """Выбирает движок для чтения: реплику или основную базу."""
+    if replica_engine is None or wrote_recently(headers):
+        return engine
+    return replica_engine
+
+
+def get_read_session(request: Request) -> Generator[Session, None, None]:
+    """Зависимость FastAPI: сессия для эндпоинтов, которые только читают.
+
+    Args:
+        request: Текущий запрос (для проверки недавней записи).
+
+    Yields:
+        Session: Сессия на реплике или, для недавно писавших, на основной базе.
+    """
+    with Session(read_engine(request.headers)) as session:
+        yield session
+
+
+class ReadYourWritesMiddleware:
+    """
+    ASGI-middleware, отмечающее успешные изменяющие запросы.
+
+    После успешного POST/PUT/PATCH/DELETE вызывающий отмечается в
+    recent_writes, а в ответ добавляется заголовок X-Last-Write
+    со временем записи (Unix-время в секундах).
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                headers = dict(
+                    (name.decode("latin-1"), value.decode("latin-1"))
+                    for name, value in scope["headers"]
+                )
+                key = caller_key(headers.get("authorization"))
+                if key:
+                    recent_writes.mark(key)
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(
+                    LAST_WRITE_HEADER.lower().encode("latin-1"),
+                    f"{time.time():.3f}".encode("latin-1"),
+                )]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,174 @@
+"""Проверки готовности API к обслуживанию запросов.
+
+Готовность (/health/ready) проверяет зависимости, без которых запросы
+предсказаний не выполнить: получение соединения из пула БД с `SELECT 1`
+и доступность RabbitMQ с глубиной очередей задач (общей и очередей
+моделей HEALTH_QUEUE_MODELS).
+Каждая проверка ограничена коротким таймаутом, а результат кэшируется
+на HEALTH_CACHE_TTL секунд, поэтому частый опрос оркестратором
+не создаёт нагрузки на зависимости.
+
+Живость (/health/live) зависимости не проверяет: перезапуск процесса
+не исправит недоступную базу.
+"""
+
+from dataclasses import dataclass, field, asdict
+from typing import Callable, Optional
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from metrics import DEPENDENCY_CHECK_DURATION, DEPENDENCY_UP
+from task_queue import DEFAULT_QUEUE, QueueInspector, model_queue_name
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+HEALTH_CHECK_TIMEOUT = float(os.getenv("HEALTH_CHECK_TIMEOUT", "2"))  # seconds
+HEALTH_CACHE_TTL = float(os.getenv("HEALTH_CACHE_TTL", "5"))  # seconds
+# Глубина очереди, выше которой API считается перегруженным (0 — не проверять)
+HEALTH_MAX_QUEUE_DEPTH = int(os.getenv("HEALTH_MAX_QUEUE_DEPTH", "1000"))
+# Модели, очереди которых проверяются наряду с общей (через запятую)
+HEALTH_QUEUE_MODELS = [
+    name.strip()
+    for name in os.getenv(
+        "HEALTH_QUEUE_MODELS", os.getenv("OLLAMA_MODEL", "gemma3:1b")
+    ).split(",")
+    if name.strip()
+]
+
+STATUS_OK = "ok"
+STATUS_DEGRADED = "degraded"  # работает, но с отклонениями; готовность не снимается
+STATUS_FAIL = "fail"
+
+
+@dataclass
+class CheckResult:
+    """
+    Результат проверки одной зависимости.
+
+    Атрибуты:
+        status: ok | degraded | fail
+        latency_ms: Длительность проверки
+        detail: Пояснение (ошибка или значение показателя)
+    """
+    status: str
+    latency_ms: float
+    detail: dict = field(default_factory=dict)
+
+
+@dataclass
+class HealthReport:
+    """Сводный результат проверок готовности."""
+    checks: dict[str, CheckResult]
+    checked_at: float
+
+    @property
+    def ready(self) -> bool:
+        return all(check.status != STATUS_FAIL for check in self.checks.values())
+
+    def to_dict(self) -> dict:
+        return {
+            "status": "ready" if self.ready else "not_ready",
+            "checked_at": self.checked_at,
+            "checks": {name: asdict(check) for name, check in self.checks.items()},
+        }
+
+
+async def run_check(
+    name: str, probe: Callable[[], dict], timeout: float = HEALTH_CHECK_TIMEOUT
+) -> CheckResult:
+    """
+    Выполняет блокирующую проверку в пуле потоков с таймаутом.
+
+    Args:
+        name: Имя зависимости (метка метрик)
+        probe: Функция проверки; возвращает detail, при сбое бросает исключение
+        timeout: Таймаут проверки в секундах
+
+    Returns:
+        CheckResult: Статус fail при исключении или превышении таймаута
+    """
+    started = time.perf_counter()
+    try:
+        detail = await asyncio.wait_for(asyncio.to_thread(probe), timeout)
+        status = detail.pop("status", STATUS_OK)
+    except asyncio.TimeoutError:
+        status, detail = STATUS_FAIL, {"error": f"timed out after {timeout}s"}
+    except Exception as e:
+        status, detail = STATUS_FAIL, {"error": str(e)}
+    duration = time.perf_counter() - started
+    if status == STATUS_FAIL:
+        logger.warning(f"Health check {name} failed: {detail['error']}")
+    DEPENDENCY_UP.labels(name).set(0 if status == STATUS_FAIL else 1)
+    DEPENDENCY_CHECK_DURATION.labels(name).set(duration)
+    return CheckResult(status, round(duration * 1000, 3), detail)
+
+
+def database_probe(engine: Engine) -> Callable[[], dict]:
+    """Проверка БД: соединение из пула и `SELECT 1`."""
+    def probe() -> dict:
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+        return {}
+    return probe
+
+
+def queue_probe(
+    inspector: QueueInspector,
+    models: list[str] = HEALTH_QUEUE_MODELS,
+    max_depth: int = HEALTH_MAX_QUEUE_DEPTH,
+) -> Callable[[], dict]:
+    """Проверка RabbitMQ: глубина общей очереди и очередей моделей."""
+    queues = [DEFAULT_QUEUE] + [model_queue_name(name) for name in models]
+
+    def probe() -> dict:
+        depths = inspector.queue_depths(queues)
+        present = [depth for depth in depths.values() if depth is not None]
+        detail = {"queue_depth": sum(present), "queues": depths}
+        if max_depth and any(depth > max_depth for depth in present):
+            # Воркеры не успевают: новые задачи будут ждать долго,
+            # но снятие API с балансировки очередь не разгрузит
+            detail["status"] = STATUS_DEGRADED
+        return detail
+    return probe
+
+
+class ReadinessChecker:
+    """
+    Кэширующий исполнитель проверок готовности.
+
+    Одновременные запросы при устаревшем кэше ждут одну общую проверку,
+    а не запускают свои.
+    """
+
+    def __init__(
+        self,
+        probes: dict[str, Callable[[], dict]],
+        ttl: float = HEALTH_CACHE_TTL,
+        timeout: float = HEALTH_CHECK_TIMEOUT,
+    ):
+        self.probes = probes
+        self.ttl = ttl
+        self.timeout = timeout
+        self._report: Optional[HealthReport] = None
+        self._expires_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def report(self) -> HealthReport:
+        """Возвращает результат проверок, выполняя их не чаще раза в ttl."""
+        async with self._lock:
+            if self._report is None or time.monotonic() >= self._expires_at:
+                results = await asyncio.gather(
+                    *(
+                        run_check(name, probe, self.timeout)
+                        for name, probe in self.probes.items()
+                    )
+                )
+                self._report = HealthReport(
+                    checks=dict(zip(self.probes, results)),
+                    checked_at=time.time(),
+                )
+                self._expires_at = time.monotonic() + self.ttl
+            return self._report
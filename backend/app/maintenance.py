@@ -0,0 +1,87 @@
+"""Периодическая очистка данных ML-задач.
+
+Каждые MAINTENANCE_INTERVAL секунд процесс API:
+
+- завершает ошибкой задачи, результат которых не пришёл за
+  PENDING_TASK_TIMEOUT (воркер потерял сообщение, задача удалена из
+  очереди), возвращает за них средства и удаляет записи их предложений;
+- удаляет записи предложений задач, которые уже не ожидают результата;
+- удаляет исправления из кэша предложений старше SENTENCE_CACHE_TTL_DAYS.
+
+Запросы к БД выполняются в пуле потоков, новые состояния задач
+записываются в хранилище и рассылаются другим процессам из цикла событий.
+"""
+
+from typing import Optional
+from sqlmodel import Session
+from database.create_tables import engine
+from routes.ml import (
+    _publish_task_state,
+    expire_stale_predictions,
+    purge_sentence_corrections,
+)
+from task_state import TaskState, task_states
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# 0 — не выполнять очистку в этом процессе
+MAINTENANCE_INTERVAL = float(os.getenv("MAINTENANCE_INTERVAL", "300"))
+
+
+def sweep() -> list[TaskState]:
+    """
+    Выполняет один проход очистки.
+
+    Returns:
+        list[TaskState]: Состояния задач, завершённых по таймауту
+    """
+    with Session(engine) as session:
+        expired = expire_stale_predictions(session)
+        purged = purge_sentence_corrections(session)
+    if expired or purged:
+        logger.info(
+            f"Maintenance: {len(expired)} stale tasks failed, "
+            f"{purged} cached corrections purged"
+        )
+    return expired
+
+
+class MaintenanceLoop:
+    """Фоновая задача цикла событий, периодически вызывающая sweep."""
+
+    def __init__(self, interval: float = MAINTENANCE_INTERVAL):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Запускает очистку в текущем цикле событий."""
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Останавливает очистку и дожидается её завершения."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                expired = await asyncio.to_thread(sweep)
+            except Exception as e:
+                logger.warning(f"Maintenance sweep failed: {e!r}")
+                continue
+            for state in expired:
+                await _publish_task_state(task_states, state)
+
+
+maintenance_loop = MaintenanceLoop()
@@ -0,0 +1,228 @@
+"""Метрики Prometheus приложения и их сбор.
+
+Экспортируются через эндпоинт /metrics (см. api.py):
+- длительность HTTP-запросов по маршрутам и число запросов в обработке;
+- время получения соединения из пула БД, ожидания и таймауты пула,
+  его ёмкость, занятость и открытие соединений — по пулам основной
+  базы и реплики (метка pool);
+- задержка публикации задач в RabbitMQ;
+- принятые и отклонённые запросы предсказаний по причинам;
+- источник ответа на опрос результата задачи (память или БД);
+- доступность зависимостей по последней проверке готовности.
+
+При нескольких процессах (serve.py) значения пишутся в
+PROMETHEUS_MULTIPROC_DIR; multiprocess_mode у Gauge задаёт их
+агрегацию по живым процессам.
+"""
+
+from prometheus_client import Counter, Gauge, Histogram
+from starlette.types import ASGIApp, Receive, Scope, Send
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+from typing import Optional
+import time
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Длительность обработки HTTP-запроса",
+    ["method", "route", "status"],
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP-запросы в обработке",
+    ["method"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_CHECKOUT_DURATION = Histogram(
+    "db_pool_checkout_duration_seconds",
+    "Время получения соединения из пула БД",
+    ["pool"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+DB_POOL_WAITS = Counter(
+    "db_pool_waits_total",
+    "Запросы соединения при исчерпанном пуле БД",
+    ["pool"],
+)
+DB_POOL_TIMEOUTS = Counter(
+    "db_pool_timeouts_total",
+    "Запросы соединения, не дождавшиеся свободного за pool_timeout",
+    ["pool"],
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out_connections",
+    "Соединения БД, выданные из пула",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow_connections",
+    "Соединения БД, открытые сверх pool_size",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_CAPACITY = Gauge(
+    "db_pool_capacity_connections",
+    "Максимум соединений пулов БД (pool_size + max_overflow) по процессам",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_CONNECTIONS_OPENED = Counter(
+    "db_pool_connections_opened_total",
+    "Новые соединения БД, открытые пулом (рост — переоткрытие соединений)",
+    ["pool"],
+)
+AMQP_PUBLISH_DURATION = Histogram(
+    "amqp_publish_duration_seconds",
+    "Длительность публикации задачи в RabbitMQ (с переподключением)",
+    ["result"],
+)
+PREDICT_ACCEPTED = Counter(
+    "ml_predict_accepted_total",
+    "Принятые запросы предсказаний",
+    ["mode"],  # queued — задача в очереди; cached — ответ целиком из кэша
+)
+PREDICT_REJECTED = Counter(
+    "ml_predict_rejected_total",
+    "Отклонённые запросы предсказаний",
+    ["reason"],
+)
+TASK_STATE_LOOKUPS = Counter(
+    "task_state_lookups_total",
+    "Опросы результата задачи по источнику ответа",
+    ["source"],
+)
+DEPENDENCY_UP = Gauge(
+    "dependency_up",
+    "Доступность зависимости по последней проверке готовности",
+    ["dependency"],
+    multiprocess_mode="livemin",
+)
+DEPENDENCY_CHECK_DURATION = Gauge(
+    "dependency_check_duration_seconds",
+    "Длительность последней проверки зависимости",
+    ["dependency"],
+    multiprocess_mode="livemax",
+)
+
+UNMATCHED_ROUTE = "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    ASGI-middleware с метриками длительности HTTP-запросов.
+
+    Метка route — шаблон пути маршрута (`/api/predict/result/{task_id}`),
+    а не фактический путь, чтобы число временных рядов не росло
+    с каждым task_id.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_progress.dec()
+            # Маршрутизатор FastAPI кладёт найденный маршрут в scope
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.labels(
+                method,
+                getattr(route, "path", UNMATCHED_ROUTE),
+                str(status_code),
+            ).observe(time.perf_counter() - started)
+
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool, учитывающий время получения соединения, ожидания и таймауты.
+
+    Ожидание считается, когда все соединения пула (с учётом overflow)
+    уже выданы и запрос соединения будет ждать освобождения; если ждать
+    пришлось дольше pool_timeout, учитывается таймаут. У событий пула
+    нет момента начала запроса соединения, поэтому время измеряет сам
+    пул в connect(). Используется как poolclass серверных БД (см.
+    engine_options), метка задаётся instrument_engine.
+    """
+    label = "primary"
+
+    def __init__(self, creator, pool_size: int = 5, max_overflow: int = 10, **kw):
+        super().__init__(
+            creator, pool_size=pool_size, max_overflow=max_overflow, **kw
+        )
+        # Ждать соединений можно только при ограниченном overflow (не -1)
+        self.capacity: Optional[int] = (
+            self.size() + max_overflow if max_overflow >= 0 else None
+        )
+
+    def connect(self):
+        if self.capacity is not None and self.checkedout() >= self.capacity:
+            DB_POOL_WAITS.labels(self.label).inc()
+        try:
+            with DB_POOL_CHECKOUT_DURATION.labels(self.label).time():
+                return super().connect()
+        except exc.TimeoutError:
+            DB_POOL_TIMEOUTS.labels(self.label).inc()
+            raise
+
+    def recreate(self) -> "TimedQueuePool":
+        # engine.dispose() заменяет пул новым: метка переносится в него
+        pool = super().recreate()
+        pool.label = self.label
+        return pool
+
+
+def instrument_engine(engine: Engine, label: str = "primary") -> None:
+    """
+    Подключает метрики пула соединений к движку SQLAlchemy.
+
+    Занятость пула и overflow обновляются по событиям checkout/checkin,
+    открытие новых соединений — по событию connect. Время получения
+    соединения, ожидания и таймауты учитываются, если пул движка —
+    TimedQueuePool; StaticPool и пулы SQLite без ограничения не ждут.
+
+    Args:
+        engine: Движок базы данных
+        label: Метка пула в метриках (primary, replica)
+    """
+    pool = engine.pool
+    if isinstance(pool, TimedQueuePool):
+        pool.label = label
+        if pool.capacity is not None:
+            DB_POOL_CAPACITY.labels(label).set(pool.capacity)
+
+    def _update_overflow():
+        if isinstance(pool, QueuePool):
+            DB_POOL_OVERFLOW.labels(label).set(max(pool.overflow(), 0))
+
+    @event.listens_for(pool, "connect")
+    def _on_connect(*_args):
+        DB_POOL_CONNECTIONS_OPENED.labels(label).inc()
+
+    @event.listens_for(pool, "checkout")
+    def _on_checkout(*_args):
+        DB_POOL_CHECKED_OUT.labels(label).inc()
+        _update_overflow()
+
+    @event.listens_for(pool, "checkin")
+    def _on_checkin(*_args):
+        DB_POOL_CHECKED_OUT.labels(label).dec()
+        _update_overflow()
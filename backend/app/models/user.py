@@ -6,7 +6,7 @@
 - ML-модели, историю предсказаний и вспомогательные схемы ответов.
 """
 
-from sqlmodel import SQLModel, Field, Relationship
+from sqlmodel import SQLModel, Field, Relationship, Column, JSON
 from typing import Optional, List, TYPE_CHECKING
 from datetime import datetime
 from enum import Enum
@@ -67,6 +67,13 @@ class MLModelBase(SQLModel):
     name: str = Field(min_length=1, max_length=255)
     version: str = Field(default="1.0.0")
     description: Optional[str] = None
+    # Шаблон промпта с плейсхолдером {text}; None — текст передаётся как есть
+    prompt_template: Optional[str] = None
+    # Параметры генерации Ollama (temperature, stop, num_ctx, ...) и
+    # масштабирование num_predict по длине входа (num_predict_ratio/min/max)
+    generation_options: Optional[dict] = Field(
+        default=None, sa_column=Column(JSON)
+    )
 
 
 class MLModelCreate(MLModelBase):
@@ -89,9 +96,16 @@ class MLPredictionRequest(SQLModel):
 
 
 class MLPredictionResponse(SQLModel):
-    """Схема для данных ответа ML-предсказания."""
+    """Схема для данных ответа ML-предсказания.
+
+    Если все предложения текста взяты из кэша, result содержит готовый
+    ответ и status="completed"; иначе задача поставлена в очередь
+    (status="queued"), а результат опрашивается по task_id.
+    """
     result: str
     model_name: str
+    status: str = "queued"
+    task_id: Optional[str] = None
 
 
 class MLPredictionHistoryRead(SQLModel):
@@ -105,12 +119,44 @@ class MLPredictionHistoryRead(SQLModel):
     created_at: datetime
 
 
+class SegmentResult(SQLModel):
+    """Результат воркера для одного предложения задачи."""
+    index: int
+    text: str
+
+
+class InferenceMetrics(SQLModel):
+    """Счётчики и длительности (нс) из ответа Ollama для задачи."""
+    total_duration: Optional[int] = None
+    load_duration: Optional[int] = None
+    prompt_eval_count: Optional[int] = None
+    prompt_eval_duration: Optional[int] = None
+    eval_count: Optional[int] = None
+    eval_duration: Optional[int] = None
+
+
+class MLModelStats(SQLModel):
+    """Агрегированная производительность модели по истории задач."""
+    model_id: int
+    model_name: str
+    tasks: int
+    prompt_tokens: int
+    eval_tokens: int
+    prompt_tokens_per_second: float
+    eval_tokens_per_second: float
+    avg_load_ms: float
+    avg_total_ms: float
+
+
 class TaskResultRequest(SQLModel):
     """Схема для получения результата от ML-воркера."""
     task_id: str
     prediction: str
     worker_id: str
     status: str = "completed"
+    error: Optional[str] = None
+    segments: Optional[List[SegmentResult]] = None
+    metrics: Optional[InferenceMetrics] = None
 
 
 # ============ User Response Schema (без пароля!) ============
@@ -299,4 +345,39 @@ class MLPredictionHistory(SQLModel, table=True):
     cost: float
     created_at: datetime = Field(default_factory=datetime.utcnow)
     task_id: Optional[str] = Field(default=None, index=True)  # новое поле
+    # Метрики Ollama (см. InferenceMetrics); пусто для ответов из кэша/словаря
+    total_duration: Optional[int] = None
+    load_duration: Optional[int] = None
+    prompt_eval_count: Optional[int] = None
+    prompt_eval_duration: Optional[int] = None
+    eval_count: Optional[int] = None
+    eval_duration: Optional[int] = None
+
+
+class SentenceCorrection(SQLModel, table=True):
+    """Кэш исправлений предложений пользователя по отпечатку текста и модели.
+
+    Записи старше SENTENCE_CACHE_TTL_DAYS не используются и удаляются
+    периодической очисткой (maintenance.py).
+    """
+    fingerprint: str = Field(primary_key=True, max_length=64)
+    user_id: int = Field(foreign_key="user.id", index=True)
+    model_id: int = Field(foreign_key="mlmodel.id")
+    corrected: str
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
 
+
+class PredictionSegment(SQLModel, table=True):
+    """Предложение задачи, ожидающей результата воркера.
+
+    Исправления из кэша заполняются сразу, остальные — по результату
+    воркера; после сборки ответа записи удаляются.
+    """
+    id: Optional[int] = Field(default=None, primary_key=True)
+    task_id: str = Field(index=True)
+    position: int
+    fingerprint: str
+    source: str
+    prefix: str = ""
+    suffix: str = ""
+    corrected: Optional[str] = None
@@ -3,6 +3,7 @@
 from fastapi import APIRouter, HTTPException, status, Depends
 from sqlmodel import Session, select
 from database.create_tables import get_session
+from database.routing import get_read_session
 from models.user import (
     Balance,
     Transaction,
@@ -21,7 +22,7 @@ balance_of_user_route = APIRouter()
     response_model=BalanceResponse,
 )
 async def get_my_balance(
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_read_session),
     current_user: User = Depends(get_current_active_user),
 ) -> BalanceResponse:
     """Получить баланс текущего пользователя."""
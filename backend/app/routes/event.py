@@ -3,6 +3,7 @@
 from fastapi import APIRouter, HTTPException, status, Depends
 from sqlmodel import Session, select
 from database.create_tables import get_session
+from database.routing import get_read_session
 from models.event import Event, EventCreate
 from typing import List, Dict
 
@@ -15,7 +16,7 @@ event_router = APIRouter()
     response_model=list[Event]
 )
 async def retrieve_all_events(
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_read_session),
 ) -> list[Event]:
     """Получить список всех событий."""
     return list(session.exec(select(Event)).all())
@@ -27,7 +28,7 @@ async def retrieve_all_events(
 )
 async def retrieve_event(
     id: int,
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_read_session),
 ) -> Event:
     """Получить событие по его ID."""
     event = session.get(Event, id)
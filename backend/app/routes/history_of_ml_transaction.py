@@ -4,6 +4,7 @@ from typing import List
 from fastapi import APIRouter, status, Depends
 from sqlmodel import Session, select
 from database.create_tables import get_session
+from database.routing import get_read_session
 from models.user import (
     MLPredictionHistory,
     MLPredictionHistoryRead,
@@ -57,7 +58,7 @@ async def create_history_record(
     status_code=status.HTTP_200_OK,
 )
 async def get_my_history(
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_read_session),
     current_user: User = Depends(get_current_active_user),
 ) -> List[MLPredictionHistoryRead]:
     """Получить историю ML-предсказаний для текущего пользователя."""
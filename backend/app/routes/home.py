@@ -1,19 +1,58 @@
 """Роуты базовой доступности API.
 
-Содержит корневой эндпоинт и healthcheck для проверки работоспособности сервиса.
+Содержит корневой эндпоинт и healthcheck-и: /health (совместимость),
+/health/live (процесс отвечает) и /health/ready (зависимости доступны).
 """
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, status
+from fastapi.responses import JSONResponse
 from typing import Dict
+from database.create_tables import engine
+from database.routing import replica_engine
+from health import ReadinessChecker, database_probe, queue_probe
+from task_queue import queue_inspector
 
 home_route = APIRouter()
 
+readiness = ReadinessChecker({
+    "database": database_probe(engine),
+    "rabbitmq": queue_probe(queue_inspector),
+})
+if replica_engine is not None:
+    # Без реплики не работают эндпоинты чтения истории, баланса и результатов
+    readiness.probes["database_replica"] = database_probe(replica_engine)
+
 
 @home_route.get("/health")
 async def health_check():
-    """Эндпоинт проверки здоровья для Docker healthcheck."""
+    """Эндпоинт проверки здоровья (оставлен для совместимости, как live)."""
     return {"status": "healthy"}
 
+
+@home_route.get("/health/live")
+async def liveness_check():
+    """Живость процесса: отвечает, пока цикл событий не завис."""
+    return {"status": "alive"}
+
+
+@home_route.get("/health/ready")
+async def readiness_check():
+    """
+    Готовность к обслуживанию запросов.
+
+    Returns:
+        JSONResponse: Результаты проверок зависимостей; код 503,
+            если хотя бы одна из них недоступна
+    """
+    report = await readiness.report()
+    return JSONResponse(
+        report.to_dict(),
+        status_code=(
+            status.HTTP_200_OK if report.ready
+            else status.HTTP_503_SERVICE_UNAVAILABLE
+        ),
+    )
+
 @home_route.get("/",
                 response_model=Dict[str, str],
                 summary="Root endpoint",
@@ -1,24 +1,52 @@
 """Роуты ML-предсказаний: очередь задач, проверка баланса и выдача результатов."""
 
-from fastapi import APIRouter, HTTPException, status, Depends
-from sqlmodel import Session, select
+from fastapi import APIRouter, HTTPException, status, Depends, Header, Query
+from fastapi.concurrency import run_in_threadpool
+from sqlmodel import Session, select, func, delete
 from models.user import TaskResultRequest
 from database.create_tables import get_session
-from auth import get_current_active_user
-from datetime import datetime
+from database.routing import get_read_session
+from auth import (
+    get_current_active_user,
+    get_current_user_or_worker,
+    verify_worker_token,
+)
+from datetime import datetime, timedelta
 from models.user import (
     Balance,
     MLModel,
+    MLModelRead,
+    MLModelStats,
     MLPredictionRequest,
     MLPredictionResponse,
     MLPredictionHistory,
+    PredictionSegment,
+    SentenceCorrection,
     Transaction,
     User,
 )
+from sentences import Sentence, fingerprint, split_sentences
 from pydantic import BaseModel
+from task_queue import task_publisher, model_routing_key
+from metrics import PREDICT_ACCEPTED, PREDICT_REJECTED, TASK_STATE_LOOKUPS
+from task_state import (
+    STATUS_COMPLETED,
+    STATUS_FAILED,
+    STATUS_PENDING,
+    TaskState,
+    TaskStateStore,
+    get_task_state_store,
+    task_state_feed,
+)
+from tracing import (
+    TRACEPARENT_HEADER,
+    close_task_trace,
+    start_span,
+    task_root_context,
+)
+from typing import Optional
 import logging
-import pika
-import json
+import os
 import uuid
 
 logger = logging.getLogger(__name__)
@@ -26,41 +54,44 @@ logger = logging.getLogger(__name__)
 ml_router = APIRouter()
 
 PREDICTION_COST = 10.0
+# Минимальная стоимость задачи, отправленной модели (даже при малой правке)
+MIN_PREDICTION_COST = 1.0
+# Срок жизни кэшированного исправления предложения, дни
+SENTENCE_CACHE_TTL_DAYS = float(os.getenv("SENTENCE_CACHE_TTL_DAYS", "30"))
+# Задача без результата дольше этого срока считается потерянной, секунды
+PENDING_TASK_TIMEOUT = float(os.getenv("PENDING_TASK_TIMEOUT", "3600"))
+PENDING_PREFIX = "PENDING"
+FAILED_PREFIX = "FAILED:"
+FAILED_STATUSES = ("error", "failed")
+# Максимальное ожидание итога в одном запросе результата, секунды
+MAX_RESULT_WAIT = 30.0
 
 
 def send_task_to_queue(
-    task_id: str, model_name: str, features: dict
+    task_id: str,
+    model_name: str,
+    features: dict,
+    traceparent: Optional[str] = None,
 ) -> bool:
     """
-    Отправляет задачу в RabbitMQ очередь.
+    Отправляет задачу в RabbitMQ.
+
+    Задача маршрутизируется по имени модели в очередь воркеров,
+    которые держат эту модель загруженной. Контекст трассировки
+    передаётся воркеру в заголовке сообщения traceparent.
     """
     try:
-        credentials = pika.PlainCredentials('admin', 'password123')
-        parameters = pika.ConnectionParameters(
-            host='rabbitmq',
-            port=5672,
-            credentials=credentials,
-            heartbeat=600,
-            blocked_connection_timeout=300
-        )
-        connection = pika.BlockingConnection(parameters)
-        channel = connection.channel()
-        channel.queue_declare(queue='ml_task_queue', durable=True)
-
         task_data = {
             'task_id': task_id,
             'features': features,
             'model': model_name,
             'timestamp': datetime.utcnow().isoformat()
         }
-
-        channel.basic_publish(
-            exchange='',
-            routing_key='ml_task_queue',
-            body=json.dumps(task_data),
-            properties=pika.BasicProperties(delivery_mode=2)
+        task_publisher.publish(
+            model_routing_key(model_name),
+            task_data,
+            headers={TRACEPARENT_HEADER: traceparent} if traceparent else None,
         )
-        connection.close()
         logger.info(f"Task {task_id} sent to queue")
         return True
     except Exception as e:
@@ -68,6 +99,254 @@ def send_task_to_queue(
         return False
 
 
+def _fail_prediction(
+    session: Session, record: MLPredictionHistory, error: str | None
+) -> None:
+    """
+    Помечает предсказание как неудачное и возвращает его стоимость.
+
+    Args:
+        session: Сессия базы данных (commit выполняет вызывающий)
+        record: Запись истории предсказаний
+        error: Описание ошибки от воркера
+    """
+    error = error or "Unknown error"
+    record.result = f"{FAILED_PREFIX}{error}"
+    session.add(record)
+
+    balance = session.exec(
+        select(Balance).where(Balance.user_id == record.user_id)
+    ).first()
+    if balance and record.cost > 0:
+        balance.amount += record.cost
+        session.add(balance)
+        session.add(Transaction(
+            user_id=record.user_id,
+            amount=record.cost,
+            type="deposit",
+            description=f"Refund for failed ML task {record.task_id}: {error}"
+        ))
+
+
+def _cancel_prediction(
+    session: Session, record: MLPredictionHistory, balance: Balance
+) -> None:
+    """
+    Отменяет задачу, которую не удалось отправить в очередь.
+
+    Запись истории и предложения задачи удаляются, списанные
+    средства возвращаются на баланс.
+
+    Args:
+        session: Сессия базы данных
+        record: Зафиксированная запись истории предсказаний
+        balance: Баланс пользователя
+    """
+    logger.error(f"ML prediction {record.task_id} failed: task not queued")
+    PREDICT_REJECTED.labels("queue_error").inc()
+    if record.cost > 0:
+        balance.amount += record.cost
+        session.add(balance)
+        session.add(Transaction(
+            user_id=record.user_id,
+            amount=record.cost,
+            type="deposit",
+            description="Refund due to ML prediction error: task not queued",
+        ))
+    _discard_segments(session, record.task_id)
+    session.delete(record)
+    session.commit()
+
+
+def _task_state(record: MLPredictionHistory) -> TaskState:
+    """Состояние задачи по записи истории предсказаний."""
+    result, error = None, None
+    if record.result.startswith(PENDING_PREFIX):
+        task_status = STATUS_PENDING
+    elif record.result.startswith(FAILED_PREFIX):
+        task_status = STATUS_FAILED
+        error = record.result[len(FAILED_PREFIX):]
+    else:
+        task_status = STATUS_COMPLETED
+        result = record.result
+    return TaskState(
+        task_id=record.task_id,
+        user_id=record.user_id,
+        model_id=record.model_id,
+        status=task_status,
+        result=result,
+        error=error,
+        created_at=record.created_at.isoformat() if record.created_at else None,
+    )
+
+
+async def _publish_task_state(
+    task_states: TaskStateStore, state: TaskState
+) -> None:
+    """Сохраняет состояние задачи в хранилище и рассылает другим процессам.
+
+    Публикация в брокер блокирующая и выполняется в пуле потоков.
+    """
+    task_states.put(state)
+    await run_in_threadpool(task_state_feed.broadcast, state)
+
+
+def _cache_cutoff() -> datetime:
+    """Время, раньше которого кэшированные исправления устарели."""
+    return datetime.utcnow() - timedelta(days=SENTENCE_CACHE_TTL_DAYS)
+
+
+def _cached_corrections(
+    session: Session, user_id: int, model_id: int, fingerprints: list[str]
+) -> dict[str, str]:
+    """Возвращает неустаревшие исправления пользователя по отпечаткам предложений."""
+    rows = session.exec(
+        select(SentenceCorrection).where(
+            SentenceCorrection.user_id == user_id,
+            SentenceCorrection.model_id == model_id,
+            SentenceCorrection.fingerprint.in_(fingerprints),
+            SentenceCorrection.created_at >= _cache_cutoff(),
+        )
+    ).all()
+    return {row.fingerprint: row.corrected for row in rows}
+
+
+def incremental_cost(sentences: list[Sentence], changed: list[int]) -> float:
+    """
+    Стоимость предсказания пропорционально объёму изменённого текста.
+
+    Args:
+        sentences: Все предложения запроса
+        changed: Индексы предложений, которые нужно обработать
+
+    Returns:
+        float: Доля PREDICTION_COST, округлённая до копеек, но не меньше
+            MIN_PREDICTION_COST, если хотя бы одно предложение уходит модели
+    """
+    if not changed:
+        return 0.0
+    total = sum(len(sentence.text) for sentence in sentences)
+    changed_size = sum(len(sentences[index].text) for index in changed)
+    return max(round(PREDICTION_COST * changed_size / total, 2), MIN_PREDICTION_COST)
+
+
+def _assemble_segments(
+    session: Session, record: MLPredictionHistory, segments: list
+) -> str | None:
+    """
+    Собирает результат задачи из кэшированных и новых исправлений.
+
+    Новые исправления сохраняются в кэш, записи предложений задачи
+    удаляются.
+
+    Args:
+        session: Сессия базы данных (commit выполняет вызывающий)
+        record: Запись истории предсказаний
+        segments: Результаты воркера по предложениям
+
+    Returns:
+        str | None: Собранный текст или None, если задача не разбивалась
+    """
+    rows = session.exec(
+        select(PredictionSegment)
+        .where(PredictionSegment.task_id == record.task_id)
+        .order_by(PredictionSegment.position)
+    ).all()
+    if not rows:
+        return None
+    produced = {segment.index: segment.text for segment in segments}
+    parts = []
+    for row in rows:
+        corrected = row.corrected
+        if corrected is None and row.position in produced:
+            corrected = produced[row.position]
+            session.merge(SentenceCorrection(
+                fingerprint=row.fingerprint,
+                user_id=record.user_id,
+                model_id=record.model_id,
+                corrected=corrected,
+            ))
+        if corrected is None:
+            # Воркер не вернул предложение — оставляем исходный текст
+            corrected = row.source
+        parts.append(f"{row.prefix}{corrected}{row.suffix}")
+        session.delete(row)
+    return "".join(parts)
+
+
+def _discard_segments(session: Session, task_id: str) -> None:
+    """Удаляет записи предложений задачи (commit выполняет вызывающий)."""
+    for row in session.exec(
+        select(PredictionSegment).where(PredictionSegment.task_id == task_id)
+    ).all():
+        session.delete(row)
+
+
+def expire_stale_predictions(
+    session: Session, timeout: float = PENDING_TASK_TIMEOUT
+) -> list[TaskState]:
+    """
+    Завершает ошибкой задачи, результат которых так и не пришёл.
+
+    Средства за такие задачи возвращаются, записи их предложений
+    удаляются. Результат, пришедший позже, игнорируется как повторный.
+
+    Args:
+        session: Сессия базы данных
+        timeout: Время ожидания результата в секундах
+
+    Returns:
+        list[TaskState]: Новые состояния завершённых задач
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=timeout)
+    # Блокировка строк: параллельная очистка в другом процессе API
+    # пропускает их и не возвращает средства повторно
+    records = session.exec(
+        select(MLPredictionHistory)
+        .where(
+            MLPredictionHistory.result.startswith(PENDING_PREFIX),
+            MLPredictionHistory.created_at < cutoff,
+        )
+        .with_for_update(skip_locked=True)
+    ).all()
+    states = []
+    for record in records:
+        _fail_prediction(
+            session, record, f"No result within {timeout:.0f}s"
+        )
+        _discard_segments(session, record.task_id)
+        states.append(_task_state(record))
+        logger.warning(f"Task {record.task_id} expired without a result")
+    # Предложения задач, записи которых уже не ожидают результата
+    pending = select(MLPredictionHistory.task_id).where(
+        MLPredictionHistory.result.startswith(PENDING_PREFIX)
+    )
+    session.exec(
+        delete(PredictionSegment).where(PredictionSegment.task_id.not_in(pending))
+    )
+    session.commit()
+    return states
+
+
+def purge_sentence_corrections(session: Session) -> int:
+    """
+    Удаляет устаревшие исправления из кэша предложений.
+
+    Args:
+        session: Сессия базы данных
+
+    Returns:
+        int: Число удалённых записей
+    """
+    deleted = session.exec(
+        delete(SentenceCorrection).where(
+            SentenceCorrection.created_at < _cache_cutoff()
+        )
+    ).rowcount
+    session.commit()
+    return deleted
+
+
 @ml_router.get(
     "/balance",
     status_code=status.HTTP_200_OK,
@@ -88,6 +367,123 @@ async def get_ml_balance(
     return {"user_id": current_user.id, "amount": balance.amount}
 
 
+@ml_router.get(
+    "/models",
+    response_model=list[MLModelRead],
+    status_code=status.HTTP_200_OK,
+)
+async def list_ml_models(
+    session: Session = Depends(get_session),
+    caller: Optional[User] = Depends(get_current_user_or_worker),
+) -> list[MLModelRead]:
+    """
+    Получить список зарегистрированных ML-моделей.
+
+    Используется ML-воркером (со служебным токеном WORKER_API_TOKEN)
+    для прогрева моделей в Ollama и получения шаблонов промптов
+    и параметров генерации.
+    """
+    models = session.exec(select(MLModel).order_by(MLModel.id)).all()
+    return [
+        MLModelRead(
+            id=model.id,
+            name=model.name,
+            version=model.version,
+            description=model.description,
+            prompt_template=model.prompt_template,
+            generation_options=model.generation_options,
+            file_path=model.file_path,
+            created_at=model.created_at,
+        )
+        for model in models
+    ]
+
+
+@ml_router.get(
+    "/models/stats",
+    response_model=list[MLModelStats],
+    status_code=status.HTTP_200_OK,
+)
+async def get_ml_model_stats(
+    session: Session = Depends(get_session),
+    caller: Optional[User] = Depends(get_current_user_or_worker),
+) -> list[MLModelStats]:
+    """
+    Производительность моделей по метрикам Ollama из истории задач.
+
+    Скорость считается по суммам токенов и длительностей, а не как среднее
+    скоростей отдельных задач, чтобы короткие задачи не искажали оценку.
+    Учитываются только задачи, обработанные моделью.
+    """
+    history = MLPredictionHistory
+    rows = session.exec(
+        select(
+            MLModel.id,
+            MLModel.name,
+            func.count(history.id),
+            func.coalesce(func.sum(history.prompt_eval_count), 0),
+            func.coalesce(func.sum(history.prompt_eval_duration), 0),
+            func.coalesce(func.sum(history.eval_count), 0),
+            func.coalesce(func.sum(history.eval_duration), 0),
+            func.coalesce(func.avg(history.load_duration), 0),
+            func.coalesce(func.avg(history.total_duration), 0),
+        )
+        .join(history, history.model_id == MLModel.id)
+        .where(history.eval_count.is_not(None))
+        .group_by(MLModel.id, MLModel.name)
+        .order_by(MLModel.id)
+    ).all()
+    return [
+        MLModelStats(
+            model_id=model_id,
+            model_name=name,
+            tasks=tasks,
+            prompt_tokens=prompt_tokens,
+            eval_tokens=eval_tokens,
+            prompt_tokens_per_second=(
+                prompt_tokens / (prompt_ns / 1e9) if prompt_ns else 0.0
+            ),
+            eval_tokens_per_second=(
+                eval_tokens / (eval_ns / 1e9) if eval_ns else 0.0
+            ),
+            avg_load_ms=float(load_ns) / 1e6,
+            avg_total_ms=float(total_ns) / 1e6,
+        )
+        for (
+            model_id, name, tasks, prompt_tokens, prompt_ns,
+            eval_tokens, eval_ns, load_ns, total_ns,
+        ) in rows
+    ]
+
+
+@ml_router.delete(
+    "/corrections",
+    status_code=status.HTTP_200_OK,
+)
+async def clear_sentence_corrections(
+    model_id: Optional[int] = None,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_active_user),
+) -> dict:
+    """
+    Очистить кэш исправлений предложений текущего пользователя.
+
+    После очистки все предложения следующих запросов снова проверяются
+    моделью (например, если кэшированное исправление неверно).
+
+    Args:
+        model_id: Очистить только исправления этой модели
+    """
+    statement = delete(SentenceCorrection).where(
+        SentenceCorrection.user_id == current_user.id
+    )
+    if model_id is not None:
+        statement = statement.where(SentenceCorrection.model_id == model_id)
+    deleted = session.exec(statement).rowcount
+    session.commit()
+    return {"deleted": deleted}
+
+
 @ml_router.post(
     "/predict",
     response_model=MLPredictionResponse,
@@ -97,6 +493,7 @@ async def ml_predict(
     request: MLPredictionRequest,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_active_user),
+    task_states: TaskStateStore = Depends(get_task_state_store),
 ) -> MLPredictionResponse:
     """Получить предсказание от ML-модели с проверкой баланса."""
     # Используем user_id из токена, если не передан в запросе
@@ -104,6 +501,7 @@ async def ml_predict(
     
     # Verify user can only access their own predictions
     if user_id != current_user.id:
+        PREDICT_REJECTED.labels("forbidden").inc()
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You can only make predictions for yourself",
@@ -113,178 +511,350 @@ async def ml_predict(
         select(MLModel).where(MLModel.id == request.model_id)
     ).first()
     if not ml_model:
+        PREDICT_REJECTED.labels("model_not_found").inc()
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Model with id {request.model_id} not found",
         )
 
+    # Неизменённые предложения берутся из кэша, в очередь уходят остальные
+    sentences = split_sentences(request.text)
+    fingerprints = [
+        fingerprint(current_user.id, ml_model.id, sentence.text)
+        for sentence in sentences
+    ]
+    cached = _cached_corrections(
+        session, current_user.id, ml_model.id, fingerprints
+    )
+    changed = [
+        index for index, sentence in enumerate(sentences)
+        if sentence.text and fingerprints[index] not in cached
+    ]
+    cost = incremental_cost(sentences, changed)
+
     balance = session.exec(
         select(Balance).where(Balance.user_id == current_user.id)
     ).first()
     if not balance:
+        PREDICT_REJECTED.labels("no_balance").inc()
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User balance not found",
         )
-    if balance.amount < PREDICTION_COST:
+    if balance.amount < cost:
+        PREDICT_REJECTED.labels("insufficient_balance").inc()
         raise HTTPException(
             status_code=status.HTTP_402_PAYMENT_REQUIRED,
             detail=(
-                f"Insufficient balance. Required: {PREDICTION_COST}, "
+                f"Insufficient balance. Required: {cost}, "
                 f"Available: {balance.amount}"
             ),
         )
 
-    # Списываем средства
-    balance.amount -= PREDICTION_COST
-    session.add(balance)
-
-    # Создаём запись о транзакции списания
-    transaction = Transaction(
-        user_id=current_user.id,
-        amount=PREDICTION_COST,
-        type="withdrawal",
-        description=f"ML prediction with model {ml_model.name}"
-    )
-    session.add(transaction)
+    if cost > 0:
+        # Списываем средства
+        balance.amount -= cost
+        session.add(balance)
 
-    try:
-        # Генерируем уникальный ID задачи
-        task_id = str(uuid.uuid4())
-        
-        # Отправляем задачу в очередь
-        if not send_task_to_queue(
-            task_id=task_id,
-            model_name=ml_model.name,
-            features={'text': request.text}
-        ):
-            raise Exception("Failed to send task to queue")
-        
-        # Создаём запись в истории предсказаний с task_id и статусом PENDING
-        history_record = MLPredictionHistory(
+        # Создаём запись о транзакции списания
+        transaction = Transaction(
             user_id=current_user.id,
-            model_id=ml_model.id,
-            input_text=request.text,
-            task_id=task_id,                      # <-- добавлено поле task_id
-            result=f"PENDING:{task_id}",          # можно оставить так (совместимость) или изменить на "PENDING"
-            cost=PREDICTION_COST,
+            amount=cost,
+            type="withdrawal",
+            description=f"ML prediction with model {ml_model.name}"
         )
-        session.add(history_record)
-        session.commit()
-
-        return MLPredictionResponse(
-            result=f"Task {task_id} queued for processing",
-            model_name=ml_model.name,
+        session.add(transaction)
+
+    # Генерируем уникальный ID задачи
+    task_id = str(uuid.uuid4())
+
+    if changed:
+        result = f"PENDING:{task_id}"
+        for index, sentence in enumerate(sentences):
+            session.add(PredictionSegment(
+                task_id=task_id,
+                position=index,
+                fingerprint=fingerprints[index],
+                source=sentence.text,
+                prefix=sentence.prefix,
+                suffix=sentence.suffix,
+                corrected=(
+                    None if index in changed
+                    else cached.get(fingerprints[index], sentence.text)
+                ),
+            ))
+    else:
+        # Всё взято из кэша: результат готов без обращения к модели
+        result = "".join(
+            sentence.assemble(cached.get(fingerprints[index], sentence.text))
+            for index, sentence in enumerate(sentences)
         )
 
-    except Exception as e:
-        # При ошибке ML возвращаем средства пользователю
-        logger.error(f"ML prediction failed: {e}")
-        
-        # Возвращаем средства
-        balance.amount += PREDICTION_COST
-        session.add(balance)
+    # Создаём запись в истории предсказаний с task_id и статусом PENDING
+    history_record = MLPredictionHistory(
+        user_id=current_user.id,
+        model_id=ml_model.id,
+        input_text=request.text,
+        task_id=task_id,
+        result=result,
+        cost=cost,
+    )
+    session.add(history_record)
+    # Состояние собирается до commit: после него атрибуты записи
+    # перечитывались бы из БД
+    task_state = _task_state(history_record)
+    # Запись задачи фиксируется до публикации: иначе результат воркера
+    # может прийти раньше, чем она появится в БД
+    session.commit()
+
+    if changed:
+        # Отправляем в очередь только изменённые предложения;
+        # трасса задачи продолжается в воркере. Публикация блокирующая,
+        # поэтому выполняется в пуле потоков, а не в цикле событий
+        with start_span(
+            "ml_predict",
+            parent=task_root_context(task_id),
+            model=ml_model.name,
+            segments=len(changed),
+        ) as span:
+            sent = await run_in_threadpool(
+                send_task_to_queue,
+                task_id=task_id,
+                model_name=ml_model.name,
+                features={
+                    'text': request.text,
+                    'segments': [
+                        {'index': index, 'text': sentences[index].text}
+                        for index in changed
+                    ],
+                },
+                traceparent=span.traceparent,
+            )
+        if not sent:
+            _cancel_prediction(session, history_record, balance)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=(
+                    "ML prediction failed. Funds returned to balance. "
+                    "Error: Failed to send task to queue"
+                ),
+            )
 
-        # Создаём запись о транзакции возврата
-        refund_transaction = Transaction(
-            user_id=current_user.id,
-            amount=PREDICTION_COST,
-            type="deposit",
-            description=f"Refund due to ML prediction error: {str(e)}"
-        )
-        session.add(refund_transaction)
-        session.commit()
+    await _publish_task_state(task_states, task_state)
+    PREDICT_ACCEPTED.labels("queued" if changed else "cached").inc()
 
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=(
-                f"ML prediction failed. Funds returned to balance. "
-                f"Error: {str(e)}"
-            ),
+    if not changed:
+        # Ответ готов сразу: опрашивать результат не нужно
+        return MLPredictionResponse(
+            result=result,
+            model_name=ml_model.name,
+            status="completed",
+            task_id=task_id,
         )
+    return MLPredictionResponse(
+        result=f"Task {task_id} queued for processing",
+        model_name=ml_model.name,
+        task_id=task_id,
+    )
 
 
-@ml_router.post("/send_task_result")
+@ml_router.post(
+    "/send_task_result",
+    dependencies=[Depends(verify_worker_token)],
+)
 async def receive_task_result(
     request: TaskResultRequest,
     session: Session = Depends(get_session),
+    traceparent: Optional[str] = Header(None),
+    task_states: TaskStateStore = Depends(get_task_state_store),
 ):
     """
     Получает результат от воркера и обновляет запись в БД.
 
-    Этот эндпоинт вызывается ML-воркером после обработки задачи.
+    Этот эндпоинт вызывается ML-воркером (со служебным токеном
+    WORKER_API_TOKEN) после обработки задачи. Первый результат задачи
+    завершает её трассу и сохраняется в хранилище состояния задач,
+    откуда его читают опросы результата.
+
+    Строка истории читается с блокировкой: повторная досылка того же
+    результата или очистка зависших задач (expire_stale_predictions),
+    выполняющиеся одновременно, ждут её и видят уже итоговое состояние.
 
     Args:
         request: JSON с полями task_id, prediction, worker_id, status
+            и error (описание ошибки при status="error")
         session: Сессия базы данных
+        traceparent: Контекст трассировки спана отправки результата
+        task_states: Хранилище состояния задач
 
     Returns:
         dict: Статус операции
+
+    Raises:
+        HTTPException: 404, если задача не найдена, и 500, если результат
+            не удалось сохранить; воркер не подтверждает такие сообщения
+            и досылает результат позже
     """
-    try:
-        history_record = session.exec(
-            select(MLPredictionHistory).where(
-                MLPredictionHistory.task_id == request.task_id
+    with start_span(
+        "receive_task_result",
+        parent=traceparent or task_root_context(request.task_id),
+        worker_id=request.worker_id,
+        status=request.status,
+    ) as span:
+        try:
+            history_record = session.exec(
+                select(MLPredictionHistory)
+                .where(MLPredictionHistory.task_id == request.task_id)
+                .with_for_update()
+                .execution_options(populate_existing=True)
+            ).first()
+
+            if not history_record:
+                # Не 200: воркер не подтвердит сообщение и дошлёт результат
+                logger.error(f"Task {request.task_id} not found in history")
+                span.status = "error"
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Task not found",
+                )
+
+            # Воркер может прислать результат повторно (досылка после сбоя),
+            # а очистка — завершить задачу по таймауту: под блокировкой
+            # учитываем только первый итог, чтобы не вернуть средства дважды
+            if not history_record.result.startswith(PENDING_PREFIX):
+                logger.info(f"Task {request.task_id} already finished, ignoring")
+                span.set_attributes(duplicate=True)
+                return {"status": "success", "task_id": request.task_id}
+
+            failed = request.status in FAILED_STATUSES
+            if failed:
+                _fail_prediction(session, history_record, request.error)
+                _discard_segments(session, request.task_id)
+                logger.warning(
+                    f"Task {request.task_id} failed on {request.worker_id}: "
+                    f"{request.error}"
+                )
+            else:
+                assembled = _assemble_segments(
+                    session, history_record, request.segments or []
+                )
+                history_record.result = (
+                    request.prediction if assembled is None else assembled
+                )
+                if request.metrics:
+                    for name, value in request.metrics.model_dump().items():
+                        setattr(history_record, name, value)
+                session.add(history_record)
+                logger.info(
+                    f"Task {request.task_id} result saved by {request.worker_id}: "
+                    f"{request.prediction[:50]}..."
+                )
+            task_state = _task_state(history_record)
+            session.commit()
+            await _publish_task_state(task_states, task_state)
+            close_task_trace(
+                request.task_id,
+                history_record.created_at,
+                failed=failed,
+                model_id=history_record.model_id,
+                worker_id=request.worker_id,
             )
-        ).first()
-
-        if not history_record:
-            logger.error(f"Task {request.task_id} not found in history")
-            return {"status": "error", "message": "Task not found"}
-
-        # Обновляем результат
-        history_record.result = request.prediction
-        session.add(history_record)
-        session.commit()
-
-        logger.info(
-            f"Task {request.task_id} result saved by {request.worker_id}: "
-            f"{request.prediction[:50]}..."
-        )
-        return {"status": "success", "task_id": request.task_id}
 
-    except Exception as e:
-        logger.error(f"Error saving task result: {e}")
-        return {"status": "error", "message": str(e)}
+            return {"status": "success", "task_id": request.task_id}
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            # Результат не сохранён: ошибка HTTP, чтобы воркер его дослал
+            logger.error(f"Error saving task result: {e}")
+            session.rollback()
+            span.status = "error"
+            span.set_attributes(error=str(e))
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error saving task result: {e}",
+            )
     
 
 @ml_router.get("/result/{task_id}")
 async def get_prediction_result(
     task_id: str,
-    session: Session = Depends(get_session),
+    wait: float = Query(
+        0,
+        ge=0,
+        le=MAX_RESULT_WAIT,
+        description="Сколько секунд ждать итога, если задача ещё выполняется",
+    ),
+    session: Session = Depends(get_read_session),
     current_user: User = Depends(get_current_active_user),
+    auth_session: Session = Depends(get_session),
+    task_states: TaskStateStore = Depends(get_task_state_store),
 ):
     """
     Получить результат предсказания по task_id.
     Доступно только для авторизованного пользователя, которому принадлежит задача.
-    """
-    # Ищем запись по task_id и user_id (для безопасности)
-    record = session.exec(
-        select(MLPredictionHistory).where(
-            MLPredictionHistory.task_id == task_id,
-            MLPredictionHistory.user_id == current_user.id
-        )
-    ).first()
 
-    if not record:
+    Состояние читается из хранилища состояния задач; БД запрашивается
+    только при промахе. С параметром wait ответ для выполняющейся
+    задачи задерживается до её завершения или истечения wait секунд;
+    на время ожидания соединения с БД возвращаются в пул.
+    """
+    state = task_states.get(task_id)
+    if state is not None:
+        TASK_STATE_LOOKUPS.labels("memory").inc()
+    else:
+        TASK_STATE_LOOKUPS.labels("database").inc()
+        # Ищем запись по task_id и user_id (для безопасности)
+        record = session.exec(
+            select(MLPredictionHistory).where(
+                MLPredictionHistory.task_id == task_id,
+                MLPredictionHistory.user_id == current_user.id
+            )
+        ).first()
+        if record:
+            state = _task_state(record)
+            # Следующие опросы обслужит память. Ожидание хранится
+            # TASK_STATE_PENDING_TTL: если рассылка итога из другого
+            # процесса потеряется, после этого срока снова прочитается БД
+            task_states.put(state)
+
+    if state is None or state.user_id != current_user.id:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Task not found or you don't have access"
         )
 
+    if not state.finished and wait:
+        # Сессии больше не нужны: не держим соединения пула на время
+        # ожидания (объект пользователя уже загружен)
+        session.close()
+        auth_session.close()
+        finished = await task_states.wait(task_id, wait)
+        if finished is not None and finished.finished:
+            state = finished
+
     # Если задача ещё в обработке
-    if record.result.startswith("PENDING"):
+    if state.status == STATUS_PENDING:
         return {
             "status": "pending",
             "task_id": task_id,
             "message": "Task is still being processed"
         }
 
+    if state.status == STATUS_FAILED:
+        return {
+            "status": "failed",
+            "task_id": task_id,
+            "error": state.error,
+            "model_id": state.model_id,
+            "created_at": state.created_at
+        }
+
     # Задача завершена, возвращаем результат
     return {
         "status": "completed",
         "task_id": task_id,
-        "result": record.result,
-        "model_id": record.model_id,
-        "created_at": record.created_at.isoformat() if record.created_at else None
+        "result": state.result,
+        "model_id": state.model_id,
+        "created_at": state.created_at
     }
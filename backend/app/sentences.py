@@ -0,0 +1,87 @@
+"""Разбиение текста на предложения и их отпечатки для кэша исправлений.
+
+Пользователи часто отправляют тот же абзац с небольшими правками.
+Каждое предложение идентифицируется отпечатком нормализованного текста,
+модели и пользователя: исправления предложений, не изменившихся с его
+прошлых отправок, берутся из кэша, а в очередь уходят только изменённые.
+"""
+
+from dataclasses import dataclass
+import hashlib
+import re
+
+# Граница предложения — пробелы после конечного знака или перевод строки
+BOUNDARY_RE = re.compile(r"(?<=[.!?…])\s+|\s*\n\s*")
+
+
+@dataclass
+class Sentence:
+    """
+    Предложение и окружающие его пробелы.
+
+    Атрибуты:
+        text: Текст предложения без крайних пробелов
+        prefix: Пробелы перед предложением
+        suffix: Разделитель после предложения
+    """
+    text: str
+    prefix: str = ""
+    suffix: str = ""
+
+    def assemble(self, corrected: str) -> str:
+        """Возвращает исправленный текст на месте исходного."""
+        return f"{self.prefix}{corrected}{self.suffix}"
+
+
+def split_sentences(text: str) -> list[Sentence]:
+    """
+    Разбивает текст на предложения без потери пробелов.
+
+    Args:
+        text: Исходный текст
+
+    Returns:
+        list[Sentence]: Предложения; склейка prefix + text + suffix
+            восстанавливает исходный текст
+    """
+    parts = []
+    position = 0
+    for match in BOUNDARY_RE.finditer(text):
+        parts.append((text[position:match.start()], match.group()))
+        position = match.end()
+    parts.append((text[position:], ""))
+
+    sentences = []
+    for raw, separator in parts:
+        stripped = raw.strip()
+        start = raw.find(stripped) if stripped else len(raw)
+        sentences.append(
+            Sentence(
+                text=stripped,
+                prefix=raw[:start],
+                suffix=raw[start + len(stripped):] + separator,
+            )
+        )
+    return sentences
+
+
+def fingerprint(user_id: int, model_id: int, sentence: str) -> str:
+    """
+    Вычисляет отпечаток предложения для кэша исправлений.
+
+    Пробелы нормализуются, чтобы переформатирование абзаца
+    не считалось изменением. Пользователь входит в отпечаток: кэш
+    учитывает только его собственные отправки.
+
+    Args:
+        user_id: ID пользователя, отправившего текст
+        model_id: ID модели, выполнившей исправление
+        sentence: Текст предложения
+
+    Returns:
+        str: Шестнадцатеричный SHA-256
+    """
+    normalized = " ".join(sentence.split())
+    return hashlib.sha256(
+        f"{user_id}\0{model_id}\0{normalized}".encode("utf-8")
+    ).hexdigest()
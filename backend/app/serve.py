@@ -0,0 +1,119 @@
+"""Запуск API в production-режиме.
+
+В отличие от `python api.py` (один процесс с автоперезагрузкой для
+разработки), запускает несколько процессов uvicorn по числу доступных
+ядер. Миграции схемы и модель по умолчанию (database/migrations.py)
+применяются один раз в родительском процессе до запуска воркеров;
+воркеры только сверяют версию схемы.
+
+Настройки (переменные окружения):
+    WEB_CONCURRENCY: Число процессов (по умолчанию — число доступных ядер)
+    APP_HOST, APP_PORT: Адрес прослушивания (0.0.0.0:8080)
+    KEEP_ALIVE_TIMEOUT: Keep-alive в секундах; больше, чем у nginx
+        к upstream, чтобы прокси не переиспользовал закрытое соединение
+    GRACEFUL_SHUTDOWN_TIMEOUT: Время на завершение запросов при остановке
+    MIGRATE_ON_START: 0 — не применять миграции (их выполняет отдельная
+        команда `python -m database.migrations upgrade`)
+    PROMETHEUS_MULTIPROC_DIR: Каталог метрик процессов; при нескольких
+        воркерах задаётся автоматически, чтобы /metrics агрегировал их
+
+`python serve.py --profile-startup` вместо запуска сервера выводит
+время импорта модулей и шагов запуска (см. startup_profile.py).
+"""
+
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+import uvicorn
+
+logger = logging.getLogger(__name__)
+
+HOST = os.getenv("APP_HOST", "0.0.0.0")
+PORT = int(os.getenv("APP_PORT", "8080"))
+KEEP_ALIVE_TIMEOUT = int(os.getenv("KEEP_ALIVE_TIMEOUT", "75"))
+GRACEFUL_SHUTDOWN_TIMEOUT = int(os.getenv("GRACEFUL_SHUTDOWN_TIMEOUT", "30"))
+MIGRATE_ON_START = os.getenv("MIGRATE_ON_START", "1") == "1"
+MULTIPROC_DIR_ENV = "PROMETHEUS_MULTIPROC_DIR"
+
+
+def worker_count() -> int:
+    """Число процессов: WEB_CONCURRENCY или число доступных процессу ядер."""
+    configured = os.getenv("WEB_CONCURRENCY")
+    if configured:
+        return max(int(configured), 1)
+    try:
+        # Учитывает ограничение CPU контейнера через cpuset
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def bootstrap() -> None:
+    """Однократная подготовка БД перед запуском воркеров."""
+    from database.create_tables import engine
+    from database.migrations import bootstrap as migrate
+
+    logger.info("Applying database migrations...")
+    migrate(engine)
+
+
+def prepare_multiprocess_metrics(workers: int) -> None:
+    """
+    Готовит каталог метрик Prometheus для нескольких процессов.
+
+    Каталог очищается при каждом запуске: файлы процессов прошлого
+    запуска иначе попали бы в агрегированные значения.
+
+    Args:
+        workers: Число процессов uvicorn
+    """
+    if workers == 1 and MULTIPROC_DIR_ENV not in os.environ:
+        return
+    directory = os.environ.setdefault(
+        MULTIPROC_DIR_ENV, os.path.join(tempfile.gettempdir(), "prometheus")
+    )
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Run the API server")
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="print import and start-up step timings and exit",
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    if args.profile_startup:
+        from startup_profile import report
+
+        print(report())
+        return
+
+    workers = worker_count()
+    if MIGRATE_ON_START:
+        bootstrap()
+    # После bootstrap: родитель сам метрики не отдаёт, а переменная
+    # должна быть задана до импорта prometheus_client в воркерах
+    prepare_multiprocess_metrics(workers)
+    logger.info(f"Starting {workers} worker(s) on {HOST}:{PORT}")
+    uvicorn.run(
+        "api:app",
+        host=HOST,
+        port=PORT,
+        workers=workers,
+        # auto: uvloop и httptools, если установлены (uvicorn[standard])
+        loop="auto",
+        http="auto",
+        timeout_keep_alive=KEEP_ALIVE_TIMEOUT,
+        timeout_graceful_shutdown=GRACEFUL_SHUTDOWN_TIMEOUT,
+        proxy_headers=True,
+        log_level="info",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Профилирование запуска процесса API.
+
+Время старта реплики складывается из импорта модулей (создание
+приложения происходит при импорте api) и шагов lifespan. Шаги
+запуска замеряются всегда (timed_step) и пишутся в лог; полный отчёт
+с временем импорта по модулям выводит `python serve.py --profile-startup`.
+"""
+
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator
+import asyncio
+import logging
+import re
+import subprocess
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+# Длительность шагов запуска в секундах в порядке выполнения
+STEP_TIMINGS: dict[str, float] = {}
+
+IMPORTTIME_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+@dataclass
+class ImportTiming:
+    """
+    Время импорта модуля по данным `python -X importtime`.
+
+    Атрибуты:
+        module: Имя модуля
+        self_ms: Время выполнения самого модуля
+        cumulative_ms: Время с учётом импортированных им модулей
+        depth: Вложенность импорта (0 — импорт верхнего уровня,
+            1 — импортирован им непосредственно)
+    """
+    module: str
+    self_ms: float
+    cumulative_ms: float
+    depth: int
+
+
+@contextmanager
+def timed_step(name: str) -> Iterator[None]:
+    """Замеряет шаг запуска и сохраняет его в STEP_TIMINGS."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STEP_TIMINGS[name] = time.perf_counter() - started
+        logger.info(f"Startup step {name} took {STEP_TIMINGS[name] * 1000:.1f} ms")
+
+
+def profile_imports(module: str = "api") -> list[ImportTiming]:
+    """
+    Замеряет импорт модуля в отдельном интерпретаторе.
+
+    Отдельный процесс нужен, чтобы модули не были уже загружены
+    и время отражало холодный старт реплики.
+
+    Args:
+        module: Импортируемый модуль
+
+    Returns:
+        list[ImportTiming]: Модули в порядке завершения импорта
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    timings = []
+    for line in completed.stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            timings.append(ImportTiming(
+                module=name,
+                self_ms=int(self_us) / 1000,
+                cumulative_ms=int(cumulative_us) / 1000,
+                depth=(len(indent) - 1) // 2,
+            ))
+    if completed.returncode != 0:
+        logger.error(f"Import of {module} failed: {completed.stderr[-500:]}")
+    return timings
+
+
+def profile_lifespan() -> None:
+    """Выполняет запуск и остановку lifespan приложения, замеряя шаги."""
+    from api import app
+
+    async def run() -> None:
+        async with app.router.lifespan_context(app):
+            pass
+
+    with timed_step("lifespan"):
+        try:
+            asyncio.run(run())
+        except Exception as e:
+            logger.error(f"Lifespan failed: {e}")
+
+
+def report(top: int = 15) -> str:
+    """
+    Формирует отчёт о времени запуска.
+
+    Args:
+        top: Число модулей в каждом разделе
+
+    Returns:
+        str: Текстовый отчёт
+    """
+    imports = profile_imports()
+    lines = []
+    # Модуль выводится после своих зависимостей: прямые импорты api —
+    # строки глубины 1 между предыдущим модулем верхнего уровня и api
+    direct = []
+    for index, timing in enumerate(imports):
+        if timing.module == "api" and timing.depth == 0:
+            lines.append(f"import api: {timing.cumulative_ms:.1f} ms")
+            for child in reversed(imports[:index]):
+                if child.depth == 0:
+                    break
+                if child.depth == 1:
+                    direct.append(child)
+
+    lines.append(f"\nDirect imports of api (top {top} by cumulative time):")
+    for timing in sorted(direct, key=lambda t: -t.cumulative_ms)[:top]:
+        lines.append(f"  {timing.cumulative_ms:9.1f} ms  {timing.module}")
+
+    lines.append(f"\nModules by own import time (top {top}):")
+    for timing in sorted(imports, key=lambda t: -t.self_ms)[:top]:
+        lines.append(f"  {timing.self_ms:9.1f} ms  {timing.module}")
+
+    profile_lifespan()
+    lines.append("\nStartup steps:")
+    for name, duration in STEP_TIMINGS.items():
+        lines.append(f"  {duration * 1000:9.1f} ms  {name}")
+    return "\n".join(lines)
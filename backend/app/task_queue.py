@@ -0,0 +1,281 @@
+"""Публикация ML-задач в RabbitMQ с маршрутизацией по модели.
+
+Задачи публикуются в topic-обменник с ключом `model.<имя модели>`.
+Воркеры привязывают к нему очереди моделей, которые держат в памяти,
+поэтому каждый воркер работает с небольшим набором «горячих» моделей.
+Задачи моделей, для которых нет выделенной очереди, через
+alternate-exchange попадают в общую очередь `ml_task_queue`. Очереди
+моделей объявляют только воркеры, с x-expires: очередь модели, которую
+перестали слушать, удаляется брокером, и её задачи снова идут в общую
+очередь; задачи, долго ждущие в очереди модели, переходят туда же
+(x-message-ttl с dead-letter в `ml_tasks.unrouted`).
+
+Топология должна объявляться одинаково здесь и в ml_worker/rmqconf.py.
+Fanout-обменник `ml_task_state` используют только процессы API для
+рассылки изменений состояния задач (см. task_state.py).
+
+pika импортируется при первом обращении к брокеру, а не при загрузке
+модуля: это ускоряет запуск процессов API.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from metrics import AMQP_PUBLISH_DURATION
+
+logger = logging.getLogger(__name__)
+
+TASK_EXCHANGE = 'ml_tasks'
+UNROUTED_EXCHANGE = 'ml_tasks.unrouted'
+DEFAULT_QUEUE = 'ml_task_queue'
+TASK_STATE_EXCHANGE = 'ml_task_state'
+
+
+def model_routing_key(model_name: str) -> str:
+    """Возвращает ключ маршрутизации для модели.
+
+    Точка — разделитель слов в topic-ключах, поэтому в имени модели
+    (например, `llama3.2:1b`) она заменяется на подчёркивание.
+
+    Args:
+        model_name: Имя модели в Ollama.
+
+    Returns:
+        str: Ключ маршрутизации вида `model.<имя>`.
+    """
+    return "model." + model_name.strip().replace(".", "_")
+
+
+def model_queue_name(model_name: str) -> str:
+    """Возвращает имя очереди задач модели (как в ml_worker/rmqconf.py).
+
+    Args:
+        model_name: Имя модели в Ollama.
+
+    Returns:
+        str: Имя очереди вида `ml_task_queue.<имя>`.
+    """
+    return f"{DEFAULT_QUEUE}.{model_name.strip()}"
+
+
+def declare_topology(channel) -> None:
+    """Объявляет обменники и общую очередь задач (идемпотентно).
+
+    Args:
+        channel: Канал RabbitMQ.
+    """
+    channel.exchange_declare(
+        exchange=UNROUTED_EXCHANGE, exchange_type='fanout', durable=True
+    )
+    channel.exchange_declare(
+        exchange=TASK_EXCHANGE,
+        exchange_type='topic',
+        durable=True,
+        arguments={'alternate-exchange': UNROUTED_EXCHANGE},
+    )
+    channel.queue_declare(queue=DEFAULT_QUEUE, durable=True)
+    channel.queue_bind(queue=DEFAULT_QUEUE, exchange=UNROUTED_EXCHANGE)
+
+
+def declare_task_state_exchange(channel) -> None:
+    """Объявляет обменник рассылки состояния задач между процессами API.
+
+    Args:
+        channel: Канал RabbitMQ.
+    """
+    channel.exchange_declare(
+        exchange=TASK_STATE_EXCHANGE, exchange_type='fanout', durable=False
+    )
+
+
+def connection_parameters():
+    """Возвращает параметры подключения к RabbitMQ из окружения.
+
+    Returns:
+        pika.ConnectionParameters: Параметры подключения.
+    """
+    pika = _pika()
+    credentials = pika.PlainCredentials(
+        os.getenv('RABBITMQ_USER', 'admin'),
+        os.getenv('RABBITMQ_PASS', 'password123'),
+    )
+    return pika.ConnectionParameters(
+        host=os.getenv('RABBITMQ_HOST', 'rabbitmq'),
+        port=int(os.getenv('RABBITMQ_PORT', '5672')),
+        credentials=credentials,
+        heartbeat=600,
+        blocked_connection_timeout=300
+    )
+
+
+def _pika():
+    """Возвращает модуль pika, импортируя его при первом вызове."""
+    import pika
+    return pika
+
+
+class TaskPublisher:
+    """Издатель задач с постоянным соединением к RabbitMQ.
+
+    Соединение открывается при первой публикации и переиспользуется.
+    BlockingConnection не потокобезопасен, поэтому публикации
+    сериализуются блокировкой; при обрыве соединение открывается заново.
+    """
+
+    def __init__(self):
+        self._connection = None
+        self._channel = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> None:
+        pika = _pika()
+        self._connection = pika.BlockingConnection(connection_parameters())
+        self._channel = self._connection.channel()
+        declare_topology(self._channel)
+        declare_task_state_exchange(self._channel)
+
+    @property
+    def is_connected(self) -> bool:
+        """Открыто ли соединение с брокером."""
+        return bool(self._connection and self._connection.is_open)
+
+    def publish(
+        self,
+        routing_key: str,
+        message: dict,
+        headers: dict | None = None,
+        exchange: str = TASK_EXCHANGE,
+    ) -> None:
+        """Публикует сообщение в обменник задач.
+
+        Args:
+            routing_key: Ключ маршрутизации (см. model_routing_key).
+            message: Тело сообщения, сериализуется в JSON.
+            headers: Заголовки AMQP-сообщения (например, traceparent).
+            exchange: Обменник (по умолчанию — обменник задач).
+
+        Raises:
+            pika.exceptions.AMQPError: Если публикация не удалась
+                и после переподключения.
+        """
+        pika = _pika()
+        body = json.dumps(message)
+        started = time.perf_counter()
+        result = "error"
+        try:
+            with self._lock:
+                for attempt in range(2):
+                    try:
+                        if not self.is_connected:
+                            self._connect()
+                        self._channel.basic_publish(
+                            exchange=exchange,
+                            routing_key=routing_key,
+                            body=body,
+                            properties=pika.BasicProperties(
+                                delivery_mode=2, headers=headers
+                            )
+                        )
+                        result = "ok"
+                        return
+                    except pika.exceptions.AMQPError as e:
+                        # Соединение могло быть закрыто брокером за время простоя
+                        logger.warning(
+                            f"Publish failed (attempt {attempt + 1}): {e}"
+                        )
+                        self.close()
+                        if attempt:
+                            raise
+        finally:
+            # Время включает ожидание блокировки: его видит запрос predict
+            AMQP_PUBLISH_DURATION.labels(result).observe(
+                time.perf_counter() - started
+            )
+
+    def close(self) -> None:
+        """Закрывает соединение, игнорируя ошибки уже оборванного."""
+        if self._connection is None:
+            return
+        pika = _pika()
+        try:
+            if self._connection and self._connection.is_open:
+                self._connection.close()
+        except pika.exceptions.AMQPError:
+            pass
+        self._connection = None
+        self._channel = None
+
+
+task_publisher = TaskPublisher()
+
+
+class QueueInspector:
+    """Чтение глубины очередей задач для проверок готовности.
+
+    Держит отдельное от издателя соединение: медленное подключение
+    к брокеру при проверке не задерживает публикацию задач.
+    """
+
+    def __init__(self):
+        self._connection = None
+        self._channel = None
+        self._lock = threading.Lock()
+
+    def queue_depths(self, queues: list[str]) -> dict[str, int | None]:
+        """Возвращает число сообщений в очередях.
+
+        Args:
+            queues: Имена очередей.
+
+        Returns:
+            dict[str, int | None]: Число готовых к доставке сообщений;
+                None для очереди, которой нет (очередь модели без
+                воркеров удалена брокером, её задачи идут в общую).
+
+        Raises:
+            pika.exceptions.AMQPError: Если брокер недоступен.
+        """
+        pika = _pika()
+        depths = {}
+        with self._lock:
+            try:
+                for queue in queues:
+                    if self._channel is None or not self._channel.is_open:
+                        if self._connection is None or not self._connection.is_open:
+                            self._connection = pika.BlockingConnection(
+                                connection_parameters()
+                            )
+                        self._channel = self._connection.channel()
+                    try:
+                        declared = self._channel.queue_declare(
+                            queue=queue, passive=True
+                        )
+                    except pika.exceptions.ChannelClosedByBroker as e:
+                        # Пассивное объявление отсутствующей очереди закрывает канал
+                        if e.reply_code != 404:
+                            raise
+                        depths[queue] = None
+                        continue
+                    depths[queue] = declared.method.message_count
+            except pika.exceptions.AMQPError:
+                self.close()
+                raise
+        return depths
+
+    def close(self) -> None:
+        """Закрывает соединение, игнорируя ошибки уже оборванного."""
+        if self._connection is None:
+            return
+        pika = _pika()
+        try:
+            if self._connection.is_open:
+                self._connection.close()
+        except pika.exceptions.AMQPError:
+            pass
+        self._connection = None
+        self._channel = None
+
+
+queue_inspector = QueueInspector()
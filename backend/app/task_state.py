@@ -0,0 +1,274 @@
+"""Состояние ML-задач в памяти для опроса результатов.
+
+Клиенты опрашивают /api/predict/result/{task_id}, пока задача
+выполняется. Состояние задачи (ожидание, результат или ошибка) хранится
+в TaskStateStore: ml_predict записывает ожидание, receive_task_result —
+итог, а эндпоинт результата читает его из памяти. PostgreSQL остаётся
+долговременной историей: к нему эндпоинт обращается только при промахе
+(задача создана другим процессом до его запуска или вытеснена по TTL).
+
+Хранилище подключается зависимостью get_task_state_store и реализует
+протокол TaskStateStore, поэтому MemoryTaskStateStore можно заменить
+общим хранилищем, а в тестах — отдельным экземпляром.
+
+Процессы API (serve.py) обмениваются изменениями через fanout-обменник
+RabbitMQ (TaskStateFeed): изменение получают все процессы и применяют
+к своим хранилищам. Если сообщение потеряно (например, при
+переподключении к брокеру), ожидание устаревает через
+TASK_STATE_PENDING_TTL, и следующий опрос читает БД.
+
+Запросы с ожиданием (?wait=) подписываются на итог задачи и получают
+его сразу после записи, без повторных опросов.
+"""
+
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Optional, Protocol
+from task_queue import (
+    TASK_STATE_EXCHANGE,
+    TaskPublisher,
+    connection_parameters,
+    declare_task_state_exchange,
+    task_publisher,
+)
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Время хранения итога задачи в памяти, секунды
+TASK_STATE_TTL = float(os.getenv("TASK_STATE_TTL", "600"))
+# Время, после которого ожидание перепроверяется по БД, секунды
+TASK_STATE_PENDING_TTL = float(os.getenv("TASK_STATE_PENDING_TTL", "60"))
+TASK_STATE_MAX_ENTRIES = int(os.getenv("TASK_STATE_MAX_ENTRIES", "10000"))
+# 0 — не рассылать изменения другим процессам API (один процесс)
+TASK_STATE_FANOUT = os.getenv("TASK_STATE_FANOUT", "1") == "1"
+FEED_RECONNECT_DELAY = 5.0  # seconds
+
+STATUS_PENDING = "pending"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+
+
+@dataclass(frozen=True)
+class TaskState:
+    """
+    Состояние задачи, достаточное для ответа на опрос результата.
+
+    Атрибуты:
+        task_id: Идентификатор задачи
+        user_id: Владелец задачи (результат отдаётся только ему)
+        model_id: Модель, выполняющая задачу
+        status: pending | completed | failed
+        result: Исправленный текст (для completed)
+        error: Описание ошибки (для failed)
+        created_at: Время создания задачи в ISO-формате
+    """
+    task_id: str
+    user_id: int
+    model_id: int
+    status: str
+    result: Optional[str] = None
+    error: Optional[str] = None
+    created_at: Optional[str] = None
+
+    @property
+    def finished(self) -> bool:
+        """Завершена ли задача (итог больше не меняется)."""
+        return self.status != STATUS_PENDING
+
+
+class TaskStateStore(Protocol):
+    """Хранилище состояния задач с уведомлением об итоге."""
+
+    def get(self, task_id: str) -> Optional[TaskState]:
+        """Возвращает состояние задачи или None, если его нет."""
+
+    def put(self, state: TaskState) -> None:
+        """Сохраняет состояние и будит ожидающих итога задачи."""
+
+    async def wait(self, task_id: str, timeout: float) -> Optional[TaskState]:
+        """Ждёт итога задачи не дольше timeout секунд."""
+
+
+class MemoryTaskStateStore:
+    """
+    Хранилище состояния задач в памяти процесса.
+
+    Записи вытесняются по TTL (итог и ожидание — с разными сроками)
+    и по числу записей в порядке давности обновления. Методы вызываются
+    из цикла событий: ожидающие итога — asyncio.Future этого цикла.
+    """
+
+    def __init__(
+        self,
+        ttl: float = TASK_STATE_TTL,
+        pending_ttl: float = TASK_STATE_PENDING_TTL,
+        max_entries: int = TASK_STATE_MAX_ENTRIES,
+    ):
+        self.ttl = ttl
+        self.pending_ttl = pending_ttl
+        self.max_entries = max_entries
+        self._states: OrderedDict[str, tuple[TaskState, float]] = OrderedDict()
+        self._waiters: dict[str, set[asyncio.Future]] = {}
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def get(self, task_id: str) -> Optional[TaskState]:
+        entry = self._states.get(task_id)
+        if entry is None:
+            return None
+        state, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._states[task_id]
+            return None
+        return state
+
+    def put(self, state: TaskState) -> None:
+        current = self.get(state.task_id)
+        if current is not None and current.finished and not state.finished:
+            # Рассылка ожидания из другого процесса пришла позже итога
+            return
+        ttl = self.ttl if state.finished else self.pending_ttl
+        self._states[state.task_id] = (state, time.monotonic() + ttl)
+        self._states.move_to_end(state.task_id)
+        while len(self._states) > self.max_entries:
+            self._states.popitem(last=False)
+        if state.finished:
+            for waiter in self._waiters.pop(state.task_id, ()):
+                if not waiter.done():
+                    waiter.set_result(state)
+
+    async def wait(self, task_id: str, timeout: float) -> Optional[TaskState]:
+        """
+        Ждёт итога задачи.
+
+        Args:
+            task_id: Идентификатор задачи
+            timeout: Максимальное время ожидания в секундах
+
+        Returns:
+            Optional[TaskState]: Итог задачи; по таймауту — текущее
+                состояние из хранилища (None, если его нет)
+        """
+        state = self.get(task_id)
+        if state is not None and state.finished:
+            return state
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(task_id, set()).add(waiter)
+        try:
+            return await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            return self.get(task_id)
+        finally:
+            waiters = self._waiters.get(task_id)
+            if waiters is not None:
+                waiters.discard(waiter)
+                if not waiters:
+                    del self._waiters[task_id]
+
+
+class TaskStateFeed:
+    """
+    Рассылка изменений состояния задач между процессами API.
+
+    Изменения публикуются в fanout-обменник через издателя задач.
+    Каждый процесс читает их в фоновом потоке из своей временной очереди
+    и применяет к своему хранилищу в цикле событий. Пока рассылка не
+    запущена (один процесс, тесты), broadcast ничего не делает.
+    """
+
+    def __init__(
+        self, store: TaskStateStore, publisher: TaskPublisher = task_publisher
+    ):
+        self.store = store
+        self.publisher = publisher
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        """Запущена ли рассылка."""
+        return self._thread is not None
+
+    def broadcast(self, state: TaskState) -> None:
+        """Публикует изменение для остальных процессов, не прерывая запрос."""
+        if not self.running:
+            return
+        try:
+            self.publisher.publish("", asdict(state), exchange=TASK_STATE_EXCHANGE)
+        except Exception as e:
+            logger.warning(f"Task state broadcast for {state.task_id} failed: {e}")
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Запускает приём изменений от других процессов.
+
+        Args:
+            loop: Цикл событий, в котором применяются изменения.
+        """
+        if self.running:
+            return
+        self._loop = loop
+        self._stopping.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="task-state-feed", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Останавливает приём изменений."""
+        if not self.running:
+            return
+        self._stopping.set()
+        self._thread.join(timeout=FEED_RECONNECT_DELAY)
+        self._thread = None
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                self._consume()
+            except Exception as e:
+                logger.warning(f"Task state feed disconnected: {e!r}")
+                self._stopping.wait(FEED_RECONNECT_DELAY)
+
+    def _consume(self) -> None:
+        import pika
+
+        connection = pika.BlockingConnection(connection_parameters())
+        try:
+            channel = connection.channel()
+            declare_task_state_exchange(channel)
+            queue = channel.queue_declare(queue="", exclusive=True).method.queue
+            channel.queue_bind(queue=queue, exchange=TASK_STATE_EXCHANGE)
+            channel.basic_consume(
+                queue=queue, on_message_callback=self._on_message, auto_ack=True
+            )
+            logger.info("Task state feed connected")
+            while not self._stopping.is_set():
+                connection.process_data_events(time_limit=1)
+        finally:
+            if connection.is_open:
+                connection.close()
+
+    def _on_message(self, channel, method, properties, body: bytes) -> None:
+        try:
+            state = TaskState(**json.loads(body))
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Invalid task state message: {e}")
+            return
+        self._loop.call_soon_threadsafe(self.store.put, state)
+
+
+task_states = MemoryTaskStateStore()
+task_state_feed = TaskStateFeed(task_states)
+
+
+def get_task_state_store() -> TaskStateStore:
+    """Зависимость FastAPI: хранилище состояния задач процесса."""
+    return task_states
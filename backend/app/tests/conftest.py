@@ -10,6 +10,8 @@ from fastapi import FastAPI
 from fastapi.testclient import TestClient
 from api import create_application
 from database.create_tables import get_session
+from database.routing import get_read_session
+from task_state import MemoryTaskStateStore, get_task_state_store
 
 
 APP_DIR = Path(__file__).resolve().parents[1]
@@ -129,9 +131,21 @@ def client(engine):
 
     app = create_application()
     app.dependency_overrides[get_session] = override_get_session
+    app.dependency_overrides[get_read_session] = override_get_session
+    # Своё хранилище состояния задач: тесты не видят задач друг друга
+    task_states = MemoryTaskStateStore()
+    app.dependency_overrides[get_task_state_store] = lambda: task_states
     app.router.lifespan_context = no_lifespan
 
     with TestClient(app) as test_client:
         yield test_client
 
     app.dependency_overrides.clear()
+
+
+@pytest.fixture()
+def worker_headers(monkeypatch):
+    import auth
+
+    monkeypatch.setattr(auth.settings, "WORKER_API_TOKEN", "test-worker-token")
+    return {"Authorization": "Bearer test-worker-token"}
@@ -0,0 +1,124 @@
+import time
+import pytest
+import routes.home as home_routes
+from health import ReadinessChecker, database_probe, queue_probe
+pytest.importorskip("fastapi")
+
+
+class FakeInspector:
+    def __init__(self, depth=0, error=None, missing=()):
+        self.depth = depth
+        self.error = error
+        self.missing = set(missing)
+        self.calls = 0
+
+    def queue_depths(self, queues):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return {
+            queue: None if queue in self.missing else self.depth
+            for queue in queues
+        }
+
+
+def test_liveness_does_not_check_dependencies(client, monkeypatch):
+    def broken_probe():
+        raise AssertionError("liveness must not run readiness probes")
+
+    monkeypatch.setattr(
+        home_routes, "readiness", ReadinessChecker({"database": broken_probe})
+    )
+
+    response = client.get("/health/live")
+    assert response.status_code == 200
+    assert response.json() == {"status": "alive"}
+    assert client.get("/health").status_code == 200
+
+
+def test_readiness_reports_dependencies_and_caches_result(
+    client, engine, monkeypatch
+):
+    inspector = FakeInspector(depth=3)
+    monkeypatch.setattr(home_routes, "readiness", ReadinessChecker(
+        {
+            "database": database_probe(engine),
+            "rabbitmq": queue_probe(inspector, models=["m1"]),
+        },
+        ttl=60,
+    ))
+
+    response = client.get("/health/ready")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["status"] == "ready"
+    assert body["checks"]["database"]["status"] == "ok"
+    assert body["checks"]["rabbitmq"]["status"] == "ok"
+    assert body["checks"]["rabbitmq"]["detail"] == {
+        "queue_depth": 6,
+        "queues": {"ml_task_queue": 3, "ml_task_queue.m1": 3},
+    }
+    assert body["checks"]["database"]["latency_ms"] >= 0
+
+    # Повторный опрос в пределах ttl не обращается к зависимостям
+    assert client.get("/health/ready").json() == body
+    assert inspector.calls == 1
+
+
+def test_readiness_fails_when_broker_unreachable(client, engine, monkeypatch):
+    inspector = FakeInspector(error=ConnectionError("connection refused"))
+    monkeypatch.setattr(home_routes, "readiness", ReadinessChecker(
+        {"database": database_probe(engine), "rabbitmq": queue_probe(inspector)},
+        ttl=0,
+    ))
+
+    response = client.get("/health/ready")
+    assert response.status_code == 503
+    body = response.json()
+    assert body["status"] == "not_ready"
+    assert body["checks"]["database"]["status"] == "ok"
+    assert body["checks"]["rabbitmq"]["status"] == "fail"
+    assert "connection refused" in body["checks"]["rabbitmq"]["detail"]["error"]
+
+
+def test_readiness_times_out_slow_dependency_and_flags_backlog(
+    client, monkeypatch
+):
+    monkeypatch.setattr(home_routes, "readiness", ReadinessChecker(
+        {
+            "database": lambda: time.sleep(1) or {},
+            "rabbitmq": queue_probe(
+                FakeInspector(depth=50), models=["m1"], max_depth=10
+            ),
+        },
+        ttl=0,
+        timeout=0.05,
+    ))
+
+    started = time.perf_counter()
+    response = client.get("/health/ready")
+    assert time.perf_counter() - started < 0.9
+    assert response.status_code == 503
+    checks = response.json()["checks"]
+    assert checks["database"]["status"] == "fail"
+    assert "timed out" in checks["database"]["detail"]["error"]
+    # Очередь перегружена, но брокер доступен: готовность не снимается
+    assert checks["rabbitmq"]["status"] == "degraded"
+
+
+def test_queue_probe_checks_model_queues_and_skips_expired_ones():
+    probe = queue_probe(
+        FakeInspector(depth=20, missing={"ml_task_queue.m2"}),
+        models=["m1", "m2"],
+        max_depth=10,
+    )
+
+    detail = probe()
+
+    assert detail["queues"] == {
+        "ml_task_queue": 20,
+        "ml_task_queue.m1": 20,
+        "ml_task_queue.m2": None,
+    }
+    assert detail["queue_depth"] == 40
+    assert detail["status"] == "degraded"
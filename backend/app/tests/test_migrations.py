@@ -0,0 +1,116 @@
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, select
+from database import migrations
+from models.user import MLModel
+
+
+@pytest.fixture()
+def empty_engine():
+    return create_engine(
+        "sqlite+pysqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+
+
+def test_verify_schema_rejects_unmigrated_database(empty_engine):
+    with pytest.raises(migrations.SchemaVersionError):
+        migrations.verify_schema(empty_engine)
+
+
+def test_bootstrap_migrates_to_latest_once_and_seeds_default_model(empty_engine):
+    assert migrations.bootstrap(empty_engine) == migrations.LATEST_VERSION
+    assert migrations.verify_schema(empty_engine) == migrations.LATEST_VERSION
+
+    # Повторный запуск (новая реплика) ничего не меняет
+    assert migrations.bootstrap(empty_engine) == migrations.LATEST_VERSION
+    with Session(empty_engine) as session:
+        models = session.exec(select(MLModel)).all()
+        versions = session.exec(text("SELECT version FROM schema_version")).all()
+    assert [model.name for model in models] == [migrations.DEFAULT_OLLAMA_MODEL]
+    assert models[0].prompt_template == migrations.DEFAULT_PROMPT_TEMPLATE
+    assert versions == [(migrations.LATEST_VERSION,)]
+
+
+def test_upgrade_adds_columns_missing_in_database_created_before_migrations(
+    empty_engine,
+):
+    with empty_engine.begin() as connection:
+        connection.exec_driver_sql(
+            "CREATE TABLE mlmodel (id INTEGER PRIMARY KEY, name VARCHAR, "
+            "version VARCHAR, description VARCHAR, file_path VARCHAR, "
+            "created_at DATETIME, user_id INTEGER)"
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO mlmodel (name, version, file_path, user_id) "
+            "VALUES ('legacy', '1.0.0', '/models/legacy', 1)"
+        )
+
+    assert migrations.upgrade(empty_engine) == migrations.LATEST_VERSION
+
+    columns = {
+        column["name"] for column in inspect(empty_engine).get_columns("mlmodel")
+    }
+    assert {"prompt_template", "generation_options"} <= columns
+    history_columns = {
+        column["name"]
+        for column in inspect(empty_engine).get_columns("mlpredictionhistory")
+    }
+    assert "eval_duration" in history_columns
+    with Session(empty_engine) as session:
+        legacy = session.exec(select(MLModel)).one()
+    assert legacy.name == "legacy"
+    assert legacy.generation_options is None
+
+
+def test_upgrade_recreates_sentence_cache_without_user_scope(empty_engine):
+    migrations.upgrade(empty_engine)
+    with empty_engine.begin() as connection:
+        connection.exec_driver_sql("DROP TABLE sentencecorrection")
+        connection.exec_driver_sql(
+            "CREATE TABLE sentencecorrection (fingerprint VARCHAR PRIMARY KEY, "
+            "model_id INTEGER, corrected VARCHAR)"
+        )
+        connection.exec_driver_sql("UPDATE schema_version SET version = 3")
+
+    assert migrations.upgrade(empty_engine) == migrations.LATEST_VERSION
+
+    columns = {
+        column["name"]
+        for column in inspect(empty_engine).get_columns("sentencecorrection")
+    }
+    assert {"user_id", "created_at"} <= columns
+
+
+def test_upgrade_backfills_prompt_settings_of_existing_default_model(empty_engine):
+    with empty_engine.begin() as connection:
+        connection.exec_driver_sql(
+            "CREATE TABLE mlmodel (id INTEGER PRIMARY KEY, name VARCHAR, "
+            "version VARCHAR, description VARCHAR, file_path VARCHAR, "
+            "created_at DATETIME, user_id INTEGER)"
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO mlmodel (name, version, file_path, user_id) "
+            f"VALUES ('{migrations.DEFAULT_OLLAMA_MODEL}', '1.0.0', '/models/m', 1)"
+        )
+
+    assert migrations.bootstrap(empty_engine) == migrations.LATEST_VERSION
+
+    with Session(empty_engine) as session:
+        model = session.exec(select(MLModel)).one()
+    assert model.prompt_template == migrations.DEFAULT_PROMPT_TEMPLATE
+    assert model.generation_options == migrations.DEFAULT_GENERATION_OPTIONS
+
+
+def test_seed_failure_rolls_back_migrations(empty_engine, monkeypatch):
+    def broken_seed(connection):
+        raise RuntimeError("seed failed")
+
+    monkeypatch.setattr(migrations, "create_default_ml_model", broken_seed)
+
+    with pytest.raises(RuntimeError):
+        migrations.bootstrap(empty_engine)
+    with empty_engine.connect() as connection:
+        assert migrations.current_version(connection) == 0
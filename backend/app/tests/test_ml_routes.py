@@ -1,11 +1,18 @@
 import pytest
+from datetime import datetime, timedelta
 from sqlmodel import select
 from models.user import (
     Balance,
     MLPredictionHistory,
+    PredictionSegment,
     Transaction,
 )
+from sqlmodel import Session
+from database import get_read_session, get_session
+from task_state import get_task_state_store
+import auth
 import routes.ml as ml_routes
+import tracing
 pytest.importorskip("fastapi")
 pytest.importorskip("bcrypt")
 pytest.importorskip("jose")
@@ -59,6 +66,31 @@ def test_ml_predict_success_deducts_balance_and_creates_history(
     assert history[0].task_id in body["result"]
 
 
+def test_metrics_endpoint_exposes_route_and_predict_metrics(
+    client, user_factory, ml_model_factory, monkeypatch
+):
+    user = user_factory(username="user1", email="user1@example.com", balance_amount=5.0)
+    model = ml_model_factory(user_id=user.id, name="m1")
+    headers = _login(client, username=user.username, password="password")
+    monkeypatch.setattr(ml_routes, "send_task_to_queue", lambda **_: True)
+
+    rejected = client.post(
+        "/api/predict/predict",
+        headers=headers,
+        json={"text": "hello", "model_id": model.id},
+    )
+    assert rejected.status_code == 402
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    body = response.text
+    assert 'ml_predict_rejected_total{reason="insufficient_balance"}' in body
+    assert (
+        'http_request_duration_seconds_count{method="POST",'
+        'route="/api/predict/predict",status="402"}'
+    ) in body
+
+
 def test_ml_predict_forbids_prediction_for_other_user_id(
     client, user_factory, ml_model_factory
 ):
@@ -129,8 +161,40 @@ def test_ml_predict_refunds_balance_when_queue_send_fails(
     assert history == []
 
 
+def test_ml_predict_commits_history_before_publishing(
+    client, session, user_factory, ml_model_factory, monkeypatch
+):
+    user = user_factory(username="user1", email="user1@example.com", balance_amount=50.0)
+    model = ml_model_factory(user_id=user.id, name="m1")
+    headers = _login(client, username=user.username, password="password")
+
+    # Воркер может ответить сразу после публикации: запись задачи
+    # к этому моменту уже должна быть в БД
+    visible = []
+
+    def send(**task):
+        session.expire_all()
+        visible.append(session.exec(
+            select(MLPredictionHistory).where(
+                MLPredictionHistory.task_id == task["task_id"]
+            )
+        ).first())
+        return True
+
+    monkeypatch.setattr(ml_routes, "send_task_to_queue", send)
+
+    response = client.post(
+        "/api/predict/predict",
+        headers=headers,
+        json={"text": "hello", "model_id": model.id},
+    )
+    assert response.status_code == 200
+    assert visible[0] is not None
+    assert visible[0].result.startswith("PENDING:")
+
+
 def test_receive_task_result_updates_history_record(
-    client, session, user_factory, ml_model_factory
+    client, worker_headers, session, user_factory, ml_model_factory
 ):
     user = user_factory(username="user1", email="user1@example.com", balance_amount=100.0)
     model = ml_model_factory(user_id=user.id, name="m1")
@@ -148,6 +212,7 @@ def test_receive_task_result_updates_history_record(
 
     result = client.post(
         "/api/predict/send_task_result",
+        headers=worker_headers,
         json={
             "task_id": "task-1",
             "prediction": "OK",
@@ -164,9 +229,90 @@ def test_receive_task_result_updates_history_record(
     assert saved.result == "OK"
 
 
-def test_receive_task_result_returns_error_when_task_not_found(client):
+def test_ml_predict_reprocesses_only_changed_sentences(
+    client, worker_headers, session, user_factory, ml_model_factory, monkeypatch
+):
+    user = user_factory(username="user1", email="user1@example.com", balance_amount=50.0)
+    model = ml_model_factory(user_id=user.id, name="m1")
+    headers = _login(client, username=user.username, password="password")
+
+    queued = []
+    monkeypatch.setattr(
+        ml_routes, "send_task_to_queue", lambda **kwargs: queued.append(kwargs) or True
+    )
+
+    def predict_and_finish(text, corrections):
+        response = client.post(
+            "/api/predict/predict",
+            headers=headers,
+            json={"text": text, "model_id": model.id},
+        )
+        assert response.status_code == 200
+        task = queued[-1]
+        segments = [
+            {"index": item["index"], "text": corrections[item["text"]]}
+            for item in task["features"]["segments"]
+        ]
+        result = client.post(
+            "/api/predict/send_task_result",
+            headers=worker_headers,
+            json={
+                "task_id": task["task_id"],
+                "prediction": "",
+                "worker_id": "worker-1",
+                "status": "success",
+                "segments": segments,
+            },
+        )
+        assert result.status_code == 200
+        return task
+
+    first = predict_and_finish(
+        "Превет мир. Как дила?",
+        {"Превет мир.": "Привет мир.", "Как дила?": "Как дела?"},
+    )
+    assert len(first["features"]["segments"]) == 2
+
+    second = predict_and_finish(
+        "Превет мир. Где ты?",
+        {"Где ты?": "Где ты?"},
+    )
+    assert second["features"]["segments"] == [{"index": 1, "text": "Где ты?"}]
+
+    session.expire_all()
+    history = session.exec(
+        select(MLPredictionHistory).where(MLPredictionHistory.task_id == second["task_id"])
+    ).first()
+    assert history.result == "Привет мир. Где ты?"
+    assert history.cost == ml_routes.incremental_cost(
+        ml_routes.split_sentences("Превет мир. Где ты?"), [1]
+    )
+    assert 0 < history.cost < ml_routes.PREDICTION_COST
+
+    # Текст целиком из кэша: ответ сразу, без очереди и без списания
+    published = len(queued)
+    balance_before = session.exec(
+        select(Balance).where(Balance.user_id == user.id)
+    ).first().amount
+    response = client.post(
+        "/api/predict/predict",
+        headers=headers,
+        json={"text": "Превет мир. Где ты?", "model_id": model.id},
+    )
+    assert response.status_code == 200
+    assert response.json()["status"] == "completed"
+    assert response.json()["result"] == "Привет мир. Где ты?"
+    assert len(queued) == published
+    session.expire_all()
+    assert session.exec(
+        select(Balance).where(Balance.user_id == user.id)
+    ).first().amount == balance_before
+
+
+def test_receive_task_result_returns_404_when_task_not_found(client, worker_headers):
     result = client.post(
         "/api/predict/send_task_result",
+        headers=worker_headers,
         json={
             "task_id": "missing",
             "prediction": "OK",
@@ -174,9 +320,101 @@ def test_receive_task_result_returns_error_when_task_not_found(client):
             "status": "completed",
         },
     )
-    assert result.status_code == 200
-    assert result.json()["status"] == "error"
-    assert result.json()["message"] == "Task not found"
+    # Не 200: воркер не подтверждает сообщение и досылает результат позже
+    assert result.status_code == 404
+    assert result.json()["detail"] == "Task not found"
+
+
+def test_receive_task_result_requires_worker_token(
+    client, worker_headers, session, user_factory, ml_model_factory
+):
+    user = user_factory(username="user1", email="user1@example.com", balance_amount=100.0)
+    model = ml_model_factory(user_id=user.id, name="m1")
+    session.add(
+        MLPredictionHistory(
+            user_id=user.id,
+            model_id=model.id,
+            input_text="hello",
+            result="PENDING:task-1",
+            cost=ml_routes.PREDICTION_COST,
+            task_id="task-1",
+        )
+    )
+    session.commit()
+    payload = {
+        "task_id": "task-1",
+        "prediction": "forged",
+        "worker_id": "worker-1",
+        "status": "completed",
+    }
+
+    anonymous = client.post("/api/predict/send_task_result", json=payload)
+    user_token = client.post(
+        "/api/predict/send_task_result",
+        headers=_login(client, username=user.username, password="password"),
+        json=payload,
+    )
+
+    assert anonymous.status_code == 401
+    assert user_token.status_code == 401
+    history = session.exec(
+        select(MLPredictionHistory).where(MLPredictionHistory.task_id == "task-1")
+    ).first()
+    assert history.result == "PENDING:task-1"
+
+
+def test_receive_task_result_error_refunds_once_and_reports_failure(
+    client, worker_headers, session, user_factory, ml_model_factory
+):
+    user = user_factory(username="user1", email="user1@example.com", balance_amount=90.0)
+    model = ml_model_factory(user_id=user.id, name="m1")
+    headers = _login(client, username=user.username, password="password")
+
+    session.add(
+        MLPredictionHistory(
+            user_id=user.id,
+            model_id=model.id,
+            input_text="hello",
+            result="PENDING:task-1",
+            cost=ml_routes.PREDICTION_COST,
+            task_id="task-1",
+        )
+    )
+    session.commit()
+
+    payload = {
+        "task_id": "task-1",
+        "prediction": "",
+        "worker_id": "worker-1",
+        "status": "error",
+        "error": "Ошибка сервера: 500",
+    }
+    # Повторная доставка того же результата не должна вернуть средства дважды
+    for _ in range(2):
+        result = client.post(
+            "/api/predict/send_task_result",
+            headers=worker_headers,
+            json=payload,
+        )
+        assert result.status_code == 200
+        assert result.json()["status"] == "success"
+
+    session.expire_all()
+    balance = session.exec(select(Balance).where(Balance.user_id == user.id)).first()
+    assert balance.amount == 90.0 + ml_routes.PREDICTION_COST
+
+    refunds = session.exec(
+        select(Transaction).where(
+            Transaction.user_id == user.id, Transaction.type == "deposit"
+        )
+    ).all()
+    assert len(refunds) == 1
+    assert refunds[0].amount == ml_routes.PREDICTION_COST
+
+    failed = client.get("/api/predict/result/task-1", headers=headers)
+    assert failed.status_code == 200
+    assert failed.json()["status"] == "failed"
+    assert failed.json()["error"] == "Ошибка сервера: 500"
 
 
 def test_get_prediction_result_pending_and_completed(
@@ -196,6 +434,9 @@ def test_get_prediction_result_pending_and_completed(
     )
     session.add(record)
     session.commit()
+    # Ожидание из БД кэшируется на TASK_STATE_PENDING_TTL: по его
+    # истечении (здесь — сразу) опрос снова читает БД
+    client.app.dependency_overrides[get_task_state_store]().pending_ttl = 0
 
     pending = client.get(
         "/api/predict/result/task-1",
@@ -242,3 +483,400 @@ def test_get_prediction_result_returns_404_for_other_user(
         headers=other_headers,
     )
     assert response.status_code == 404
+
+
+def test_prediction_result_is_served_from_task_state_store(
+    client, worker_headers, session, user_factory, ml_model_factory
+):
+    user = user_factory(username="user1", email="user1@example.com", balance_amount=100.0)
+    other = user_factory(username="user2", email="user2@example.com", balance_amount=100.0)
+    model = ml_model_factory(user_id=user.id, name="m1")
+    headers = _login(client, username=user.username, password="password")
+    other_headers = _login(client, username=other.username, password="password")
+
+    record = MLPredictionHistory(
+        user_id=user.id,
+        model_id=model.id,
+        input_text="hello",
+        result="PENDING:task-1",
+        cost=ml_routes.PREDICTION_COST,
+        task_id="task-1",
+    )
+    session.add(record)
+    session.commit()
+
+    pending = client.get("/api/predict/result/task-1?wait=0.05", headers=headers)
+    assert pending.json()["status"] == "pending"
+
+    client.post(
+        "/api/predict/send_task_result",
+        headers=worker_headers,
+        json={
+            "task_id": "task-1",
+            "prediction": "OK",
+            "worker_id": "worker-1",
+            "status": "completed",
+        },
+    )
+    # Опрос отвечает из памяти: изменение записи в обход API не видно
+    record.result = "changed in database"
+    session.add(record)
+    session.commit()
+
+    completed = client.get("/api/predict/result/task-1?wait=5", headers=headers)
+    assert completed.json()["status"] == "completed"
+    assert completed.json()["result"] == "OK"
+    assert completed.json()["model_id"] == model.id
+
+    foreign = client.get("/api/predict/result/task-1", headers=other_headers)
+    assert foreign.status_code == 404
+
+
+def test_pending_result_is_cached_and_sessions_released_while_waiting(
+    client, engine, session, user_factory, ml_model_factory
+):
+    user = user_factory(username="user1", email="user1@example.com", balance_amount=100.0)
+    model = ml_model_factory(user_id=user.id, name="m1")
+    headers = _login(client, username=user.username, password="password")
+    session.add(
+        MLPredictionHistory(
+            user_id=user.id,
+            model_id=model.id,
+            input_text="hello",
+            result="PENDING:task-1",
+            cost=ml_routes.PREDICTION_COST,
+            task_id="task-1",
+        )
+    )
+    session.commit()
+
+    opened = []
+
+    def recording_session():
+        with Session(engine) as request_session:
+            opened.append(request_session)
+            yield request_session
+
+    overrides = client.app.dependency_overrides
+    overrides[get_session] = overrides[get_read_session] = recording_session
+    task_states = overrides[get_task_state_store]()
+    in_transaction = []
+
+    async def wait(task_id, timeout):
+        in_transaction.extend(db.in_transaction() for db in opened)
+        return task_states.get(task_id)
+
+    task_states.wait = wait
+
+    pending = client.get("/api/predict/result/task-1?wait=5", headers=headers)
+
+    assert pending.json()["status"] == "pending"
+    assert in_transaction and not any(in_transaction)
+    assert task_states.get("task-1").status == "pending"
+
+
+def test_list_ml_models_returns_registered_models(
+    client, user_factory, ml_model_factory
+):
+    user = user_factory(username="user1", email="user1@example.com")
+    ml_model_factory(user_id=user.id, name="m1")
+    ml_model_factory(user_id=user.id, name="m2")
+    headers = _login(client, username=user.username, password="password")
+
+    response = client.get("/api/predict/models", headers=headers)
+    assert response.status_code == 200
+    assert [model["name"] for model in response.json()] == ["m1", "m2"]
+
+
+def test_model_endpoints_require_user_or_worker_token(
+    client, user_factory, ml_model_factory, monkeypatch
+):
+    user = user_factory(username="user1", email="user1@example.com")
+    ml_model_factory(user_id=user.id, name="m1")
+    monkeypatch.setattr(auth.settings, "WORKER_API_TOKEN", "worker-secret")
+
+    for path in ("/api/predict/models", "/api/predict/models/stats"):
+        assert client.get(path).status_code == 401
+        wrong = {"Authorization": "Bearer not-a-token"}
+        assert client.get(path, headers=wrong).status_code == 401
+
+    worker = {"Authorization": "Bearer worker-secret"}
+    response = client.get("/api/predict/models", headers=worker)
+    assert response.status_code == 200
+    assert [model["name"] for model in response.json()] == ["m1"]
+
+
+def test_list_ml_models_includes_prompt_settings(
+    client, session, user_factory, ml_model_factory
+):
+    user = user_factory(username="user1", email="user1@example.com")
+    model = ml_model_factory(user_id=user.id, name="m1")
+    model.prompt_template = "Исправь: {text}"
+    model.generation_options = {"temperature": 0, "num_predict_max": 64}
+    session.add(model)
+    session.commit()
+    headers = _login(client, username=user.username, password="password")
+
+    response = client.get("/api/predict/models", headers=headers)
+    assert response.status_code == 200
+    body = response.json()[0]
+    assert body["prompt_template"] == "Исправь: {text}"
+    assert body["generation_options"] == {"temperature": 0, "num_predict_max": 64}
+
+
+def test_task_metrics_are_stored_and_aggregated_per_model(
+    client, worker_headers, session, user_factory, ml_model_factory
+):
+    user = user_factory(username="user1", email="user1@example.com")
+    model = ml_model_factory(user_id=user.id, name="m1")
+    for task_id in ("task-1", "task-2"):
+        session.add(
+            MLPredictionHistory(
+                user_id=user.id,
+                model_id=model.id,
+                input_text="hello",
+                result=f"PENDING:{task_id}",
+                cost=ml_routes.PREDICTION_COST,
+                task_id=task_id,
+            )
+        )
+    session.commit()
+
+    for task_id, eval_count in (("task-1", 10), ("task-2", 30)):
+        response = client.post(
+            "/api/predict/send_task_result",
+            headers=worker_headers,
+            json={
+                "task_id": task_id,
+                "prediction": "OK",
+                "worker_id": "worker-1",
+                "status": "success",
+                "metrics": {
+                    "total_duration": 2_000_000_000,
+                    "load_duration": 100_000_000,
+                    "prompt_eval_count": 20,
+                    "prompt_eval_duration": 100_000_000,
+                    "eval_count": eval_count,
+                    "eval_duration": 1_000_000_000,
+                },
+            },
+        )
+        assert response.status_code == 200
+
+    session.expire_all()
+    saved = session.exec(
+        select(MLPredictionHistory).where(MLPredictionHistory.task_id == "task-2")
+    ).first()
+    assert saved.eval_count == 30
+    assert saved.load_duration == 100_000_000
+
+    headers = _login(client, username=user.username, password="password")
+    stats = client.get("/api/predict/models/stats", headers=headers)
+    assert stats.status_code == 200
+    assert stats.json() == [
+        {
+            "model_id": model.id,
+            "model_name": "m1",
+            "tasks": 2,
+            "prompt_tokens": 40,
+            "eval_tokens": 40,
+            "prompt_tokens_per_second": 200.0,
+            "eval_tokens_per_second": 20.0,
+            "avg_load_ms": 100.0,
+            "avg_total_ms": 2000.0,
+        }
+    ]
+
+
+def test_send_task_to_queue_routes_by_model_name(monkeypatch):
+    published = []
+    monkeypatch.setattr(
+        ml_routes.task_publisher,
+        "publish",
+        lambda routing_key, message, headers=None: published.append(
+            (routing_key, message)
+        ),
+    )
+
+    assert ml_routes.send_task_to_queue(
+        task_id="task-1", model_name="llama3.2:1b", features={"text": "hi"}
+    )
+    routing_key, message = published[0]
+    assert routing_key == "model.llama3_2:1b"
+    assert message["task_id"] == "task-1"
+    assert message["model"] == "llama3.2:1b"
+
+
+def test_task_trace_spans_api_queue_and_result_callback(
+    client, worker_headers, user_factory, ml_model_factory, monkeypatch
+):
+    class MemoryExporter:
+        def __init__(self):
+            self.spans = []
+
+        def export(self, span):
+            self.spans.append(span)
+
+    exporter = MemoryExporter()
+    monkeypatch.setattr(tracing, "_exporter", exporter)
+    published = []
+    monkeypatch.setattr(
+        ml_routes.task_publisher,
+        "publish",
+        lambda routing_key, message, headers=None: published.append(
+            (message, headers)
+        ),
+    )
+
+    user = user_factory(username="traced", email="traced@example.com", balance_amount=50.0)
+    model = ml_model_factory(user_id=user.id, name="m1")
+    headers = _login(client, username=user.username, password="password")
+    response = client.post(
+        "/api/predict/predict",
+        headers=headers,
+        json={"text": "hello", "model_id": model.id},
+    )
+    assert response.status_code == 200
+
+    message, amqp_headers = published[0]
+    task_id = message["task_id"]
+    trace_id = tracing.task_trace_id(task_id)
+    root_id = trace_id[:16]
+    assert tracing.parse_traceparent(amqp_headers["traceparent"])[0] == trace_id
+    (predict_span,) = exporter.spans
+    assert predict_span.name == "ml_predict"
+    assert predict_span.parent_id == root_id
+    assert amqp_headers["traceparent"] == predict_span.traceparent
+
+    # Воркер отвечает с контекстом своего спана send_result
+    worker_span_id = "ab" * 8
+    response = client.post(
+        "/api/predict/send_task_result",
+        headers={**worker_headers, "traceparent": f"00-{trace_id}-{worker_span_id}-01"},
+        json={
+            "task_id": task_id,
+            "prediction": "Hello",
+            "worker_id": "worker-1",
+        },
+    )
+    assert response.json()["status"] == "success"
+
+    spans = {span.name: span for span in exporter.spans}
+    assert spans["receive_task_result"].trace_id == trace_id
+    assert spans["receive_task_result"].parent_id == worker_span_id
+    root = spans["ml_task"]
+    assert (root.trace_id, root.span_id, root.parent_id) == (trace_id, root_id, None)
+    assert root.status == "ok"
+    assert root.end >= root.start
+    assert root.attributes["task_id"] == task_id
+
+    # Повторная доставка результата не закрывает трассу второй раз
+    client.post(
+        "/api/predict/send_task_result",
+        headers=worker_headers,
+        json={"task_id": task_id, "prediction": "Hello", "worker_id": "worker-1"},
+    )
+    assert [span.name for span in exporter.spans].count("ml_task") == 1
+
+
+def test_sentence_cache_is_scoped_per_user_and_can_be_cleared(
+    client, worker_headers, session, user_factory, ml_model_factory, monkeypatch
+):
+    alice = user_factory(username="alice", email="alice@example.com", balance_amount=50.0)
+    bob = user_factory(username="bob", email="bob@example.com", balance_amount=50.0)
+    model = ml_model_factory(user_id=alice.id, name="m1")
+    queued = []
+    monkeypatch.setattr(
+        ml_routes, "send_task_to_queue", lambda **kwargs: queued.append(kwargs) or True
+    )
+
+    alice_headers = _login(client, username="alice", password="password")
+    response = client.post(
+        "/api/predict/predict",
+        headers=alice_headers,
+        json={"text": "Превет мир.", "model_id": model.id},
+    )
+    assert response.status_code == 200
+    client.post(
+        "/api/predict/send_task_result",
+        headers=worker_headers,
+        json={
+            "task_id": queued[-1]["task_id"],
+            "prediction": "",
+            "worker_id": "worker-1",
+            "status": "success",
+            "segments": [{"index": 0, "text": "Привет мир."}],
+        },
+    )
+
+    # Исправления Алисы не достаются Бобу бесплатно
+    bob_headers = _login(client, username="bob", password="password")
+    response = client.post(
+        "/api/predict/predict",
+        headers=bob_headers,
+        json={"text": "Превет мир.", "model_id": model.id},
+    )
+    assert response.status_code == 200
+    assert len(queued) == 2
+    assert queued[-1]["features"]["segments"] == [{"index": 0, "text": "Превет мир."}]
+
+    cleared = client.delete("/api/predict/corrections", headers=alice_headers)
+    assert cleared.status_code == 200
+    assert cleared.json() == {"deleted": 1}
+    response = client.post(
+        "/api/predict/predict",
+        headers=alice_headers,
+        json={"text": "Превет мир.", "model_id": model.id},
+    )
+    assert response.status_code == 200
+    assert len(queued) == 3
+
+
+def test_incremental_cost_charges_minimum_for_small_edits():
+    sentences = ml_routes.split_sentences("Длинное предложение без ошибок. " * 50 + "Да.")
+    cost = ml_routes.incremental_cost(sentences, [len(sentences) - 1])
+
+    assert cost == ml_routes.MIN_PREDICTION_COST
+    assert ml_routes.incremental_cost(sentences, []) == 0.0
+
+
+def test_expire_stale_predictions_refunds_and_discards_segments(
+    session, user_factory, ml_model_factory
+):
+    user = user_factory(username="user1", email="user1@example.com", balance_amount=90.0)
+    model = ml_model_factory(user_id=user.id, name="m1")
+    session.add(
+        MLPredictionHistory(
+            user_id=user.id,
+            model_id=model.id,
+            input_text="hello",
+            result="PENDING:stale",
+            cost=ml_routes.PREDICTION_COST,
+            task_id="stale",
+            created_at=datetime.utcnow() - timedelta(hours=2),
+        )
+    )
+    session.add(
+        MLPredictionHistory(
+            user_id=user.id,
+            model_id=model.id,
+            input_text="hello",
+            result="PENDING:fresh",
+            cost=ml_routes.PREDICTION_COST,
+            task_id="fresh",
+        )
+    )
+    for task_id in ("stale", "fresh", "finished-long-ago"):
+        session.add(PredictionSegment(
+            task_id=task_id, position=0, fingerprint=task_id, source="hello"
+        ))
+    session.commit()
+
+    states = ml_routes.expire_stale_predictions(session, timeout=3600)
+
+    assert [state.task_id for state in states] == ["stale"]
+    assert states[0].status == "failed"
+    balance = session.exec(select(Balance).where(Balance.user_id == user.id)).first()
+    assert balance.amount == 90.0 + ml_routes.PREDICTION_COST
+    remaining = session.exec(select(PredictionSegment.task_id)).all()
+    assert remaining == ["fresh"]
@@ -0,0 +1,62 @@
+import time
+
+import pytest
+
+
+pytest.importorskip("fastapi")
+pytest.importorskip("bcrypt")
+pytest.importorskip("jose")
+
+
+from database import routing
+
+
+PRIMARY = object()
+REPLICA = object()
+
+
+@pytest.fixture()
+def replica(monkeypatch):
+    monkeypatch.setattr(routing, "engine", PRIMARY)
+    monkeypatch.setattr(routing, "replica_engine", REPLICA)
+    monkeypatch.setattr(routing, "recent_writes", routing.WriteTracker(window=5))
+
+
+def test_reads_go_to_replica_until_caller_writes(replica):
+    headers = {"authorization": "Bearer alice"}
+    assert routing.read_engine(headers) is REPLICA
+
+    routing.recent_writes.mark(routing.caller_key("Bearer alice"))
+    assert routing.read_engine(headers) is PRIMARY
+    # Другие вызывающие продолжают читать с реплики
+    assert routing.read_engine({"authorization": "Bearer bob"}) is REPLICA
+
+
+def test_last_write_header_routes_reads_to_primary(replica):
+    fresh = {routing.LAST_WRITE_HEADER: f"{time.time():.3f}"}
+    stale = {routing.LAST_WRITE_HEADER: f"{time.time() - 60:.3f}"}
+    invalid = {routing.LAST_WRITE_HEADER: "yesterday"}
+
+    assert routing.read_engine(fresh) is PRIMARY
+    assert routing.read_engine(stale) is REPLICA
+    assert routing.read_engine(invalid) is REPLICA
+
+
+def test_successful_write_marks_caller(client, user_factory, replica):
+    user = user_factory(balance_amount=None)
+    login = client.post(
+        "/api/auth/login",
+        data={"username": user.username, "password": "password"},
+    )
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+    read = client.get("/api/balance/me", headers=headers)
+    assert routing.LAST_WRITE_HEADER not in read.headers
+    assert not routing.wrote_recently({"authorization": headers["Authorization"]})
+
+    response = client.post(
+        "/api/balance/replenish", headers=headers, json={"amount": 10.0}
+    )
+    assert response.status_code == 200
+    assert float(response.headers[routing.LAST_WRITE_HEADER]) > time.time() - 5
+    assert routing.wrote_recently({"authorization": headers["Authorization"]})
@@ -0,0 +1,41 @@
+import subprocess
+import sys
+from pathlib import Path
+import startup_profile
+
+APP_DIR = Path(__file__).resolve().parents[1]
+
+
+def test_profile_imports_parses_importtime_tree():
+    timings = startup_profile.profile_imports("json")
+
+    json_timing = next(t for t in timings if t.module == "json")
+    assert json_timing.depth == 0
+    assert json_timing.cumulative_ms >= json_timing.self_ms > 0
+    assert any(t.module == "json.decoder" and t.depth == 1 for t in timings)
+
+
+def test_timed_step_records_duration(monkeypatch):
+    monkeypatch.setattr(startup_profile, "STEP_TIMINGS", {})
+
+    with startup_profile.timed_step("warmup"):
+        pass
+
+    assert startup_profile.STEP_TIMINGS["warmup"] >= 0
+
+
+def test_api_import_defers_broker_and_server_modules():
+    completed = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, api; "
+            "print(','.join(m for m in ('pika', 'uvicorn') if m in sys.modules))",
+        ],
+        capture_output=True,
+        text=True,
+        cwd=APP_DIR,
+    )
+
+    assert completed.returncode == 0, completed.stderr
+    assert completed.stdout.strip() == ""
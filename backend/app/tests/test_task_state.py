@@ -0,0 +1,73 @@
+import asyncio
+import json
+
+from task_state import (
+    STATUS_COMPLETED,
+    STATUS_PENDING,
+    MemoryTaskStateStore,
+    TaskState,
+    TaskStateFeed,
+)
+
+
+def _state(task_id: str = "task-1", status: str = STATUS_PENDING) -> TaskState:
+    return TaskState(
+        task_id=task_id,
+        user_id=1,
+        model_id=1,
+        status=status,
+        result="OK" if status == STATUS_COMPLETED else None,
+    )
+
+
+def test_store_expires_and_evicts_entries():
+    store = MemoryTaskStateStore(ttl=60, pending_ttl=0, max_entries=2)
+
+    store.put(_state("pending"))
+    assert store.get("pending") is None
+
+    for task_id in ("a", "b", "c"):
+        store.put(_state(task_id, STATUS_COMPLETED))
+    assert store.get("a") is None
+    assert store.get("c").result == "OK"
+    assert len(store) == 2
+
+
+def test_late_pending_does_not_replace_result():
+    store = MemoryTaskStateStore()
+    store.put(_state(status=STATUS_COMPLETED))
+    store.put(_state(status=STATUS_PENDING))
+
+    assert store.get("task-1").status == STATUS_COMPLETED
+
+
+def test_wait_returns_result_as_soon_as_it_is_put():
+    store = MemoryTaskStateStore()
+
+    async def scenario():
+        store.put(_state())
+        waiter = asyncio.create_task(store.wait("task-1", timeout=5))
+        await asyncio.sleep(0)
+        store.put(_state(status=STATUS_COMPLETED))
+        finished = await waiter
+        timed_out = await store.wait("task-2", timeout=0.01)
+        return finished, timed_out
+
+    finished, timed_out = asyncio.run(scenario())
+    assert finished.status == STATUS_COMPLETED
+    assert timed_out is None
+
+
+def test_feed_applies_messages_from_other_processes():
+    store = MemoryTaskStateStore()
+    feed = TaskStateFeed(store)
+
+    async def scenario():
+        feed._loop = asyncio.get_running_loop()
+        body = json.dumps(_state(status=STATUS_COMPLETED).__dict__).encode()
+        feed._on_message(None, None, None, body)
+        feed._on_message(None, None, None, b"not json")
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+    assert store.get("task-1").result == "OK"
@@ -0,0 +1,45 @@
+import json
+import threading
+
+from tracing import FileExporter, Span
+
+
+def _span(name):
+    return Span(name=name, trace_id="a" * 32, span_id="b" * 16)
+
+
+def test_file_exporter_writes_spans_in_background(tmp_path, monkeypatch):
+    path = tmp_path / "traces.jsonl"
+    exporter = FileExporter(str(path))
+    written = threading.Event()
+    write = exporter._write
+
+    def slow_write(lines):
+        # Поток записи стартует, только когда export уже вернулся
+        written.wait(5)
+        write(lines)
+
+    monkeypatch.setattr(exporter, "_write", slow_write)
+
+    exporter.export(_span("first"))
+    exporter.export(_span("second"))
+    assert not path.exists()
+
+    written.set()
+    exporter.close()
+
+    names = [json.loads(line)["name"] for line in path.read_text().splitlines()]
+    assert names == ["first", "second"]
+
+
+def test_file_exporter_drops_spans_when_queue_is_full(tmp_path, monkeypatch):
+    exporter = FileExporter(str(tmp_path / "traces.jsonl"))
+    release = threading.Event()
+    monkeypatch.setattr(exporter, "MAX_QUEUE", 1)
+    monkeypatch.setattr(exporter, "_write", lambda lines: release.wait(5))
+
+    for name in ("first", "second", "third"):
+        exporter.export(_span(name))
+
+    assert exporter.dropped == 2
+    release.set()
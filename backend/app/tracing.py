@@ -0,0 +1,307 @@
+"""Трассировка ML-задач по этапам: API → RabbitMQ → воркер → Ollama → API.
+
+Контекст передаётся в формате W3C traceparent (`00-<trace>-<span>-01`):
+в заголовках AMQP-сообщения и в HTTP-заголовке ответа воркера.
+Идентификатор трассы задачи совпадает с её task_id, а корневой спан
+`ml_task` экспортируется при получении результата, поэтому его длительность —
+полное время выполнения задачи.
+
+Экспортёр выбирается переменной TRACE_EXPORTER:
+    none    — спаны не сохраняются (по умолчанию);
+    console — спаны пишутся в лог;
+    file    — спаны дописываются JSON-строками в TRACE_FILE.
+Другой экспортёр подключается через set_exporter().
+
+Модуль должен быть синхронизирован с ml_worker/tracing.py: app и ml_worker
+собираются в отдельные образы и не делят код. Span, экспортёры,
+parse_traceparent и start_span совпадают в обеих копиях; различаются
+только SERVICE_NAME и функции, нужные одной из сторон.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field, asdict
+from datetime import datetime, timezone
+from typing import Iterator, Optional, Protocol
+import atexit
+import json
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "app"
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none")
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+TRACEPARENT_HEADER = "traceparent"
+
+
+@dataclass
+class Span:
+    """Завершённый или выполняющийся этап трассы."""
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str] = None
+    service: str = SERVICE_NAME
+    start: float = field(default_factory=time.time)
+    end: Optional[float] = None
+    status: str = "ok"
+    attributes: dict = field(default_factory=dict)
+
+    @property
+    def traceparent(self) -> str:
+        """Контекст спана для передачи следующему этапу."""
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set_attributes(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data["duration_ms"] = (
+            round((self.end - self.start) * 1000, 3) if self.end else None
+        )
+        return data
+
+
+class SpanExporter(Protocol):
+    """Получатель завершённых спанов."""
+
+    def export(self, span: Span) -> None: ...
+
+
+class NullExporter:
+    """Отбрасывает спаны."""
+
+    def export(self, span: Span) -> None:
+        pass
+
+
+class ConsoleExporter:
+    """Пишет спаны в лог."""
+
+    def export(self, span: Span) -> None:
+        logger.info("span %s", json.dumps(span.to_dict(), ensure_ascii=False))
+
+
+class FileExporter:
+    """
+    Дописывает спаны JSON-строками в файл.
+
+    Файл пишет фоновый поток: export только ставит строку в очередь и не
+    блокирует цикл событий API и обработку сообщений воркером. Если диск
+    не успевает и очередь заполнена, спаны отбрасываются (счётчик
+    dropped). Поток запускается при первом экспорте в процессе, поэтому
+    после fork (процессы uvicorn, дочерние воркеры) у каждого процесса
+    свой поток; при выходе процесса очередь дописывается.
+    """
+    MAX_QUEUE = 10000
+
+    def __init__(self, path: str):
+        self.path = path
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._queue: Optional[queue.Queue] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), ensure_ascii=False)
+        try:
+            self._writer_queue().put_nowait(line)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Дописывает поставленные в очередь спаны и останавливает поток."""
+        with self._lock:
+            if self._pid != os.getpid() or not self._thread.is_alive():
+                return
+            self._pid = None
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def _writer_queue(self) -> queue.Queue:
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._queue = queue.Queue(self.MAX_QUEUE)
+                self._thread = threading.Thread(
+                    target=self._write, args=(self._queue,),
+                    name="span-file-exporter", daemon=True,
+                )
+                self._thread.start()
+                atexit.register(self.close)
+            return self._queue
+
+    def _write(self, lines: queue.Queue) -> None:
+        while True:
+            batch = [lines.get()]
+            # Накопившиеся строки записываются одним открытием файла
+            while batch[-1] is not None and len(batch) < 1000:
+                try:
+                    batch.append(lines.get_nowait())
+                except queue.Empty:
+                    break
+            stop = batch[-1] is None
+            batch = [line for line in batch if line is not None]
+            if batch:
+                try:
+                    with open(self.path, "a", encoding="utf-8") as target:
+                        target.write("".join(line + "\n" for line in batch))
+                except OSError as e:
+                    logger.warning(f"Span export failed: {e}")
+            if stop:
+                return
+
+
+def _exporter_from_env() -> SpanExporter:
+    if TRACE_EXPORTER == "console":
+        return ConsoleExporter()
+    if TRACE_EXPORTER == "file":
+        return FileExporter(TRACE_FILE)
+    return NullExporter()
+
+
+_exporter: SpanExporter = _exporter_from_env()
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def set_exporter(exporter: SpanExporter) -> None:
+    """Подменяет экспортёр спанов (например, в тестах)."""
+    global _exporter
+    _exporter = exporter
+
+
+def shutdown_exporter() -> None:
+    """Дописывает спаны, ожидающие экспорта (перед выходом процесса)."""
+    close = getattr(_exporter, "close", None)
+    if close is not None:
+        close()
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[tuple[str, str]]:
+    """
+    Разбирает заголовок traceparent.
+
+    Args:
+        value: Значение заголовка
+
+    Returns:
+        tuple[str, str] | None: (trace_id, span_id) или None, если
+            заголовок отсутствует или некорректен
+    """
+    if not value:
+        return None
+    parts = value.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None
+    return parts[1], parts[2]
+
+
+def task_trace_id(task_id: str) -> str:
+    """Идентификатор трассы задачи: task_id (UUID) без дефисов."""
+    return task_id.replace("-", "")
+
+
+def task_root_context(task_id: str) -> str:
+    """traceparent корневого спана задачи, вычисляемый по task_id."""
+    trace_id = task_trace_id(task_id)
+    return f"00-{trace_id}-{trace_id[:16]}-01"
+
+
+def export_span(span: Span) -> None:
+    """Завершает спан (если не завершён) и передаёт его экспортёру."""
+    if span.end is None:
+        span.end = time.time()
+    try:
+        _exporter.export(span)
+    except Exception as e:
+        # Трассировка не должна ломать обработку запроса
+        logger.warning(f"Span export failed: {e}")
+
+
+def close_task_trace(
+    task_id: str, started_at: datetime, failed: bool = False, **attributes
+) -> None:
+    """
+    Экспортирует корневой спан задачи `ml_task`.
+
+    Спан охватывает всё время от создания задачи до получения результата;
+    его идентификатор вычисляется по task_id, поэтому спаны API и воркера
+    ссылаются на него, хотя сам он экспортируется последним.
+
+    Args:
+        task_id: ID задачи
+        started_at: Время создания задачи (naive UTC, как в БД)
+        failed: Завершилась ли задача ошибкой
+        **attributes: Атрибуты спана
+    """
+    trace_id = task_trace_id(task_id)
+    span = Span(
+        name="ml_task",
+        trace_id=trace_id,
+        span_id=trace_id[:16],
+        start=started_at.replace(tzinfo=timezone.utc).timestamp(),
+        attributes={"task_id": task_id, **attributes},
+    )
+    if failed:
+        span.status = "error"
+    export_span(span)
+
+
+@contextmanager
+def start_span(
+    name: str, parent: Optional[str] = None, **attributes
+) -> Iterator[Span]:
+    """
+    Открывает спан на время блока with.
+
+    Родитель берётся из traceparent, а если он не передан — из текущего
+    спана контекста; без обоих начинается новая трасса.
+
+    Args:
+        name: Имя этапа
+        parent: traceparent родительского спана
+        **attributes: Атрибуты спана
+
+    Yields:
+        Span: Открытый спан
+    """
+    context = parse_traceparent(parent)
+    current = _current_span.get()
+    if context:
+        trace_id, parent_id = context
+    elif current:
+        trace_id, parent_id = current.trace_id, current.span_id
+    else:
+        trace_id, parent_id = secrets.token_hex(16), None
+    span = Span(
+        name=name,
+        trace_id=trace_id,
+        span_id=secrets.token_hex(8),
+        parent_id=parent_id,
+        attributes=attributes,
+    )
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.status = "error"
+        span.set_attributes(error=repr(e))
+        raise
+    finally:
+        _current_span.reset(token)
+        export_span(span)
@@ -0,0 +1,267 @@
+"""Контроллер автомасштабирования ML-воркеров по метрикам очереди."""
+
+from dataclasses import dataclass
+from typing import Protocol
+from rmqconf import RabbitMQConfig
+from worker import WorkerStats
+import math
+import os
+import pika
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ScalingPolicy:
+    """
+    Границы и пороги масштабирования.
+
+    Атрибуты:
+        min_workers: Минимальное число процессов-воркеров
+        max_workers: Максимальное число процессов-воркеров
+        backlog_per_worker: Сколько сообщений в очереди допускается на воркер
+        scale_down_utilisation: Доля занятых воркеров, ниже которой можно убрать один
+        max_ollama_latency: Задержка инференса (сек), выше которой Ollama считается
+            перегруженной и новые воркеры не добавляются
+        interval: Период опроса метрик в секундах
+        cooldown: Минимальная пауза между изменениями размера пула в секундах
+    """
+    min_workers: int = 1
+    max_workers: int = 4
+    backlog_per_worker: int = 5
+    scale_down_utilisation: float = 0.5
+    max_ollama_latency: float = 8.0
+    interval: float = 5.0
+    cooldown: float = 30.0
+
+    @classmethod
+    def from_env(cls) -> "ScalingPolicy":
+        """Создаёт политику из переменных окружения WORKER_*."""
+        return cls(
+            min_workers=int(os.getenv("WORKER_MIN_PROCESSES", cls.min_workers)),
+            max_workers=int(os.getenv("WORKER_MAX_PROCESSES", cls.max_workers)),
+            backlog_per_worker=int(
+                os.getenv("WORKER_BACKLOG_PER_PROCESS", cls.backlog_per_worker)
+            ),
+            scale_down_utilisation=float(
+                os.getenv("WORKER_SCALE_DOWN_UTILISATION", cls.scale_down_utilisation)
+            ),
+            max_ollama_latency=float(
+                os.getenv("WORKER_MAX_OLLAMA_LATENCY", cls.max_ollama_latency)
+            ),
+            interval=float(os.getenv("WORKER_SCALE_INTERVAL", cls.interval)),
+            cooldown=float(os.getenv("WORKER_SCALE_COOLDOWN", cls.cooldown)),
+        )
+
+
+@dataclass
+class QueueMetrics:
+    """
+    Снимок метрик, на основе которого принимается решение о масштабировании.
+
+    Атрибуты:
+        messages_ready: Сообщений в очереди, ожидающих потребителя
+        consumers: Число подписанных потребителей
+        utilisation: Доля воркеров пула, занятых обработкой (0..1)
+        ollama_latency: Средняя задержка инференса по воркерам пула в секундах
+        paused: Число воркеров, приостановивших потребление (Ollama недоступна)
+    """
+    messages_ready: int
+    consumers: int
+    utilisation: float
+    ollama_latency: float
+    paused: int = 0
+
+
+class WorkerPool(Protocol):
+    """Пул процессов, размером которого управляет автоскейлер."""
+
+    @property
+    def size(self) -> int: ...
+
+    def scale_to(self, size: int) -> None: ...
+
+    def stats(self) -> list[WorkerStats]: ...
+
+
+def desired_workers(
+    policy: ScalingPolicy, metrics: QueueMetrics, current: int
+) -> int:
+    """
+    Вычисляет целевое число воркеров.
+
+    Рост выполняется сразу до нужного размера, но только пока Ollama
+    не перегружена: при высокой задержке инференса новые воркеры лишь
+    удлинят очередь запросов к модели. Сокращение идёт по одному воркеру,
+    когда очередь пуста и большая часть воркеров простаивает.
+
+    Args:
+        policy: Политика масштабирования
+        metrics: Текущие метрики очереди и воркеров
+        current: Текущий размер пула
+
+    Returns:
+        int: Целевой размер пула в пределах [min_workers, max_workers]
+    """
+    backlog_target = math.ceil(
+        metrics.messages_ready / max(policy.backlog_per_worker, 1)
+    )
+    # Занятые воркеры тоже нужны: очередь считается сверх них
+    wanted = round(metrics.utilisation * current) + backlog_target
+
+    if wanted > current:
+        if metrics.paused:
+            # Очередь растёт из-за недоступной Ollama, а не из-за нагрузки
+            logger.info(
+                "Backlog %s but %s workers paused by circuit breaker, holding at %s",
+                metrics.messages_ready,
+                metrics.paused,
+                current,
+            )
+            target = current
+        elif metrics.ollama_latency > policy.max_ollama_latency:
+            logger.info(
+                "Backlog %s but Ollama latency %.2fs exceeds %.2fs, holding at %s",
+                metrics.messages_ready,
+                metrics.ollama_latency,
+                policy.max_ollama_latency,
+                current,
+            )
+            target = current
+        else:
+            target = wanted
+    elif (
+        metrics.messages_ready == 0
+        and metrics.utilisation < policy.scale_down_utilisation
+    ):
+        target = current - 1
+    else:
+        target = current
+
+    return max(policy.min_workers, min(policy.max_workers, target))
+
+
+class Autoscaler:
+    """
+    Периодически опрашивает очередь и подгоняет размер пула воркеров.
+
+    Глубина очередей воркера (очереди его моделей и общая очередь)
+    берётся пассивным queue_declare, загрузка и задержка
+    инференса — из разделяемых счётчиков WorkerStats процессов пула.
+    """
+
+    def __init__(
+        self,
+        pool: WorkerPool,
+        config: RabbitMQConfig,
+        policy: ScalingPolicy | None = None,
+    ):
+        self.pool = pool
+        self.config = config
+        self.policy = policy or ScalingPolicy.from_env()
+        self.connection = None
+        self.channel = None
+        self._last_change = 0.0
+
+    def _queue_counts(self) -> tuple[int, int]:
+        """Возвращает суммарные (messages_ready, consumers) по очередям воркера."""
+        if not self.connection or not self.connection.is_open:
+            self.connection = pika.BlockingConnection(
+                self.config.get_connection_params()
+            )
+            self.channel = self.connection.channel()
+        ready = consumers = 0
+        for queue in self.config.consumed_queues():
+            frame = self.channel.queue_declare(
+                queue=queue, durable=True, passive=True
+            )
+            ready += frame.method.message_count
+            consumers += frame.method.consumer_count
+        return ready, consumers
+
+    def probe(self) -> QueueMetrics:
+        """Собирает текущие метрики очереди и пула."""
+        ready, consumers = self._queue_counts()
+        stats = self.pool.stats()
+        busy = sum(1 for item in stats if item.busy)
+        latencies = [item.latency for item in stats if item.latency > 0]
+        return QueueMetrics(
+            messages_ready=ready,
+            consumers=consumers,
+            utilisation=busy / len(stats) if stats else 0.0,
+            ollama_latency=sum(latencies) / len(latencies) if latencies else 0.0,
+            paused=sum(1 for item in stats if item.paused),
+        )
+
+    def step(self, now: float) -> int:
+        """
+        Выполняет одну итерацию контроля.
+
+        Args:
+            now: Текущее монотонное время
+
+        Returns:
+            int: Размер пула после итерации
+        """
+        current = self.pool.size
+        if current < self.policy.min_workers:
+            self.pool.scale_to(self.policy.min_workers)
+            self._last_change = now
+            return self.pool.size
+
+        metrics = self.probe()
+        target = desired_workers(self.policy, metrics, current)
+        if target != current and now - self._last_change >= self.policy.cooldown:
+            logger.info(
+                "Scaling workers %s -> %s (ready=%s, utilisation=%.2f, latency=%.2fs)",
+                current,
+                target,
+                metrics.messages_ready,
+                metrics.utilisation,
+                metrics.ollama_latency,
+            )
+            self.pool.scale_to(target)
+            self._last_change = now
+        return self.pool.size
+
+    def _close(self) -> None:
+        """Закрывает соединение с брокером, игнорируя ошибки оборванного."""
+        connection, self.connection, self.channel = self.connection, None, None
+        if connection is None:
+            return
+        try:
+            if connection.is_open:
+                connection.close()
+        except pika.exceptions.AMQPError:
+            pass
+
+    def run(self, stop_event: threading.Event) -> None:
+        """Запускает цикл контроля до установки stop_event."""
+        while not stop_event.is_set():
+            try:
+                self.step(time.monotonic())
+            except pika.exceptions.AMQPError as e:
+                logger.error(f"Autoscaler probe failed: {e}")
+                self._close()
+            self._idle(stop_event)
+        self._close()
+
+    def _idle(self, stop_event: threading.Event) -> None:
+        """Ждёт следующего опроса, прерываясь сразу при остановке.
+
+        Ожидание идёт порциями по секунде, между которыми соединение
+        обслуживает heartbeat.
+        """
+        deadline = time.monotonic() + self.policy.interval
+        while not stop_event.wait(min(1.0, max(deadline - time.monotonic(), 0))):
+            if time.monotonic() >= deadline:
+                return
+            if self.connection and self.connection.is_open:
+                try:
+                    self.connection.process_data_events(time_limit=0)
+                except pika.exceptions.AMQPError as e:
+                    logger.warning(f"Autoscaler connection lost: {e}")
+                    self._close()
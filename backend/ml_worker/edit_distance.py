@@ -0,0 +1,105 @@
+"""Пакетный подсчёт ограниченного расстояния Дамерау–Левенштейна на NumPy.
+
+Пары строк кодируются в матрицы кодовых точек (строка матрицы — слово,
+дополненное до общей длины), и динамика считается сразу для всех пар:
+на каждой строке таблицы удаление, замена и перестановка вычисляются
+векторно по всем столбцам, а вставка — накопленным минимумом.
+Число операций NumPy зависит только от длины слов, а не от числа пар,
+поэтому кандидаты всего документа оцениваются за один проход.
+"""
+
+from typing import Sequence
+import numpy as np
+
+# Пары обрабатываются порциями, чтобы ограничить память под матрицы
+CHUNK_SIZE = 65536
+
+
+def encode(words: Sequence[str], width: int, pad: int) -> np.ndarray:
+    """
+    Кодирует слова в матрицу кодовых точек.
+
+    Args:
+        words: Слова
+        width: Ширина матрицы (не меньше длины самого длинного слова)
+        pad: Значение для позиций за концом слова
+
+    Returns:
+        np.ndarray: Матрица int32 размера (len(words), width)
+    """
+    lengths = np.fromiter(map(len, words), dtype=np.int64, count=len(words))
+    codes = np.frombuffer("".join(words).encode("utf-32-le"), dtype="<u4")
+    matrix = np.full((len(words), width), pad, dtype=np.int32)
+    matrix[np.arange(width) < lengths[:, None]] = codes
+    return matrix
+
+
+def _chunk_distance(
+    sources: Sequence[str], targets: Sequence[str], max_distance: int
+) -> np.ndarray:
+    count = len(sources)
+    source_len = np.fromiter(map(len, sources), dtype=np.int32, count=count)
+    target_len = np.fromiter(map(len, targets), dtype=np.int32, count=count)
+    rows = int(source_len.max(initial=0))
+    cols = int(target_len.max(initial=0))
+    # Разные заполнители: позиции за концом слов никогда не совпадают
+    a = encode(sources, rows, -1)
+    b = encode(targets, cols, -2)
+
+    result = target_len.copy()  # пустой источник: только вставки
+    pairs = np.arange(count)
+    steps = np.arange(cols + 1, dtype=np.int32)
+    previous2 = None
+    previous = np.broadcast_to(steps, (count, cols + 1)).copy()
+    for i in range(1, rows + 1):
+        match = a[:, i - 1, None] == b
+        current = np.empty_like(previous)
+        current[:, 0] = i
+        current[:, 1:] = np.minimum(
+            previous[:, 1:] + 1,  # удаление
+            previous[:, :-1] + ~match,  # замена (0 при совпадении)
+        )
+        if previous2 is not None and cols > 1:
+            swapped = (a[:, i - 1, None] == b[:, :-1]) & (
+                a[:, i - 2, None] == b[:, 1:]
+            )
+            current[:, 2:] = np.where(
+                swapped,
+                np.minimum(current[:, 2:], previous2[:, :-2] + 1),
+                current[:, 2:],
+            )
+        # Вставка: current[j] = min(current[j], current[j-1] + 1)
+        current = np.minimum.accumulate(current - steps, axis=1) + steps
+        done = source_len == i
+        result[done] = current[pairs[done], target_len[done]]
+        previous2, previous = previous, current
+    return np.minimum(result, max_distance + 1)
+
+
+def batch_distance(
+    sources: Sequence[str], targets: Sequence[str], max_distance: int
+) -> np.ndarray:
+    """
+    Считает расстояние Дамерау–Левенштейна (OSA) для пар строк.
+
+    Args:
+        sources: Исходные строки
+        targets: Строки для сравнения (той же длины, что sources)
+        max_distance: Граница; большие расстояния возвращаются как
+            max_distance + 1
+
+    Returns:
+        np.ndarray: Расстояния int32 для каждой пары
+    """
+    if len(sources) != len(targets):
+        raise ValueError("sources and targets must have the same length")
+    if not sources:
+        return np.zeros(0, dtype=np.int32)
+    return np.concatenate([
+        _chunk_distance(
+            sources[start:start + CHUNK_SIZE],
+            targets[start:start + CHUNK_SIZE],
+            max_distance,
+        )
+        for start in range(0, len(sources), CHUNK_SIZE)
+    ])
@@ -1,15 +1,54 @@
 """Клиент обращения к Ollama для выполнения ML-задачи воркера."""
 
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from enum import Enum
 import requests
+import threading
 import logging
 import json
+import time
 import os
 
 # Константы
-OLLAMA_URL = 'http://ollama:11434/api/generate'
+OLLAMA_BASE_URL = 'http://ollama:11434'
+GENERATE_PATH = '/api/generate'
+# Несколько серверов Ollama через запятую; по умолчанию один OLLAMA_BASE_URL
+OLLAMA_URLS = [
+    url.strip().rstrip('/')
+    for url in os.getenv("OLLAMA_URLS", OLLAMA_BASE_URL).split(',')
+    if url.strip()
+]
+# Выбор бэкенда: least_outstanding — меньше всего запросов в работе;
+# latency — минимум (запросов в работе + 1) * сглаженная задержка
+OLLAMA_BALANCING = os.getenv("OLLAMA_BALANCING", "least_outstanding")
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("OLLAMA_BREAKER_FAILURES", "3"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("OLLAMA_BREAKER_RESET", "30"))  # seconds
 DEFAULT_MODEL_NAME = os.getenv("OLLAMA_MODEL", "gemma3:1b")
-NUM_PREDICT = 30  # количество токенов для предсказания
+NUM_PREDICT = 30  # количество токенов, если у модели нет параметров генерации
 REQUEST_TIMEOUT = 10  # seconds
+LOAD_TIMEOUT = 120  # seconds, загрузка модели с диска может быть долгой
+# Неизменный системный промпт: инструкции идут в начале каждого запроса
+# одинаковым префиксом, и Ollama переиспользует их KV-кэш, вычисляя
+# заново только текст пользователя. Изменение промпта сбрасывает кэш.
+SYSTEM_PROMPT = os.getenv(
+    "OLLAMA_SYSTEM_PROMPT",
+    "Ты — корректор текста. Исправляй орфографические, грамматические и "
+    "пунктуационные ошибки, не меняя смысл и стиль. Отвечай только "
+    "исправленным текстом, без пояснений."
+)
+# Поля последней строки ответа /api/generate со счётчиками и длительностями (нс)
+TIMING_FIELDS = (
+    'total_duration', 'load_duration',
+    'prompt_eval_count', 'prompt_eval_duration', 'eval_count', 'eval_duration'
+)
+
+# Политика вытеснения моделей из памяти Ollama:
+#   pin — модели не выгружаются (keep_alive=-1);
+#   ttl — модель выгружается через OLLAMA_KEEP_ALIVE после последнего обращения
+OLLAMA_EVICTION_POLICY = os.getenv("OLLAMA_EVICTION_POLICY", "ttl")
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+KEEP_ALIVE = -1 if OLLAMA_EVICTION_POLICY == "pin" else OLLAMA_KEEP_ALIVE
 
 # Настраиваем общий уровень логирования
 logging.basicConfig(
@@ -19,73 +58,472 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# HTTP-сессия с пулом соединений к Ollama, своя в каждом процессе
+_http_session: requests.Session | None = None
+
+
+def _get_http_session() -> requests.Session:
+    """Возвращает HTTP-сессию текущего процесса, создавая её при первом вызове."""
+    global _http_session
+    if _http_session is None:
+        _http_session = requests.Session()
+    return _http_session
+
+
+class NoBackendAvailable(requests.ConnectionError):
+    """Все бэкенды Ollama исключены из ротации (их circuit breaker открыт)."""
+
+
+class CircuitBreaker:
+    """
+    Автомат состояний closed → open → half-open для одного бэкенда.
+
+    После failure_threshold ошибок подряд breaker открывается, и бэкенд
+    исключается из ротации на reset_timeout секунд. Затем пропускается
+    один пробный запрос (half-open): успех закрывает breaker, ошибка
+    снова открывает его.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        reset_timeout: float = BREAKER_RESET_TIMEOUT,
+        clock=time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    def is_available(self) -> bool:
+        """Можно ли отправить запрос (не меняет состояние)."""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            return self._clock() - self.opened_at >= self.reset_timeout
+        return not self._probe_in_flight
+
+    def allow_request(self) -> bool:
+        """Резервирует право на запрос; в half-open — единственный пробный."""
+        if not self.is_available():
+            return False
+        if self.state == self.OPEN:
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            self._probe_in_flight = True
+        return True
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = self._clock()
+
+    @property
+    def retry_after(self) -> float:
+        """Секунд до перехода в half-open (0, если breaker не открыт)."""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(self.reset_timeout - (self._clock() - self.opened_at), 0.0)
+
+
+@dataclass
+class Backend:
+    """Сервер Ollama с его состоянием в пуле."""
+    base_url: str
+    breaker: CircuitBreaker
+    outstanding: int = 0
+    latency: float = 0.0  # EWMA длительности запроса, секунды
+
+
+class BackendPool:
+    """
+    Пул серверов Ollama с балансировкой и пассивной проверкой здоровья.
+
+    Здоровье определяется по результатам реальных запросов: сетевые
+    ошибки, таймауты и ответы 5xx считаются сбоями, и бэкенд с открытым
+    circuit breaker исключается из выбора. При ошибке соединения запрос
+    повторяется на другом бэкенде.
+    """
+    EWMA_ALPHA = 0.3
+
+    def __init__(
+        self,
+        urls: list[str],
+        strategy: str = OLLAMA_BALANCING,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        reset_timeout: float = BREAKER_RESET_TIMEOUT,
+    ):
+        if not urls:
+            raise ValueError("At least one Ollama URL is required")
+        self.strategy = strategy
+        self.backends = [
+            Backend(url, CircuitBreaker(failure_threshold, reset_timeout))
+            for url in urls
+        ]
+        self._lock = threading.Lock()
+        self._next = 0
+
+    def _score(self, backend: Backend) -> float:
+        if self.strategy == "latency":
+            # Бэкенд без замеров получает 0, чтобы быстрее набрать статистику
+            return (backend.outstanding + 1) * backend.latency
+        return backend.outstanding
+
+    def _select(self, exclude: list[Backend]) -> Backend:
+        with self._lock:
+            # Сдвигаем начало обхода, чтобы при равных оценках нагрузка
+            # распределялась по кругу
+            count = len(self.backends)
+            ordered = [
+                self.backends[(self._next + i) % count] for i in range(count)
+            ]
+            self._next = (self._next + 1) % count
+            candidates = [
+                backend for backend in ordered
+                if backend not in exclude and backend.breaker.is_available()
+            ]
+            if not candidates:
+                raise NoBackendAvailable("No healthy Ollama backend available")
+            backend = min(candidates, key=self._score)
+            backend.breaker.allow_request()
+            backend.outstanding += 1
+            return backend
+
+    def _release(self, backend: Backend, duration: float, ok: bool) -> None:
+        with self._lock:
+            backend.outstanding -= 1
+            if ok:
+                backend.breaker.record_success()
+                if backend.latency == 0.0:
+                    backend.latency = duration
+                else:
+                    backend.latency += self.EWMA_ALPHA * (duration - backend.latency)
+                return
+            was_open = backend.breaker.state == CircuitBreaker.OPEN
+            backend.breaker.record_failure()
+            if not was_open and backend.breaker.state == CircuitBreaker.OPEN:
+                logger.warning(
+                    f"Backend {backend.base_url} ejected for "
+                    f"{backend.breaker.reset_timeout:.0f}s"
+                )
+
+    def _send(
+        self, backend: Backend, path: str, payload: dict, timeout: float
+    ) -> requests.Response:
+        started = time.monotonic()
+        ok = False
+        try:
+            response = _get_http_session().post(
+                backend.base_url + path, json=payload, timeout=timeout
+            )
+            ok = response.status_code < 500
+            return response
+        finally:
+            self._release(backend, time.monotonic() - started, ok)
+
+    @contextmanager
+    def stream(self, path: str, payload: dict, timeout: float):
+        """
+        Отправляет POST с потоковым чтением ответа на выбранный бэкенд.
+
+        Бэкенд считается занятым, пока вызывающий читает тело ответа
+        внутри блока with; ошибка чтения засчитывается как сбой бэкенда.
+
+        Raises:
+            NoBackendAvailable: Если все бэкенды исключены из ротации
+            requests.RequestException: Если запрос не удался
+        """
+        tried: list[Backend] = []
+        while True:
+            backend = self._select(tried)
+            started = time.monotonic()
+            try:
+                response = _get_http_session().post(
+                    backend.base_url + path,
+                    json=payload,
+                    timeout=timeout,
+                    stream=True,
+                )
+            except requests.ConnectionError as e:
+                self._release(backend, time.monotonic() - started, False)
+                tried.append(backend)
+                logger.warning(f"Backend {backend.base_url} unreachable: {e}")
+                if len(tried) == len(self.backends):
+                    raise
+                continue
+            except BaseException:
+                self._release(backend, time.monotonic() - started, False)
+                raise
+            break
+
+        ok = False
+        try:
+            yield response
+            ok = response.status_code < 500
+        finally:
+            response.close()
+            self._release(backend, time.monotonic() - started, ok)
+
+    def broadcast(
+        self, path: str, payload: dict, timeout: float
+    ) -> list[tuple[str, requests.Response | None]]:
+        """
+        Отправляет POST на каждый доступный бэкенд (например, для прогрева).
+
+        Запросы к исключённым бэкендам служат и пробными запросами half-open.
+
+        Returns:
+            list: Пары (URL бэкенда, ответ или None при ошибке)
+        """
+        results = []
+        for backend in self.backends:
+            with self._lock:
+                if not backend.breaker.allow_request():
+                    continue
+                backend.outstanding += 1
+            try:
+                results.append(
+                    (backend.base_url, self._send(backend, path, payload, timeout))
+                )
+            except requests.RequestException as e:
+                logger.warning(f"Backend {backend.base_url} request failed: {e}")
+                results.append((backend.base_url, None))
+        return results
+
+    def retry_after(self) -> float:
+        """Секунд до ближайшего бэкенда, готового принять пробный запрос."""
+        with self._lock:
+            return min(backend.breaker.retry_after for backend in self.backends)
+
+    def reset_after_fork(self) -> None:
+        """Пересоздаёт блокировку: её мог удерживать поток родителя в момент fork."""
+        self._lock = threading.Lock()
+
+
+backend_pool = BackendPool(OLLAMA_URLS)
+
+
+def _reset_after_fork() -> None:
+    """Сбрасывает унаследованные после fork сессию и блокировки пула."""
+    global _http_session
+    _http_session = None
+    backend_pool.reset_after_fork()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _read_stream(response: requests.Response) -> tuple[str, dict, float | None]:
+    """
+    Читает потоковый NDJSON-ответ от LLM модели.
 
-def _parse_response(response_text: str) -> str:
-    """Парсит ответ от LLM модели."""
-    full_response = ''
-    for line in response_text.strip().split('\n'):
+    Returns:
+        tuple[str, dict, float | None]: Текст ответа, счётчики из
+            завершающей строки и момент (time.monotonic) первого токена
+    """
+    chunks = []
+    timings = {}
+    first_token_at = None
+    # chunk_size=None: строки отдаются по мере прихода, без буфера в 512 байт
+    for line in response.iter_lines(chunk_size=None):
         if not line:
             continue
         try:
             response_obj = json.loads(line)
-            if 'response' in response_obj:
-                full_response += response_obj['response']
         except json.JSONDecodeError as e:
             logger.error(f"Error parsing JSON line: {e}")
-    return full_response.strip()
+            continue
+        if response_obj.get('response'):
+            if first_token_at is None:
+                first_token_at = time.monotonic()
+            chunks.append(response_obj['response'])
+        if response_obj.get('done'):
+            timings = {
+                name: response_obj[name]
+                for name in TIMING_FIELDS
+                if name in response_obj
+            }
+    return ''.join(chunks).strip(), timings, first_token_at
+
 
+def _log_timings(model_name: str, timings: dict) -> None:
+    """Логирует время обработки промпта отдельно от генерации.
 
-def do_task(text: str, model_name: str | None = None) -> str:
+    При переиспользовании префикса prompt_eval_count падает до числа
+    токенов текста пользователя, а prompt_eval_duration — пропорционально.
+    """
+    if not timings:
+        return
+    eval_duration = timings.get('eval_duration', 0) / 1e9
+    eval_count = timings.get('eval_count', 0)
+    logger.info(
+        "Model %s: prompt eval %s tokens in %.1f ms, "
+        "eval %s tokens in %.1f ms (%.1f tokens/s)",
+        model_name,
+        timings.get('prompt_eval_count', 0),
+        timings.get('prompt_eval_duration', 0) / 1e6,
+        eval_count,
+        eval_duration * 1e3,
+        eval_count / eval_duration if eval_duration else 0.0,
+    )
+
+
+def load_model(model_name: str) -> bool:
+    """
+    Загружает модель в память каждого сервера Ollama и продлевает её keep_alive.
+
+    Запрос /api/generate без prompt только загружает модель,
+    генерация при этом не выполняется.
+
+    Args:
+        model_name: Имя модели в Ollama
+
+    Returns:
+        bool: True, если модель загружена хотя бы на одном сервере
+    """
+    loaded = False
+    results = backend_pool.broadcast(
+        GENERATE_PATH,
+        {'model': model_name, 'keep_alive': KEEP_ALIVE},
+        LOAD_TIMEOUT
+    )
+    for base_url, response in results:
+        if response is not None and response.status_code == 200:
+            loaded = True
+        elif response is not None:
+            logger.warning(
+                "Failed to load model '%s' on %s: status %s",
+                model_name,
+                base_url,
+                response.status_code
+            )
+    return loaded
+
+
+class TaskStatus(str, Enum):
+    """Исход выполнения задачи моделью."""
+    SUCCESS = "success"
+    RETRYABLE = "retryable"  # временный сбой: задачу стоит повторить
+    FATAL = "fatal"  # повтор не поможет (например, модель не найдена)
+
+
+@dataclass
+class InferenceResult:
+    """Результат обращения к модели: текст при успехе или описание ошибки."""
+    status: TaskStatus
+    text: str = ""
+    error: str | None = None
+    # Счётчики Ollama (TIMING_FIELDS) для успешного ответа
+    timings: dict = field(default_factory=dict)
+    # Время от отправки запроса до первого токена, секунды
+    first_token_latency: float | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status == TaskStatus.SUCCESS
+
+
+def do_task(
+    text: str, model_name: str | None = None, options: dict | None = None
+) -> InferenceResult:
     """
     Выполняет задачу обработки текста с помощью LLM.
 
     Args:
         text: Входящий текст для обработки
+        model_name: Имя модели в Ollama (по умолчанию OLLAMA_MODEL)
+        options: Параметры генерации Ollama (по умолчанию только num_predict)
 
     Returns:
-        str: Краткое продолжение текста (не более 10 токенов)
+        InferenceResult: Текст ответа модели либо типизированная ошибка
+
+    Raises:
+        NoBackendAvailable: Если circuit breaker всех бэкендов открыт —
+            запрос не отправляется и не ждёт таймаута
     """
     model_for_request = (model_name or DEFAULT_MODEL_NAME).strip()
     try:
-        response = requests.post(
-            OLLAMA_URL,
-            json={
+        started = time.monotonic()
+        # Ответ читается потоком: момент первой строки с токеном — TTFT
+        with backend_pool.stream(
+            GENERATE_PATH,
+            {
                 'model': model_for_request,
+                'system': SYSTEM_PROMPT,
                 'prompt': text,
-                'options': {
-                    'num_predict': NUM_PREDICT
-                }
+                'keep_alive': KEEP_ALIVE,
+                'options': options or {'num_predict': NUM_PREDICT}
             },
-            timeout=REQUEST_TIMEOUT
-        )
+            REQUEST_TIMEOUT
+        ) as response:
+            status_code = response.status_code
+            if status_code == 200:
+                answer, timings, first_token_at = _read_stream(response)
 
-        logger.info(f"Response status code: {response.status_code}")
-        logger.debug(f"Response content: {response.content}")
+        logger.info(f"Response status code: {status_code}")
 
-        if response.status_code == 404:
+        if status_code == 404:
             if model_for_request != DEFAULT_MODEL_NAME:
                 logger.warning(
                     "Model '%s' not found. Falling back to '%s'",
                     model_for_request,
                     DEFAULT_MODEL_NAME
                 )
-                return do_task(text, DEFAULT_MODEL_NAME)
-            return (
-                f'Модель "{model_for_request}" не найдена в Ollama. '
-                'Проверьте OLLAMA_MODEL и docker-compose.'
+                return do_task(text, DEFAULT_MODEL_NAME, options)
+            return InferenceResult(
+                TaskStatus.FATAL,
+                error=(
+                    f'Модель "{model_for_request}" не найдена в Ollama. '
+                    'Проверьте OLLAMA_MODEL и docker-compose.'
+                )
             )
 
-        if response.status_code == 200:
-            return _parse_response(response.text)
+        if status_code == 200:
+            _log_timings(model_for_request, timings)
+            return InferenceResult(
+                TaskStatus.SUCCESS,
+                text=answer,
+                timings=timings,
+                first_token_latency=(
+                    first_token_at - started if first_token_at else None
+                ),
+            )
 
-        return f'Ошибка сервера: {response.status_code}'
+        status = (
+            TaskStatus.RETRYABLE if status_code >= 500
+            else TaskStatus.FATAL
+        )
+        return InferenceResult(
+            status, error=f'Ошибка сервера: {status_code}'
+        )
 
+    except NoBackendAvailable:
+        raise
     except requests.Timeout:
         logger.error("Request timed out")
-        return 'Превышено время ожидания ответа'
+        return InferenceResult(
+            TaskStatus.RETRYABLE, error='Превышено время ожидания ответа'
+        )
     except requests.RequestException as e:
         logger.error(f"Request error: {e}")
-        return 'Ошибка при выполнении запроса'
+        return InferenceResult(
+            TaskStatus.RETRYABLE, error='Ошибка при выполнении запроса'
+        )
     except Exception as e:
         logger.error(f"Unexpected error: {e}")
-        return 'Неожиданная ошибка при обработке'
+        return InferenceResult(
+            TaskStatus.FATAL, error='Неожиданная ошибка при обработке'
+        )
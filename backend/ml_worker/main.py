@@ -1,8 +1,19 @@
 """Точка входа для запуска ML-воркера в контейнере."""
 
 from rmqconf import RabbitMQConfig
-from worker import MLWorker
+from worker import MLWorker, WorkerStats
+from autoscaler import Autoscaler
+from warmup import ModelKeeper
+from spellcheck import get_spellchecker
+from metrics import start_metrics_server
+from tracing import shutdown_exporter
+from dataclasses import dataclass
+import multiprocessing
+import threading
+import signal
+import socket
 import sys
+import os
 import pika
 import time
 import logging
@@ -15,14 +26,22 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# Дочернему процессу даётся время на дренаж плюс запас на закрытие соединений
+CHILD_STOP_TIMEOUT = MLWorker.DRAIN_TIMEOUT + 5  # seconds
+CHILD_MIN_UPTIME = 5  # seconds, более раннее падение считается crash loop
+MAX_RESTART_DELAY = 60  # seconds
+STATS_INTERVAL = float(os.getenv("WORKER_STATS_INTERVAL", "60"))  # seconds
+
 
 def run_worker(worker):
-    """Запускает воркер с логикой переподключения."""
-    while True:
+    """Запускает воркер с логикой переподключения до запроса остановки."""
+    while not worker.draining:
         try:
             if not worker.connection or not worker.connection.is_open:
                 logger.info("Connecting to RabbitMQ...")
                 worker.connect()
+                if worker.draining:
+                    break
 
             logger.info("Starting message consumption...")
             worker.start_consuming()
@@ -35,7 +54,254 @@ def run_worker(worker):
             logger.error(f"Unexpected error: {e}")
             raise
 
-        time.sleep(1)
+        if not worker.draining:
+            time.sleep(1)
+    logger.info("Worker stopped")
+
+
+def _run_child(worker_id: str, stats: WorkerStats, slot: int) -> None:
+    """Точка входа дочернего процесса: своё соединение и свой воркер."""
+    # Обработчики родителя наследуются при fork: ребёнок ставит свои —
+    # SIGTERM (terminate() супервизора) запускает дренаж воркера
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    start_metrics_server(slot)
+    worker = MLWorker(RabbitMQConfig(), worker_id=worker_id, stats=stats)
+    worker.install_signal_handlers()
+    try:
+        run_worker(worker)
+    finally:
+        # Дочерний процесс multiprocessing не вызывает atexit
+        shutdown_exporter()
+
+
+@dataclass
+class ChildSlot:
+    """Слот супервизора: процесс-воркер и его счётчики."""
+    worker_id: str
+    stats: WorkerStats
+    # Номер слота в пуле: смещение порта метрик, переживает перезапуски
+    index: int = 0
+    process: multiprocessing.Process | None = None
+    started_at: float = 0.0
+    restarts: int = 0
+    restart_at: float = 0.0
+
+
+class WorkerSupervisor:
+    """
+    Супервизор процессов-воркеров внутри одного контейнера.
+
+    Каждый дочерний процесс создаёт собственные соединение с RabbitMQ
+    и HTTP-сессии. Упавшие процессы перезапускаются с экспоненциальной
+    задержкой, по SIGTERM детям пересылается сигнал и супервизор ждёт
+    их завершения. Размер пула может меняться автоскейлером.
+    """
+
+    def __init__(self):
+        self._context = multiprocessing.get_context("fork")
+        self._slots: list[ChildSlot] = []
+        self._counter = 0
+        # Номера слотов, процессы которых ещё останавливаются (и держат порт метрик)
+        self._stopping: set[int] = set()
+        self._lock = threading.RLock()
+        self._closed = False
+
+    @property
+    def size(self) -> int:
+        return len(self._slots)
+
+    def stats(self) -> list[WorkerStats]:
+        """Возвращает счётчики всех слотов пула."""
+        with self._lock:
+            return [slot.stats for slot in self._slots]
+
+    def _start(self, slot: ChildSlot) -> None:
+        slot.process = self._context.Process(
+            target=_run_child,
+            args=(slot.worker_id, slot.stats, slot.index),
+            name=slot.worker_id,
+        )
+        # Процесс мог упасть посреди задачи и оставить флаг занятости
+        slot.stats.set_idle()
+        slot.process.start()
+        slot.started_at = time.monotonic()
+        logger.info(
+            f"Started worker process {slot.worker_id} (pid {slot.process.pid})"
+        )
+
+    def _stop(self, slot: ChildSlot) -> None:
+        process = slot.process
+        if process is None:
+            return
+        process.terminate()
+        process.join(CHILD_STOP_TIMEOUT)
+        if process.is_alive():
+            logger.warning(f"Worker {slot.worker_id} did not stop, killing")
+            process.kill()
+            process.join()
+        logger.info(
+            f"Stopped worker process {slot.worker_id} "
+            f"(exit code {process.exitcode})"
+        )
+
+    def scale_to(self, size: int) -> None:
+        """Запускает или останавливает процессы до заданного размера.
+
+        Лишние слоты убираются из пула под блокировкой, а их процессы
+        останавливаются уже без неё: дренаж занимает до CHILD_STOP_TIMEOUT
+        секунд, и reap/stats/report не должны ждать его.
+
+        Новый слот получает наименьший свободный номер: номера занятых
+        слотов и слотов, которые ещё останавливаются, пропускаются, чтобы
+        новый процесс не занял порт метрик ещё работающего.
+        """
+        removed = []
+        with self._lock:
+            if self._closed:
+                return
+            while len(self._slots) < size:
+                self._counter += 1
+                slot = ChildSlot(
+                    worker_id=f"{socket.gethostname()}-{self._counter}",
+                    stats=WorkerStats(),
+                    index=self._free_index(),
+                )
+                self._slots.append(slot)
+                self._start(slot)
+            while len(self._slots) > size:
+                slot = self._slots.pop()
+                self._stopping.add(slot.index)
+                removed.append(slot)
+        for slot in removed:
+            try:
+                self._stop(slot)
+            finally:
+                with self._lock:
+                    self._stopping.discard(slot.index)
+
+    def _free_index(self) -> int:
+        """Возвращает наименьший номер слота, не занятый ни одним процессом."""
+        used = {slot.index for slot in self._slots} | self._stopping
+        index = 0
+        while index in used:
+            index += 1
+        return index
+
+    def reap(self) -> None:
+        """Перезапускает упавшие процессы с учётом задержки."""
+        now = time.monotonic()
+        with self._lock:
+            for slot in self._slots:
+                process = slot.process
+                if process is not None and process.is_alive():
+                    continue
+                if process is not None:
+                    uptime = now - slot.started_at
+                    delay = 0.0
+                    if uptime < CHILD_MIN_UPTIME:
+                        delay = min(2 ** slot.restarts, MAX_RESTART_DELAY)
+                    logger.error(
+                        f"Worker {slot.worker_id} exited with code "
+                        f"{process.exitcode} after {uptime:.1f}s, "
+                        f"restarting in {delay:.0f}s"
+                    )
+                    process.close()
+                    slot.process = None
+                    slot.restarts += 1
+                    slot.restart_at = now + delay
+                if now >= slot.restart_at:
+                    self._start(slot)
+
+    def report(self) -> list[dict]:
+        """Возвращает и логирует статистику по каждому процессу."""
+        rows = []
+        with self._lock:
+            for slot in self._slots:
+                row = {
+                    "worker_id": slot.worker_id,
+                    "pid": slot.process.pid if slot.process else None,
+                    "restarts": slot.restarts,
+                    **slot.stats.snapshot(),
+                }
+                rows.append(row)
+                logger.info(f"Worker stats: {row}")
+        return rows
+
+    def run(self, stop_event: threading.Event) -> None:
+        """Следит за процессами до установки stop_event, затем останавливает их."""
+        next_report = time.monotonic() + STATS_INTERVAL
+        try:
+            while not stop_event.wait(1):
+                self.reap()
+                if time.monotonic() >= next_report:
+                    self.report()
+                    next_report = time.monotonic() + STATS_INTERVAL
+        finally:
+            logger.info("Draining worker processes...")
+            self.shutdown()
+            self.report()
+
+    def shutdown(self) -> None:
+        """Пересылает SIGTERM всем детям и ждёт их завершения."""
+        with self._lock:
+            self._closed = True
+            for slot in self._slots:
+                if slot.process is not None and slot.process.is_alive():
+                    slot.process.terminate()
+            deadline = time.monotonic() + CHILD_STOP_TIMEOUT
+            for slot in self._slots:
+                if slot.process is None:
+                    continue
+                slot.process.join(max(deadline - time.monotonic(), 0))
+                if slot.process.is_alive():
+                    logger.warning(f"Worker {slot.worker_id} did not stop, killing")
+                    slot.process.kill()
+                    slot.process.join()
+
+
+def _install_stop_handlers() -> threading.Event:
+    """Перехватывает SIGTERM/SIGINT и возвращает событие остановки."""
+    stop_event = threading.Event()
+
+    def _request_stop(signum, _frame):
+        logger.info(f"Received signal {signum}, stopping worker processes")
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, _request_stop)
+    signal.signal(signal.SIGINT, _request_stop)
+    return stop_event
+
+
+def _keep_models_warm(
+    config: RabbitMQConfig, stop_event: threading.Event
+) -> None:
+    """Прогревает модели до начала потребления и поддерживает их в памяти."""
+    keeper = ModelKeeper(config.models)
+    keeper.warm_up()
+    keeper.start(stop_event)
+
+
+def run_supervised(config: RabbitMQConfig, processes: int) -> None:
+    """Запускает фиксированное число процессов-воркеров под супервизором."""
+    stop_event = _install_stop_handlers()
+    _keep_models_warm(config, stop_event)
+    supervisor = WorkerSupervisor()
+    supervisor.scale_to(processes)
+    supervisor.run(stop_event)
+
+
+def run_autoscaled(config: RabbitMQConfig) -> None:
+    """Запускает пул воркеров под управлением автоскейлера до SIGTERM/SIGINT."""
+    stop_event = _install_stop_handlers()
+    _keep_models_warm(config, stop_event)
+    supervisor = WorkerSupervisor()
+    autoscaler = Autoscaler(supervisor, config)
+    scaler_thread = threading.Thread(
+        target=autoscaler.run, args=(stop_event,), name="autoscaler", daemon=True
+    )
+    scaler_thread.start()
+    supervisor.run(stop_event)
+    scaler_thread.join(CHILD_STOP_TIMEOUT)
 
 
 def main():
@@ -46,8 +312,22 @@ def main():
     worker = None
     try:
         config = RabbitMQConfig()
-        worker = MLWorker(config)
-        run_worker(worker)
+        # Словарь загружается до fork: дети разделяют готовый индекс
+        get_spellchecker()
+        processes = os.getenv("WORKER_PROCESSES", "1")
+        processes = (
+            (os.cpu_count() or 1) if processes == "auto" else int(processes)
+        )
+        if os.getenv("WORKER_AUTOSCALE", "0") == "1":
+            run_autoscaled(config)
+        elif processes > 1:
+            run_supervised(config, processes)
+        else:
+            worker = MLWorker(config)
+            worker.install_signal_handlers()
+            start_metrics_server()
+            _keep_models_warm(config, threading.Event())
+            run_worker(worker)
     except Exception as e:
         logger.error(f"Application error: {e}")
         return 1
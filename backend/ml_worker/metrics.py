@@ -0,0 +1,70 @@
+"""Метрики Prometheus процесса-воркера.
+
+Каждый процесс-воркер поднимает собственный HTTP-эндпоинт на порту
+WORKER_METRICS_PORT + номер слота в пуле супервизора, поэтому метрики
+процессов не смешиваются и доступны для локального опроса.
+"""
+
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Базовый порт эндпоинта метрик; 0 отключает эндпоинт
+METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "9100"))
+
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60)
+
+MESSAGES = Counter(
+    "ml_worker_messages_total",
+    "Сообщения очереди по исходу обработки",
+    ["outcome"],  # consumed | acked | nacked | rejected
+)
+INFERENCE_DURATION = Histogram(
+    "ml_worker_inference_duration_seconds",
+    "Длительность обработки текста",
+    ["model", "source"],  # source: ollama | dictionary
+    buckets=LATENCY_BUCKETS,
+)
+TIME_TO_FIRST_TOKEN = Histogram(
+    "ml_worker_time_to_first_token_seconds",
+    "Время от запроса к Ollama до первого токена ответа",
+    ["model"],
+    buckets=LATENCY_BUCKETS,
+)
+SEND_RESULT_DURATION = Histogram(
+    "ml_worker_send_result_duration_seconds",
+    "Длительность отправки результата в API",
+    ["result"],  # ok | error
+)
+TASKS_IN_FLIGHT = Gauge(
+    "ml_worker_tasks_in_flight",
+    "Задачи, обрабатываемые процессом",
+)
+PREFETCH_UTILISATION = Gauge(
+    "ml_worker_prefetch_utilisation",
+    "Доля окна prefetch, занятая неподтверждёнными сообщениями",
+)
+
+
+def start_metrics_server(slot: int = 0) -> int | None:
+    """
+    Запускает HTTP-эндпоинт метрик текущего процесса.
+
+    Args:
+        slot: Номер процесса в пуле (смещение от базового порта)
+
+    Returns:
+        int | None: Порт эндпоинта или None, если он отключён или занят
+    """
+    if not METRICS_PORT:
+        return None
+    port = METRICS_PORT + slot
+    try:
+        start_http_server(port)
+    except OSError as e:
+        logger.warning(f"Metrics endpoint on port {port} not started: {e}")
+        return None
+    logger.info(f"Metrics endpoint listening on port {port}")
+    return port
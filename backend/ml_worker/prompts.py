@@ -0,0 +1,122 @@
+"""Шаблоны промптов и параметры генерации моделей из таблицы MLModel."""
+
+from dataclasses import dataclass, field
+from warmup import MODELS_ENDPOINT, api_headers
+from llm import NUM_PREDICT
+import math
+import os
+import time
+import logging
+import requests
+
+logger = logging.getLogger(__name__)
+
+PROMPT_CACHE_TTL = float(os.getenv("PROMPT_CACHE_TTL", "300"))  # seconds
+# Грубая оценка числа токенов по длине текста (кириллица и латиница)
+CHARS_PER_TOKEN = 3.0
+# Параметры масштабирования num_predict; в Ollama не передаются
+SCALING_DEFAULTS = {
+    "num_predict_ratio": 1.5,
+    "num_predict_min": 16,
+    "num_predict_max": 512,
+}
+
+
+@dataclass
+class PromptSpec:
+    """
+    Шаблон промпта и параметры генерации модели.
+
+    Атрибуты:
+        template: Шаблон с плейсхолдером {text}; None — текст без обёртки
+        options: Параметры генерации из MLModel.generation_options
+    """
+    template: str | None = None
+    options: dict = field(default_factory=dict)
+
+    def render(self, text: str) -> str:
+        """Подставляет текст пользователя в шаблон."""
+        if not self.template:
+            return text
+        # replace, а не format: фигурные скобки в шаблоне и тексте допустимы
+        return self.template.replace("{text}", text)
+
+    def options_for(self, text: str) -> dict:
+        """
+        Возвращает параметры генерации для конкретного текста.
+
+        Если num_predict не задан явно, бюджет токенов пропорционален
+        длине входа: короткие тексты не тратят лишние токены, длинные
+        не обрезаются.
+
+        Args:
+            text: Текст пользователя
+
+        Returns:
+            dict: Параметры для поля options запроса к Ollama
+        """
+        scaling = {**SCALING_DEFAULTS}
+        options = {}
+        for key, value in self.options.items():
+            if key in scaling:
+                scaling[key] = value
+            else:
+                options[key] = value
+        if "num_predict" not in options:
+            if not self.options:
+                options["num_predict"] = NUM_PREDICT
+            else:
+                estimated = math.ceil(len(text) / CHARS_PER_TOKEN)
+                options["num_predict"] = int(min(
+                    max(
+                        math.ceil(estimated * scaling["num_predict_ratio"]),
+                        scaling["num_predict_min"],
+                    ),
+                    scaling["num_predict_max"],
+                ))
+        return options
+
+
+class PromptRegistry:
+    """
+    Кэш шаблонов промптов моделей, полученных из API.
+
+    Список моделей запрашивается не чаще раза в ttl секунд; при
+    недоступности API используется последний полученный список,
+    а для неизвестных моделей — текст без обёртки и NUM_PREDICT.
+    """
+
+    def __init__(
+        self, models_endpoint: str = MODELS_ENDPOINT, ttl: float = PROMPT_CACHE_TTL
+    ):
+        self.models_endpoint = models_endpoint
+        self.ttl = ttl
+        self._specs: dict[str, PromptSpec] = {}
+        self._expires_at = 0.0
+
+    def refresh(self) -> bool:
+        """Загружает шаблоны из API, возвращает признак успеха."""
+        # Следующая попытка не раньше чем через ttl, даже при ошибке
+        self._expires_at = time.monotonic() + self.ttl
+        try:
+            response = requests.get(
+                self.models_endpoint, headers=api_headers(), timeout=5
+            )
+            response.raise_for_status()
+            self._specs = {
+                model["name"].strip(): PromptSpec(
+                    template=model.get("prompt_template"),
+                    options=model.get("generation_options") or {},
+                )
+                for model in response.json()
+            }
+            return True
+        except (requests.RequestException, ValueError, KeyError) as e:
+            logger.warning(f"Could not fetch prompt templates: {e}")
+            return False
+
+    def get(self, model_name: str) -> PromptSpec:
+        """Возвращает шаблон модели, обновляя кэш по истечении ttl."""
+        if time.monotonic() >= self._expires_at:
+            self.refresh()
+        return self._specs.get(model_name.strip(), PromptSpec())
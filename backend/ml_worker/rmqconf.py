@@ -1,9 +1,16 @@
 """Конфигурация подключения ML-воркера к RabbitMQ."""
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+import os
 import pika
 
 
+def _models_from_env() -> list[str]:
+    """Модели из WORKER_MODELS (через запятую), по умолчанию OLLAMA_MODEL."""
+    raw = os.getenv("WORKER_MODELS") or os.getenv("OLLAMA_MODEL", "gemma3:1b")
+    return [name.strip() for name in raw.split(",") if name.strip()]
+
+
 @dataclass
 class RabbitMQConfig:
     """
@@ -15,10 +22,19 @@ class RabbitMQConfig:
         virtual_host: Виртуальный хост
         username: Имя пользователя
         password: Пароль
-        queue_name: Название основной очереди задач
+        queue_name: Название общей очереди задач (модели без выделенных воркеров)
         rpc_queue_name: Название очереди для RPC-запросов
         heartbeat: Интервал проверки соединения в секундах
         connection_timeout: Таймаут подключения в секундах
+        prefetch_count: Сколько неподтверждённых сообщений держит один воркер
+        exchange_name: Topic-обменник задач с ключами `model.<имя>`
+        unrouted_exchange_name: Обменник для задач без очереди модели
+        models: Модели, которые воркер держит в памяти и очереди которых слушает
+        consume_unrouted: Слушать ли также общую очередь задач
+        model_queue_expires: Через сколько мс брокер удаляет очередь модели
+            без потребителей (x-expires)
+        model_queue_message_ttl: Через сколько мс задача из очереди модели
+            уходит в общую очередь (x-message-ttl)
     """
     # Параметры подключения
     host: str = 'rabbitmq'
@@ -37,6 +53,88 @@ class RabbitMQConfig:
     heartbeat: int = 30
     connection_timeout: int = 2
 
+    # Одно сообщение на воркер: при остановке возвращать в очередь почти нечего,
+    # а свободные воркеры не ждут сообщений, застрявших в буфере занятого
+    prefetch_count: int = 1
+
+    # Маршрутизация задач по моделям (см. app/task_queue.py)
+    exchange_name: str = 'ml_tasks'
+    unrouted_exchange_name: str = 'ml_tasks.unrouted'
+    models: list[str] = field(default_factory=_models_from_env)
+    consume_unrouted: bool = field(
+        default_factory=lambda: os.getenv("WORKER_CONSUME_UNROUTED", "1") == "1"
+    )
+    # Очередь модели, которую перестали слушать, удаляется брокером вместе
+    # с привязкой, и задачи модели снова идут в общую очередь. Задачи,
+    # которые никто не взял за время жизни сообщения, переходят в общую
+    # очередь раньше, поэтому время жизни очереди должно быть больше.
+    model_queue_expires: int = field(
+        default_factory=lambda: int(os.getenv("MODEL_QUEUE_EXPIRES_MS", "300000"))
+    )
+    model_queue_message_ttl: int = field(
+        default_factory=lambda: int(os.getenv("MODEL_QUEUE_MESSAGE_TTL_MS", "60000"))
+    )
+
+    @staticmethod
+    def routing_key(model_name: str) -> str:
+        """Ключ маршрутизации модели; точка в имени заменяется, т.к. это разделитель."""
+        return "model." + model_name.strip().replace(".", "_")
+
+    def model_queue(self, model_name: str) -> str:
+        """Имя очереди задач конкретной модели."""
+        return f"{self.queue_name}.{model_name.strip()}"
+
+    def consumed_queues(self) -> list[str]:
+        """Очереди, которые слушает воркер."""
+        queues = [self.model_queue(name) for name in self.models]
+        if self.consume_unrouted:
+            queues.append(self.queue_name)
+        return queues
+
+    def model_queue_arguments(self) -> dict:
+        """Аргументы очереди модели: время жизни и переход задач в общую очередь."""
+        return {
+            'x-expires': self.model_queue_expires,
+            'x-message-ttl': self.model_queue_message_ttl,
+            'x-dead-letter-exchange': self.unrouted_exchange_name,
+        }
+
+    def declare_topology(self, channel) -> None:
+        """
+        Объявляет обменники и очереди воркера.
+
+        Параметры обменников должны совпадать с app/task_queue.py,
+        иначе брокер отклонит повторное объявление. То же относится
+        к аргументам очередей моделей: очереди, объявленные до появления
+        x-expires, нужно один раз удалить (`rabbitmqctl delete_queue`).
+        """
+        channel.exchange_declare(
+            exchange=self.unrouted_exchange_name,
+            exchange_type='fanout',
+            durable=True
+        )
+        channel.exchange_declare(
+            exchange=self.exchange_name,
+            exchange_type='topic',
+            durable=True,
+            arguments={'alternate-exchange': self.unrouted_exchange_name}
+        )
+        # Очереди должны быть durable, чтобы не терять сообщения при перезапуске RabbitMQ
+        channel.queue_declare(queue=self.queue_name, durable=True)
+        channel.queue_bind(
+            queue=self.queue_name, exchange=self.unrouted_exchange_name
+        )
+        for name in self.models:
+            queue = self.model_queue(name)
+            channel.queue_declare(
+                queue=queue, durable=True, arguments=self.model_queue_arguments()
+            )
+            channel.queue_bind(
+                queue=queue,
+                exchange=self.exchange_name,
+                routing_key=self.routing_key(name)
+            )
+
     def get_connection_params(self) -> pika.ConnectionParameters:
         """Создает параметры подключения к RabbitMQ."""
         return pika.ConnectionParameters(
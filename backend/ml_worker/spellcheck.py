@@ -0,0 +1,302 @@
+"""Словарная проверка орфографии (SymSpell) — быстрый путь перед LLM.
+
+Для каждого слова словаря заранее строятся варианты с удалёнными
+символами (до max_distance удалений). При поиске удаления строятся и для
+входного слова: совпавшие ключи дают кандидатов, для которых затем
+считается точное расстояние Дамерау–Левенштейна. Кандидаты всех
+неизвестных слов текста оцениваются одним векторным проходом
+(edit_distance.batch_distance).
+
+Текст без неизвестных слов или только с однозначными исправлениями
+возвращается сразу; в Ollama уходят лишь неоднозначные случаи.
+"""
+
+from dataclasses import dataclass, field
+from edit_distance import batch_distance
+import logging
+import os
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+SPELLCHECK_DICTIONARY = os.getenv("SPELLCHECK_DICTIONARY", "")
+# Скомпилированный индекс (см. spellindex.py); имеет приоритет над словарём
+SPELLCHECK_INDEX = os.getenv("SPELLCHECK_INDEX", "")
+MAX_EDIT_DISTANCE = int(os.getenv("SPELLCHECK_MAX_DISTANCE", "2"))
+PREFIX_LENGTH = int(os.getenv("SPELLCHECK_PREFIX_LENGTH", "7"))
+# Исправление на расстоянии не больше этого принимается без LLM,
+# если лучший кандидат единственный или преобладает по частоте;
+# более далёкие исправления всегда решает LLM
+AUTO_CORRECT_DISTANCE = int(os.getenv("SPELLCHECK_AUTO_DISTANCE", "1"))
+# Во сколько раз лучший кандидат должен быть частотнее второго,
+# чтобы считаться однозначным при равном расстоянии
+DOMINANCE_RATIO = float(os.getenv("SPELLCHECK_DOMINANCE_RATIO", "10"))
+
+# Слово — буквы, возможно соединённые дефисом или апострофом
+WORD_RE = re.compile(r"[^\W\d_]+(?:['’-][^\W\d_]+)*")
+
+
+@dataclass(frozen=True)
+class Suggestion:
+    """Кандидат исправления: слово словаря, расстояние и частота."""
+    term: str
+    distance: int
+    count: int
+
+
+@dataclass
+class CheckResult:
+    """
+    Результат словарной проверки текста.
+
+    Атрибуты:
+        text: Текст с применёнными однозначными исправлениями
+        corrections: Пары (исходное слово, исправление)
+        unresolved: Слова, которые словарь исправить однозначно не может
+    """
+    text: str
+    corrections: list[tuple[str, str]] = field(default_factory=list)
+    unresolved: list[str] = field(default_factory=list)
+
+    @property
+    def needs_llm(self) -> bool:
+        """Нужно ли передавать текст в LLM."""
+        return bool(self.unresolved)
+
+
+def _deletes(word: str, max_distance: int) -> set[str]:
+    """Все варианты слова с удалением до max_distance символов."""
+    result = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {
+            item[:i] + item[i + 1:]
+            for item in frontier
+            if len(item) > 1
+            for i in range(len(item))
+        }
+        result |= frontier
+    return result
+
+
+def _restore_case(source: str, word: str) -> str:
+    """Переносит регистр исходного слова на исправление."""
+    if len(source) > 1 and source.isupper():
+        return word.upper()
+    if source[:1].isupper():
+        return word[:1].upper() + word[1:]
+    return word
+
+
+class SpellChecker:
+    """
+    Индекс удалений SymSpell над словарём частот.
+
+    Args:
+        max_distance: Максимальное расстояние исправления
+        prefix_length: Длина префикса слова, по которому строятся удаления
+            (ограничивает размер индекса для длинных слов)
+    """
+
+    def __init__(
+        self,
+        max_distance: int = MAX_EDIT_DISTANCE,
+        prefix_length: int = PREFIX_LENGTH,
+    ):
+        self.max_distance = max_distance
+        self.prefix_length = max(prefix_length, max_distance + 1)
+        self.words: dict[str, int] = {}
+        self._deletes: dict[str, list[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def count(self, word: str) -> int:
+        """Частота слова словаря (0, если слова нет)."""
+        return self.words.get(word, 0)
+
+    def add_word(self, word: str, count: int = 1) -> None:
+        """Добавляет слово словаря и его удаления в индекс."""
+        word = word.lower()
+        if word in self.words:
+            self.words[word] += count
+            return
+        self.words[word] = count
+        for key in _deletes(word[:self.prefix_length], self.max_distance):
+            self._deletes.setdefault(key, []).append(word)
+
+    def load_dictionary(self, path: str) -> int:
+        """
+        Загружает словарь частот: строки `слово [частота]`.
+
+        Args:
+            path: Путь к файлу словаря (UTF-8)
+
+        Returns:
+            int: Число загруженных слов
+        """
+        with open(path, encoding="utf-8") as source:
+            for line in source:
+                parts = line.split()
+                if not parts:
+                    continue
+                count = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 1
+                self.add_word(parts[0], count)
+        return len(self.words)
+
+    def candidates(self, word: str) -> set[str]:
+        """Слова словаря, делящие с word хотя бы один ключ удаления."""
+        found: set[str] = set()
+        for key in _deletes(word[:self.prefix_length], self.max_distance):
+            found.update(self._deletes.get(key, ()))
+        return found
+
+    def lookup(self, word: str) -> list[Suggestion]:
+        """
+        Ищет ближайшие слова словаря.
+
+        Args:
+            word: Слово для проверки
+
+        Returns:
+            list[Suggestion]: Кандидаты с минимальным расстоянием,
+                по убыванию частоты (пусто, если ничего не найдено)
+        """
+        word = word.lower()
+        return self.lookup_many([word])[word]
+
+    def lookup_many(self, words: list[str]) -> dict[str, list[Suggestion]]:
+        """
+        Ищет ближайшие слова словаря для набора слов за один проход.
+
+        Args:
+            words: Слова в нижнем регистре
+
+        Returns:
+            dict[str, list[Suggestion]]: Кандидаты для каждого слова,
+                как в lookup
+        """
+        found: dict[str, list[Suggestion]] = {}
+        sources: list[str] = []
+        targets: list[str] = []
+        for word in dict.fromkeys(words):
+            count = self.count(word)
+            if count:
+                found[word] = [Suggestion(word, 0, count)]
+                continue
+            found[word] = []
+            for term in self.candidates(word):
+                sources.append(word)
+                targets.append(term)
+
+        distances = batch_distance(sources, targets, self.max_distance)
+        best: dict[str, int] = {}
+        for word, term, distance in zip(sources, targets, distances.tolist()):
+            if distance > self.max_distance or distance > best.get(word, distance):
+                continue
+            if distance < best.get(word, distance + 1):
+                best[word] = distance
+                found[word] = []
+            found[word].append(Suggestion(term, distance, self.count(term)))
+        for suggestions in found.values():
+            suggestions.sort(key=lambda item: (-item.count, item.term))
+        return found
+
+    def _resolve(self, suggestions: list[Suggestion]) -> Suggestion | None:
+        """Выбирает однозначное исправление или None."""
+        if not suggestions:
+            return None
+        top = suggestions[0]
+        if top.distance == 0:
+            return top
+        if top.distance > AUTO_CORRECT_DISTANCE:
+            return None
+        if len(suggestions) == 1:
+            return top
+        if top.count >= DOMINANCE_RATIO * suggestions[1].count:
+            return top
+        return None
+
+    def check(self, text: str) -> CheckResult:
+        """
+        Проверяет текст по словарю.
+
+        Args:
+            text: Входной текст
+
+        Returns:
+            CheckResult: Исправленный текст и слова, требующие LLM
+        """
+        result = CheckResult(text=text)
+        matches = list(WORD_RE.finditer(text))
+        unknown = [
+            lowered for lowered in {m.group().lower() for m in matches}
+            if not self.count(lowered)
+        ]
+        suggestions = self.lookup_many(unknown)
+        pieces: list[str] = []
+        position = 0
+        for match in matches:
+            token = match.group()
+            lowered = token.lower()
+            if lowered not in suggestions:
+                continue
+            choice = self._resolve(suggestions[lowered])
+            if choice is None:
+                result.unresolved.append(token)
+                continue
+            replacement = _restore_case(token, choice.term)
+            pieces.append(text[position:match.start()])
+            pieces.append(replacement)
+            position = match.end()
+            result.corrections.append((token, replacement))
+        if result.corrections:
+            pieces.append(text[position:])
+            result.text = "".join(pieces)
+        return result
+
+
+_spellchecker: SpellChecker | None = None
+_loaded = False
+
+
+def get_spellchecker() -> SpellChecker | None:
+    """
+    Возвращает словарь процесса, загружая его при первом вызове.
+
+    Скомпилированный индекс (SPELLCHECK_INDEX) отображается в память:
+    все процессы-воркеры разделяют одну физическую копию страниц.
+    Текстовый словарь (SPELLCHECK_DICTIONARY) строится в памяти;
+    вызов в родительском процессе до fork позволяет детям разделять его.
+
+    Returns:
+        SpellChecker | None: None, если словарь не задан
+            или его не удалось загрузить
+    """
+    global _spellchecker, _loaded
+    if _loaded:
+        return _spellchecker
+    _loaded = True
+    if not (SPELLCHECK_INDEX or SPELLCHECK_DICTIONARY):
+        return None
+    started = time.monotonic()
+    try:
+        if SPELLCHECK_INDEX:
+            # Импорт здесь: spellindex сам зависит от этого модуля
+            from spellindex import MappedSpellChecker
+            checker = MappedSpellChecker(SPELLCHECK_INDEX)
+            source = SPELLCHECK_INDEX
+        else:
+            checker = SpellChecker()
+            checker.load_dictionary(SPELLCHECK_DICTIONARY)
+            source = SPELLCHECK_DICTIONARY
+    except (OSError, ValueError) as e:
+        logger.error(f"Failed to load spellcheck dictionary: {e}")
+        return None
+    logger.info(
+        f"Loaded {len(checker)} dictionary words from {source} "
+        f"in {time.monotonic() - started:.2f}s"
+    )
+    _spellchecker = checker
+    return _spellchecker
@@ -0,0 +1,249 @@
+"""Компактный индекс словаря для проверки орфографии, отображаемый в память.
+
+Индекс компилируется из файла частот один раз (`python spellindex.py build
+words.txt words.idx`) и открывается воркерами через mmap: страницы файла
+разделяются всеми процессами, а запуск не требует построения словарей
+Python.
+
+Формат (little-endian, секции выровнены по 8 байт):
+
+    заголовок       magic, версия, max_distance, prefix_length,
+                    n_words, n_keys, n_postings, размеры блоков строк
+    word_offsets    u32[n_words + 1] — смещения слов в word_blob
+    counts          u64[n_words]     — частоты слов
+    word_blob       UTF-8 слова, отсортированные побайтно
+    key_offsets     u32[n_keys + 1]  — смещения ключей удалений в key_blob
+    posting_offsets u32[n_keys + 1]  — смещения списков в postings
+    postings        u32[n_postings]  — номера слов для каждого ключа
+    key_blob        UTF-8 ключи удалений, отсортированные побайтно
+
+Побайтовый порядок UTF-8 совпадает с порядком кодовых точек, поэтому
+слова и ключи ищутся бинарным поиском прямо по отображению.
+"""
+
+from spellcheck import SpellChecker, _deletes, MAX_EDIT_DISTANCE, PREFIX_LENGTH
+import argparse
+import logging
+import mmap
+import struct
+import sys
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"SPIX"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sIIIIIIII")
+HEADER_SIZE = 64
+
+
+def _align(size: int) -> int:
+    return (size + 7) & ~7
+
+
+def _layout(
+    n_words: int, n_keys: int, n_postings: int, word_blob: int, key_blob: int
+) -> dict[str, tuple[int, int]]:
+    """Возвращает (смещение, размер) каждой секции файла."""
+    sizes = [
+        ("word_offsets", (n_words + 1) * 4),
+        ("counts", n_words * 8),
+        ("word_blob", word_blob),
+        ("key_offsets", (n_keys + 1) * 4),
+        ("posting_offsets", (n_keys + 1) * 4),
+        ("postings", n_postings * 4),
+        ("key_blob", key_blob),
+    ]
+    layout = {}
+    position = HEADER_SIZE
+    for name, size in sizes:
+        layout[name] = (position, size)
+        position = _align(position + size)
+    return layout
+
+
+def _pack_strings(items: list[bytes]) -> tuple[bytes, bytes]:
+    """Упаковывает строки в блок и массив смещений u32."""
+    offsets = [0]
+    for item in items:
+        offsets.append(offsets[-1] + len(item))
+    return b"".join(items), struct.pack(f"<{len(offsets)}I", *offsets)
+
+
+def build_index(
+    dictionary_path: str,
+    index_path: str,
+    max_distance: int = MAX_EDIT_DISTANCE,
+    prefix_length: int = PREFIX_LENGTH,
+) -> int:
+    """
+    Компилирует индекс из файла частот.
+
+    Args:
+        dictionary_path: Файл со строками `слово [частота]`
+        index_path: Путь к создаваемому индексу
+        max_distance: Максимальное расстояние исправления
+        prefix_length: Длина префикса для ключей удалений
+
+    Returns:
+        int: Число слов в индексе
+    """
+    checker = SpellChecker(max_distance, prefix_length)
+    checker.load_dictionary(dictionary_path)
+
+    words = sorted(checker.words, key=lambda word: word.encode("utf-8"))
+    word_ids = {word: number for number, word in enumerate(words)}
+    word_blob, word_offsets = _pack_strings([w.encode("utf-8") for w in words])
+    counts = struct.pack(f"<{len(words)}Q", *(checker.words[w] for w in words))
+
+    keys = sorted(checker._deletes, key=lambda key: key.encode("utf-8"))
+    key_blob, key_offsets = _pack_strings([k.encode("utf-8") for k in keys])
+    postings: list[int] = []
+    posting_offsets = [0]
+    for key in keys:
+        postings.extend(sorted(word_ids[w] for w in checker._deletes[key]))
+        posting_offsets.append(len(postings))
+
+    sections = {
+        "word_offsets": word_offsets,
+        "counts": counts,
+        "word_blob": word_blob,
+        "key_offsets": key_offsets,
+        "posting_offsets": struct.pack(
+            f"<{len(posting_offsets)}I", *posting_offsets
+        ),
+        "postings": struct.pack(f"<{len(postings)}I", *postings),
+        "key_blob": key_blob,
+    }
+    layout = _layout(
+        len(words), len(keys), len(postings), len(word_blob), len(key_blob)
+    )
+    header = HEADER.pack(
+        MAGIC, FORMAT_VERSION, checker.max_distance, checker.prefix_length,
+        len(words), len(keys), len(postings), len(word_blob), len(key_blob),
+    )
+    with open(index_path, "wb") as target:
+        target.write(header.ljust(HEADER_SIZE, b"\0"))
+        for name, (offset, _size) in layout.items():
+            target.write(b"\0" * (offset - target.tell()))
+            target.write(sections[name])
+    logger.info(
+        f"Built spellcheck index {index_path}: {len(words)} words, "
+        f"{len(keys)} deletion keys"
+    )
+    return len(words)
+
+
+class MappedSpellChecker(SpellChecker):
+    """
+    Проверка орфографии над индексом, отображённым в память.
+
+    Поиск совпадает с SpellChecker, но данные читаются из mmap без
+    копирования в объекты Python; индекс доступен только для чтения.
+
+    Args:
+        path: Путь к индексу, собранному build_index
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as source:
+            self._mm = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        (
+            magic, version, max_distance, prefix_length,
+            n_words, n_keys, n_postings, word_blob, key_blob,
+        ) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self._mm.close()
+            raise ValueError(f"{path} is not a spellcheck index v{FORMAT_VERSION}")
+        super().__init__(max_distance, prefix_length)
+        self._n_words = n_words
+        self._n_keys = n_keys
+        self._layout = _layout(n_words, n_keys, n_postings, word_blob, key_blob)
+        view = memoryview(self._mm)
+        self._views = {
+            name: view[offset:offset + size]
+            for name, (offset, size) in self._layout.items()
+        }
+        self._word_offsets = self._views["word_offsets"].cast("I")
+        self._counts = self._views["counts"].cast("Q")
+        self._key_offsets = self._views["key_offsets"].cast("I")
+        self._posting_offsets = self._views["posting_offsets"].cast("I")
+        self._postings = self._views["postings"].cast("I")
+
+    def __len__(self) -> int:
+        return self._n_words
+
+    def _blob(self, name: str, start: int, end: int) -> bytes:
+        offset = self._layout[name][0]
+        return self._mm[offset + start:offset + end]
+
+    def _word(self, number: int) -> bytes:
+        offsets = self._word_offsets
+        return self._blob("word_blob", offsets[number], offsets[number + 1])
+
+    def _key(self, number: int) -> bytes:
+        offsets = self._key_offsets
+        return self._blob("key_blob", offsets[number], offsets[number + 1])
+
+    @staticmethod
+    def _search(get, size: int, target: bytes) -> int:
+        """Бинарный поиск target среди size отсортированных строк."""
+        low, high = 0, size
+        while low < high:
+            middle = (low + high) // 2
+            if get(middle) < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < size and get(low) == target:
+            return low
+        return -1
+
+    def count(self, word: str) -> int:
+        number = self._search(self._word, self._n_words, word.encode("utf-8"))
+        return self._counts[number] if number >= 0 else 0
+
+    def add_word(self, word: str, count: int = 1) -> None:
+        raise TypeError("Memory-mapped spellcheck index is read-only")
+
+    def candidates(self, word: str) -> set[str]:
+        found: set[str] = set()
+        for key in _deletes(word[:self.prefix_length], self.max_distance):
+            number = self._search(self._key, self._n_keys, key.encode("utf-8"))
+            if number < 0:
+                continue
+            start = self._posting_offsets[number]
+            end = self._posting_offsets[number + 1]
+            for word_id in self._postings[start:end]:
+                found.add(self._word(word_id).decode("utf-8"))
+        return found
+
+    def close(self) -> None:
+        """Освобождает отображение файла."""
+        for view in (
+            self._word_offsets, self._counts, self._key_offsets,
+            self._posting_offsets, self._postings, *self._views.values(),
+        ):
+            view.release()
+        self._mm.close()
+
+
+def main(argv: list[str] | None = None) -> int:
+    """CLI: компиляция индекса из файла частот."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="compile a word-frequency file")
+    build.add_argument("dictionary", help="file with `word [count]` lines")
+    build.add_argument("index", help="output index path")
+    build.add_argument("--max-distance", type=int, default=MAX_EDIT_DISTANCE)
+    build.add_argument("--prefix-length", type=int, default=PREFIX_LENGTH)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    build_index(
+        args.dictionary, args.index, args.max_distance, args.prefix_length
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+import pytest
+
+pytest.importorskip("pika")
+pytest.importorskip("numpy")
+pytest.importorskip("prometheus_client")
+
+import threading
+import time
+
+import pika
+
+from autoscaler import Autoscaler, QueueMetrics, ScalingPolicy, desired_workers
+from rmqconf import RabbitMQConfig
+
+
+POLICY = ScalingPolicy(
+    min_workers=1,
+    max_workers=4,
+    backlog_per_worker=5,
+    scale_down_utilisation=0.5,
+    max_ollama_latency=8.0,
+    cooldown=30.0,
+)
+
+
+def _metrics(ready=0, utilisation=0.0, latency=1.0, paused=0):
+    return QueueMetrics(
+        messages_ready=ready,
+        consumers=1,
+        utilisation=utilisation,
+        ollama_latency=latency,
+        paused=paused,
+    )
+
+
+def test_scales_up_to_backlog_within_max():
+    assert desired_workers(POLICY, _metrics(ready=10, utilisation=1.0), 1) == 3
+    assert desired_workers(POLICY, _metrics(ready=100, utilisation=1.0), 1) == 4
+
+
+def test_holds_when_ollama_is_slow_or_workers_paused():
+    assert desired_workers(POLICY, _metrics(ready=20, latency=9.0), 2) == 2
+    assert desired_workers(POLICY, _metrics(ready=20, paused=1), 2) == 2
+
+
+def test_scales_down_one_worker_when_idle():
+    assert desired_workers(POLICY, _metrics(utilisation=0.25), 4) == 3
+    assert desired_workers(POLICY, _metrics(utilisation=0.0), 1) == 1
+    # Очередь не пуста — сокращать рано
+    assert desired_workers(POLICY, _metrics(ready=1, utilisation=0.0), 3) == 3
+
+
+class FakePool:
+    def __init__(self, size):
+        self.size = size
+        self.resizes = []
+
+    def scale_to(self, size):
+        self.resizes.append(size)
+        self.size = size
+
+    def stats(self):
+        return []
+
+
+def test_step_respects_cooldown(monkeypatch):
+    pool = FakePool(size=1)
+    autoscaler = Autoscaler(pool, RabbitMQConfig(models=["m1"]), POLICY)
+    backlog = _metrics(ready=10, utilisation=1.0)
+    monkeypatch.setattr(autoscaler, "probe", lambda: backlog)
+
+    assert autoscaler.step(now=100.0) == 3
+    backlog.messages_ready = 20
+    assert autoscaler.step(now=110.0) == 3
+    assert autoscaler.step(now=130.0) == 4
+    assert pool.resizes == [3, 4]
+
+
+def test_step_restores_minimum_without_probing(monkeypatch):
+    pool = FakePool(size=0)
+    autoscaler = Autoscaler(pool, RabbitMQConfig(models=["m1"]), POLICY)
+    monkeypatch.setattr(autoscaler, "probe", lambda: pytest.fail("probed"))
+
+    assert autoscaler.step(now=0.0) == 1
+
+
+class FakeConnection:
+    is_open = True
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+        self.is_open = False
+
+    def process_data_events(self, time_limit):
+        pass
+
+
+def test_run_closes_connection_after_probe_error_and_stops_promptly(monkeypatch):
+    policy = ScalingPolicy(interval=60.0)
+    autoscaler = Autoscaler(FakePool(size=1), RabbitMQConfig(models=["m1"]), policy)
+    connection = FakeConnection()
+    autoscaler.connection = connection
+    stop_event = threading.Event()
+
+    def failing_step(now):
+        # Остановка запрошена во время опроса: ожидание не должно длиться interval
+        stop_event.set()
+        raise pika.exceptions.AMQPConnectionError("connection reset")
+
+    monkeypatch.setattr(autoscaler, "step", failing_step)
+
+    started = time.monotonic()
+    autoscaler.run(stop_event)
+
+    assert time.monotonic() - started < 5
+    assert connection.closed
+    assert autoscaler.connection is None
@@ -0,0 +1,31 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from edit_distance import batch_distance
+
+
+def test_batch_distance_matches_restricted_damerau_levenshtein():
+    pairs = [
+        ("", "abc", 3),
+        ("kitten", "sitting", 3),
+        ("ca", "ac", 1),  # перестановка соседних символов
+        ("привет", "превет", 1),
+        ("same", "same", 0),
+    ]
+    sources, targets, expected = zip(*pairs)
+
+    distances = batch_distance(list(sources), list(targets), max_distance=3)
+
+    assert distances.tolist() == list(expected)
+
+
+def test_batch_distance_caps_at_max_distance_plus_one():
+    distances = batch_distance(["abcdef"], ["uvwxyz"], max_distance=2)
+    assert distances.tolist() == [3]
+
+
+def test_batch_distance_validates_input():
+    assert batch_distance([], [], max_distance=2).size == 0
+    with pytest.raises(ValueError):
+        batch_distance(["a"], [], max_distance=2)
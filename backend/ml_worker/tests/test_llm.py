@@ -0,0 +1,78 @@
+import pytest
+
+pytest.importorskip("requests")
+
+import requests
+
+import llm
+from llm import BackendPool, CircuitBreaker, NoBackendAvailable
+
+
+class FakeResponse:
+    def __init__(self, url, status_code=200):
+        self.url = url
+        self.status_code = status_code
+
+    def close(self):
+        pass
+
+
+class FakeSession:
+    """HTTP-сессия: недоступные адреса бросают ConnectionError."""
+
+    def __init__(self, down=()):
+        self.down = set(down)
+        self.calls = []
+
+    def post(self, url, **kwargs):
+        self.calls.append(url)
+        if any(url.startswith(base) for base in self.down):
+            raise requests.ConnectionError(f"{url} refused")
+        return FakeResponse(url)
+
+
+@pytest.fixture()
+def session(monkeypatch):
+    fake = FakeSession()
+    monkeypatch.setattr(llm, "_get_http_session", lambda: fake)
+    return fake
+
+
+def test_stream_fails_over_to_next_backend(session):
+    session.down = {"http://a"}
+    pool = BackendPool(["http://a", "http://b"], failure_threshold=1)
+
+    with pool.stream("/api/generate", {}, timeout=1) as response:
+        assert response.url == "http://b/api/generate"
+
+    a, b = pool.backends
+    assert a.breaker.state == CircuitBreaker.OPEN
+    assert b.breaker.state == CircuitBreaker.CLOSED
+    assert a.outstanding == b.outstanding == 0
+
+    # Исключённый бэкенд больше не выбирается
+    session.calls.clear()
+    with pool.stream("/api/generate", {}, timeout=1):
+        pass
+    assert session.calls == ["http://b/api/generate"]
+
+
+def test_stream_raises_when_all_backends_fail(session):
+    session.down = {"http://a", "http://b"}
+    pool = BackendPool(["http://a", "http://b"], failure_threshold=1)
+
+    with pytest.raises(requests.ConnectionError):
+        with pool.stream("/api/generate", {}, timeout=1):
+            pass
+    with pytest.raises(NoBackendAvailable):
+        with pool.stream("/api/generate", {}, timeout=1):
+            pass
+    assert pool.retry_after() > 0
+
+
+def test_least_outstanding_prefers_idle_backend(session):
+    pool = BackendPool(["http://a", "http://b"], strategy="least_outstanding")
+    pool.backends[0].outstanding = 3
+
+    with pool.stream("/api/generate", {}, timeout=1) as response:
+        assert response.url == "http://b/api/generate"
@@ -0,0 +1,42 @@
+import pytest
+
+pytest.importorskip("pika")
+
+from rmqconf import RabbitMQConfig
+
+
+class RecordingChannel:
+    def __init__(self):
+        self.queues = {}
+        self.bindings = []
+
+    def exchange_declare(self, **kwargs):
+        pass
+
+    def queue_declare(self, queue, durable=False, arguments=None):
+        self.queues[queue] = arguments
+
+    def queue_bind(self, queue, exchange, routing_key=None):
+        self.bindings.append((queue, exchange, routing_key))
+
+
+def test_model_queues_expire_and_dead_letter_to_shared_queue():
+    config = RabbitMQConfig(
+        models=["llama3.2:1b"],
+        model_queue_expires=300000,
+        model_queue_message_ttl=60000,
+    )
+    channel = RecordingChannel()
+
+    config.declare_topology(channel)
+
+    assert channel.queues["ml_task_queue"] is None
+    assert channel.queues["ml_task_queue.llama3.2:1b"] == {
+        "x-expires": 300000,
+        "x-message-ttl": 60000,
+        "x-dead-letter-exchange": "ml_tasks.unrouted",
+    }
+    assert ("ml_task_queue", "ml_tasks.unrouted", None) in channel.bindings
+    assert (
+        "ml_task_queue.llama3.2:1b", "ml_tasks", "model.llama3_2:1b"
+    ) in channel.bindings
@@ -0,0 +1,48 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+import spellcheck
+from spellcheck import SpellChecker, Suggestion
+
+
+def _resolve(*suggestions):
+    return SpellChecker()._resolve(list(suggestions))
+
+
+def test_resolve_accepts_exact_word():
+    assert _resolve(Suggestion("cat", 0, 1)).term == "cat"
+
+
+def test_resolve_sole_candidate_only_within_auto_distance():
+    assert _resolve(Suggestion("cat", 1, 5)).term == "cat"
+    assert _resolve(Suggestion("abcdef", 2, 5)) is None
+
+
+def test_resolve_dominant_candidate_only_within_auto_distance():
+    dominant = Suggestion("cat", 1, 1000)
+    rare = Suggestion("cot", 1, 1)
+    assert _resolve(dominant, rare) is dominant
+
+    # Частотность не оправдывает далёкое исправление без LLM
+    assert _resolve(
+        Suggestion("abcdef", 2, 1000), Suggestion("abxdzq", 2, 1)
+    ) is None
+
+
+def test_resolve_leaves_ambiguous_candidates_to_llm():
+    assert _resolve(Suggestion("cat", 1, 10), Suggestion("cot", 1, 5)) is None
+    assert _resolve() is None
+
+
+def test_check_sends_distant_corrections_to_llm(monkeypatch):
+    monkeypatch.setattr(spellcheck, "AUTO_CORRECT_DISTANCE", 1)
+    checker = SpellChecker(max_distance=2)
+    for word, count in [("abcdef", 1000), ("abydzg", 1), ("hello", 50)]:
+        checker.add_word(word, count)
+
+    result = checker.check("Helo abxdzf")
+
+    assert result.corrections == [("Helo", "Hello")]
+    assert result.unresolved == ["abxdzf"]
+    assert result.needs_llm
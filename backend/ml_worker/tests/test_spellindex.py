@@ -0,0 +1,46 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from spellcheck import SpellChecker
+from spellindex import MappedSpellChecker, build_index
+
+
+WORDS = {"hello": 50, "help": 20, "world": 30, "привет": 10}
+
+
+@pytest.fixture()
+def dictionary(tmp_path):
+    path = tmp_path / "words.txt"
+    path.write_text(
+        "".join(f"{word} {count}\n" for word, count in WORDS.items()),
+        encoding="utf-8",
+    )
+    return path
+
+
+def test_mapped_index_matches_in_memory_checker(dictionary, tmp_path):
+    index_path = tmp_path / "words.idx"
+    assert build_index(str(dictionary), str(index_path)) == len(WORDS)
+
+    in_memory = SpellChecker()
+    in_memory.load_dictionary(str(dictionary))
+    mapped = MappedSpellChecker(str(index_path))
+    try:
+        assert len(mapped) == len(WORDS)
+        assert mapped.count("привет") == 10
+        assert mapped.count("missing") == 0
+        for word in ("helo", "wrld", "превет", "zzz"):
+            assert mapped.lookup(word) == in_memory.lookup(word)
+        with pytest.raises(TypeError):
+            mapped.add_word("new")
+    finally:
+        mapped.close()
+
+
+def test_mapped_index_rejects_foreign_file(tmp_path):
+    path = tmp_path / "not-an-index"
+    path.write_bytes(b"\0" * 128)
+
+    with pytest.raises(ValueError):
+        MappedSpellChecker(str(path))
@@ -0,0 +1,114 @@
+import pytest
+
+pytest.importorskip("pika")
+pytest.importorskip("numpy")
+pytest.importorskip("prometheus_client")
+
+import threading
+
+import main
+from main import WorkerSupervisor
+
+
+class FakeProcess:
+    def __init__(self, alive=True, exitcode=None):
+        self.alive = alive
+        self.exitcode = exitcode
+        self.pid = 1234
+
+    def is_alive(self):
+        return self.alive
+
+    def close(self):
+        pass
+
+
+@pytest.fixture()
+def supervisor(monkeypatch):
+    supervisor = WorkerSupervisor()
+    started, stopped = [], []
+
+    def start(slot):
+        slot.process = FakeProcess()
+        slot.started_at = main.time.monotonic()
+        started.append(slot.worker_id)
+
+    monkeypatch.setattr(supervisor, "_start", start)
+    monkeypatch.setattr(supervisor, "_stop", lambda slot: stopped.append(slot.worker_id))
+    supervisor.started, supervisor.stopped = started, stopped
+    return supervisor
+
+
+def test_scale_to_starts_and_stops_newest_processes(supervisor):
+    supervisor.scale_to(3)
+    assert supervisor.size == 3
+    assert [slot.index for slot in supervisor._slots] == [0, 1, 2]
+
+    supervisor.scale_to(1)
+    assert supervisor.size == 1
+    assert supervisor.stopped == supervisor.started[:0:-1]
+
+
+def test_reap_restarts_crash_looping_process_with_backoff(supervisor, monkeypatch):
+    supervisor.scale_to(1)
+    slot = supervisor._slots[0]
+    slot.process = FakeProcess(alive=False, exitcode=1)
+
+    supervisor.reap()
+    # Упал сразу после старта: перезапуск откладывается
+    assert slot.process is None
+    assert slot.restarts == 1
+    assert len(supervisor.started) == 1
+
+    monkeypatch.setattr(main.time, "monotonic", lambda: slot.restart_at)
+    supervisor.reap()
+    assert len(supervisor.started) == 2
+    assert slot.process.is_alive()
+
+
+def test_closed_supervisor_ignores_scaling(supervisor):
+    supervisor.shutdown()
+    supervisor.scale_to(2)
+    assert supervisor.size == 0
+
+
+def test_scale_down_stops_processes_outside_the_lock(supervisor, monkeypatch):
+    supervisor.scale_to(2)
+    reports = []
+
+    def stop(slot):
+        # Пока процесс дренируется, статистику пула читает другой поток
+        reader = threading.Thread(target=lambda: reports.append(supervisor.stats()))
+        reader.start()
+        reader.join(1)
+        assert not reader.is_alive()
+
+    monkeypatch.setattr(supervisor, "_stop", stop)
+    supervisor.scale_to(1)
+
+    assert len(reports) == 1 and len(reports[0]) == 1
+    assert supervisor.size == 1
+
+
+def test_new_slot_reuses_lowest_free_index_not_held_by_stopping_slot(
+    supervisor, monkeypatch
+):
+    supervisor.scale_to(3)
+    supervisor.scale_to(1)
+    supervisor.scale_to(2)
+    assert sorted(slot.index for slot in supervisor._slots) == [0, 1]
+
+    indexes = []
+
+    def stop(slot):
+        # Пока слот 1 останавливается, пул снова растёт из другого потока
+        grower = threading.Thread(target=supervisor.scale_to, args=(2,))
+        grower.start()
+        grower.join(1)
+        indexes.append(sorted(item.index for item in supervisor._slots))
+
+    monkeypatch.setattr(supervisor, "_stop", stop)
+    supervisor.scale_to(1)
+    # Слот 1 ещё держит порт метрик: новый процесс получает номер 2
+    assert indexes == [[0, 2]]
+    assert supervisor._stopping == set()
@@ -0,0 +1,244 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("pika")
+pytest.importorskip("numpy")
+pytest.importorskip("prometheus_client")
+
+import threading
+import time
+
+from llm import InferenceResult, TaskStatus
+from rmqconf import RabbitMQConfig
+from tracing import current_span
+from worker import DrainTimeout, MLWorker
+
+
+class FakeChannel:
+    is_open = True
+
+    def __init__(self):
+        self.acked = []
+        self.nacked = []
+        self.cancelled = []
+
+    def basic_ack(self, delivery_tag):
+        self.acked.append(delivery_tag)
+
+    def basic_nack(self, delivery_tag, requeue):
+        assert requeue
+        self.nacked.append(delivery_tag)
+
+    def basic_cancel(self, consumer_tag):
+        self.cancelled.append(consumer_tag)
+
+
+class FakeConnection:
+    def sleep(self, seconds):
+        pass
+
+
+@pytest.fixture()
+def worker():
+    worker = MLWorker(RabbitMQConfig(models=["m1"]))
+    worker.channel = FakeChannel()
+    worker.connection = FakeConnection()
+    return worker
+
+
+def _message(task_id="task-1"):
+    body = {"task_id": task_id, "model": "m1", "features": {"text": "hello"}}
+    return json.dumps(body).encode()
+
+
+def _delivery(tag):
+    return SimpleNamespace(delivery_tag=tag)
+
+
+def test_drain_requeues_results_not_delivered_before_deadline(worker, monkeypatch):
+    delivered = {"task-1"}
+    monkeypatch.setattr(
+        worker, "send_result", lambda **outcome: outcome["task_id"] in delivered
+    )
+    worker._consumer_tags = ["consumer-1"]
+    worker._unsent = {
+        1: {"task_id": "task-1", "prediction": "ok"},
+        2: {"task_id": "task-2", "prediction": "ok"},
+    }
+    worker._stop_deadline = time.monotonic()
+
+    worker.drain()
+
+    assert worker.channel.cancelled == ["consumer-1"]
+    assert worker.channel.acked == [1]
+    assert worker.channel.nacked == [2]
+    assert worker._unsent == {}
+
+
+def test_message_delivered_while_draining_is_requeued(worker, monkeypatch):
+    monkeypatch.setattr(worker, "_infer", lambda *args: pytest.fail("processed"))
+    worker.draining = True
+
+    worker.process_message(worker.channel, _delivery(7), None, _message())
+
+    assert worker.channel.nacked == [7]
+
+
+def test_drain_timeout_during_inference_requeues_message(worker, monkeypatch):
+    def slow_inference(*args):
+        raise DrainTimeout()
+
+    monkeypatch.setattr(worker, "_infer", slow_inference)
+    monkeypatch.setattr(worker, "send_result", lambda **_: pytest.fail("sent"))
+
+    worker.process_message(worker.channel, _delivery(3), None, _message())
+
+    assert worker.channel.nacked == [3]
+    assert worker.channel.acked == []
+    assert not worker._in_flight
+
+
+def test_unsent_result_is_buffered_instead_of_acked(worker, monkeypatch):
+    monkeypatch.setattr(
+        worker,
+        "_infer",
+        lambda *args: InferenceResult(TaskStatus.SUCCESS, text="Hello"),
+    )
+    monkeypatch.setattr(worker, "send_result", lambda **_: False)
+
+    worker.process_message(worker.channel, _delivery(4), None, _message())
+
+    assert worker.channel.acked == worker.channel.nacked == []
+    assert worker._unsent[4]["prediction"] == "Hello"
+
+
+def test_drain_alarm_does_not_interrupt_send_and_ack(worker, monkeypatch):
+    monkeypatch.setattr(
+        worker,
+        "_infer",
+        lambda *args: InferenceResult(TaskStatus.SUCCESS, text="Hello"),
+    )
+
+    def send_result(**outcome):
+        # Дедлайн остановки наступает, пока результат отправляется
+        worker._on_drain_deadline(None, None)
+        return True
+
+    monkeypatch.setattr(worker, "send_result", send_result)
+
+    worker.process_message(worker.channel, _delivery(5), None, _message())
+
+    assert worker.channel.acked == [5]
+    assert worker.channel.nacked == []
+
+
+def test_past_drain_deadline_stops_before_next_segment(worker, monkeypatch):
+    calls = []
+
+    def infer(task_id, text, model_name):
+        calls.append(text)
+        worker.draining = True
+        worker._stop_deadline = time.monotonic()
+        return InferenceResult(TaskStatus.SUCCESS, text=text)
+
+    monkeypatch.setattr(worker, "_infer", infer)
+    monkeypatch.setattr(worker, "SEGMENT_CONCURRENCY", 1)
+    body = {
+        "task_id": "task-1",
+        "model": "m1",
+        "features": {"segments": [
+            {"index": 0, "text": "one"}, {"index": 1, "text": "two"},
+        ]},
+    }
+
+    worker.process_message(
+        worker.channel, _delivery(6), None, json.dumps(body).encode()
+    )
+
+    assert calls == ["one"]
+    assert worker.channel.nacked == [6]
+
+
+def test_segments_are_inferred_concurrently_in_task_trace(worker, monkeypatch):
+    started = threading.Barrier(2, timeout=5)
+    parents = []
+
+    def infer(task_id, text, model_name):
+        # Оба вызова должны выполняться одновременно, иначе барьер не пройти
+        started.wait()
+        parents.append(current_span().name)
+        return InferenceResult(
+            TaskStatus.SUCCESS, text=text.upper(), timings={"eval_count": 2}
+        )
+
+    sent = []
+    monkeypatch.setattr(worker, "_infer", infer)
+    monkeypatch.setattr(
+        worker, "send_result", lambda **outcome: sent.append(outcome) or True
+    )
+    body = {
+        "task_id": "task-1",
+        "model": "m1",
+        "features": {"segments": [
+            {"index": 0, "text": "one"}, {"index": 3, "text": "two"},
+        ]},
+    }
+
+    worker.process_message(
+        worker.channel, _delivery(8), None, json.dumps(body).encode()
+    )
+
+    assert parents == ["process_message"] * 2
+    assert sent[0]["segments"] == [
+        {"index": 0, "text": "ONE"}, {"index": 3, "text": "TWO"},
+    ]
+    assert sent[0]["prediction"] == "ONE TWO"
+    assert sent[0]["metrics"] == {"eval_count": 4}
+    assert worker.channel.acked == [8]
+
+
+def test_retry_attempts_are_bounded(worker, monkeypatch):
+    monkeypatch.setattr(worker, "MAX_TRACKED_ATTEMPTS", 2)
+    monkeypatch.setattr(worker, "RETRY_DELAY", 0)
+    monkeypatch.setattr(
+        worker,
+        "_infer",
+        lambda *args: InferenceResult(TaskStatus.RETRYABLE, error="timeout"),
+    )
+
+    for tag, task_id in enumerate(["a", "b", "c"]):
+        worker.process_message(worker.channel, _delivery(tag), None, _message(task_id))
+
+    assert list(worker._attempts) == ["b", "c"]
+    assert worker.channel.nacked == [0, 1, 2]
+
+
+def test_result_is_posted_with_worker_token(worker, monkeypatch):
+    import warmup
+
+    posted = []
+
+    class FakeHttp:
+        def post(self, url, json, headers, timeout):
+            posted.append(headers)
+            return SimpleNamespace(raise_for_status=lambda: None)
+
+    monkeypatch.setattr(warmup, "WORKER_API_TOKEN", "worker-secret")
+    worker.http = FakeHttp()
+
+    assert worker._post_result({"task_id": "task-1"}, "00-trace")
+    assert posted[0]["Authorization"] == "Bearer worker-secret"
+    assert posted[0]["traceparent"] == "00-trace"
+
+
+def test_pause_waits_at_least_min_pause(worker):
+    scheduled = []
+    worker.connection.call_later = lambda delay, callback: scheduled.append(delay)
+    worker._consumer_tags = ["consumer-1"]
+
+    worker.pause_consuming(0.0)
+
+    assert scheduled == [worker.MIN_PAUSE]
+    assert worker.channel.cancelled == ["consumer-1"]
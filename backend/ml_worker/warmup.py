@@ -0,0 +1,98 @@
+"""Прогрев моделей Ollama и поддержание их в памяти."""
+
+from llm import DEFAULT_MODEL_NAME, KEEP_ALIVE, OLLAMA_EVICTION_POLICY, load_model
+import os
+import time
+import logging
+import requests
+import threading
+
+logger = logging.getLogger(__name__)
+
+MODELS_ENDPOINT = 'http://app:8080/api/predict/models'
+# Служебный токен для эндпоинтов API, закрытых от анонимных запросов
+WORKER_API_TOKEN = os.getenv("WORKER_API_TOKEN", "")
+KEEP_ALIVE_INTERVAL = float(os.getenv("OLLAMA_KEEP_ALIVE_INTERVAL", "60"))  # seconds
+# Сколько моделей держать резидентными (модели воркера всегда входят в их число)
+MAX_RESIDENT_MODELS = int(os.getenv("OLLAMA_MAX_RESIDENT_MODELS", "2"))
+
+
+def api_headers() -> dict:
+    """Заголовки запросов воркера к API (служебный токен, если задан)."""
+    if not WORKER_API_TOKEN:
+        return {}
+    return {"Authorization": f"Bearer {WORKER_API_TOKEN}"}
+
+
+class ModelKeeper:
+    """
+    Держит набор моделей загруженными в Ollama.
+
+    При старте синхронно загружает модели, очереди которых слушает воркер
+    (WORKER_MODELS, по умолчанию OLLAMA_MODEL), и модели из таблицы MLModel
+    (через API) в пределах лимита, затем периодически продлевает их keep_alive,
+    чтобы первый пользовательский запрос не платил за загрузку модели.
+    Остальные модели загружаются Ollama по требованию и вытесняются
+    согласно OLLAMA_EVICTION_POLICY.
+    """
+
+    def __init__(
+        self,
+        worker_models: list[str] | None = None,
+        models_endpoint: str = MODELS_ENDPOINT,
+        interval: float = KEEP_ALIVE_INTERVAL,
+        max_resident: int = MAX_RESIDENT_MODELS,
+    ):
+        self.models_endpoint = models_endpoint
+        self.interval = interval
+        self.max_resident = max_resident
+        # Модели, очереди которых слушает воркер, резидентны всегда
+        self.worker_models = worker_models or [DEFAULT_MODEL_NAME]
+        self.models: list[str] = list(self.worker_models)
+
+    def _registered_models(self) -> list[str]:
+        """Возвращает имена моделей из таблицы MLModel или [] если API недоступен."""
+        try:
+            response = requests.get(
+                self.models_endpoint, headers=api_headers(), timeout=5
+            )
+            response.raise_for_status()
+            return [model["name"] for model in response.json()]
+        except (requests.RequestException, ValueError, KeyError) as e:
+            logger.warning(f"Could not fetch registered models: {e}")
+            return []
+
+    def refresh(self) -> list[str]:
+        """Обновляет список резидентных моделей."""
+        names = self.worker_models + self._registered_models()
+        # Убираем дубликаты с сохранением порядка
+        unique = list(dict.fromkeys(name.strip() for name in names if name))
+        self.models = unique[:max(self.max_resident, len(self.worker_models))]
+        return self.models
+
+    def warm_up(self) -> None:
+        """Синхронно загружает все резидентные модели."""
+        logger.info(
+            f"Warming up models {self.refresh()} "
+            f"(policy={OLLAMA_EVICTION_POLICY}, keep_alive={KEEP_ALIVE})"
+        )
+        for name in self.models:
+            started = time.monotonic()
+            if load_model(name):
+                logger.info(
+                    f"Model '{name}' loaded in {time.monotonic() - started:.1f}s"
+                )
+
+    def run(self, stop_event: threading.Event) -> None:
+        """Периодически продлевает keep_alive моделей до установки stop_event."""
+        while not stop_event.wait(self.interval):
+            for name in self.refresh():
+                load_model(name)
+
+    def start(self, stop_event: threading.Event) -> threading.Thread:
+        """Запускает периодическое продление keep_alive в фоновом потоке."""
+        thread = threading.Thread(
+            target=self.run, args=(stop_event,), name="model-keeper", daemon=True
+        )
+        thread.start()
+        return thread
@@ -1,7 +1,21 @@
 """ML-воркер: получает задачи из RabbitMQ, выполняет их и отправляет результаты в API."""
 
 from rmqconf import RabbitMQConfig
-from llm import do_task
+from llm import (
+    do_task, backend_pool, NoBackendAvailable, TaskStatus, InferenceResult,
+    DEFAULT_MODEL_NAME,
+)
+from spellcheck import get_spellchecker
+from prompts import PromptRegistry
+from tracing import TRACEPARENT_HEADER, current_span, start_span
+from warmup import api_headers
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import metrics
+import multiprocessing
+import signal
+import os
 import pika
 import time
 import requests
@@ -20,6 +34,108 @@ logging.getLogger('pika').setLevel(logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+class WorkerStats:
+    """
+    Счётчики воркера в разделяемой памяти.
+
+    Создаются родительским процессом и передаются дочернему воркеру,
+    чтобы автоскейлер видел загрузку и задержку инференса без опроса детей.
+    """
+    EWMA_ALPHA = 0.2
+
+    def __init__(self):
+        self._processed = multiprocessing.Value('L', 0)
+        self._failed = multiprocessing.Value('L', 0)
+        self._local = multiprocessing.Value('L', 0)
+        # Число выполняющихся вызовов модели (предложения задачи идут параллельно)
+        self._busy = multiprocessing.Value('i', 0)
+        self._paused = multiprocessing.Value('b', 0)
+        self._latency = multiprocessing.Value('d', 0.0)
+
+    def begin(self) -> None:
+        """Отмечает начало обработки сообщения."""
+        with self._busy.get_lock():
+            self._busy.value += 1
+
+    def finish(self, duration: float, ok: bool) -> None:
+        """
+        Отмечает завершение обработки сообщения.
+
+        Args:
+            duration: Длительность вызова модели в секундах
+            ok: Признак успешной обработки (задержка учитывается только для успешных)
+        """
+        if ok:
+            with self._latency.get_lock():
+                if self._latency.value == 0.0:
+                    self._latency.value = duration
+                else:
+                    self._latency.value += self.EWMA_ALPHA * (
+                        duration - self._latency.value
+                    )
+        counter = self._processed if ok else self._failed
+        with counter.get_lock():
+            counter.value += 1
+        self._end_call()
+
+    def finish_local(self) -> None:
+        """Отмечает задачу, решённую словарём без обращения к модели.
+
+        Задержка инференса не обновляется: она отражает нагрузку на Ollama.
+        """
+        for counter in (self._processed, self._local):
+            with counter.get_lock():
+                counter.value += 1
+        self._end_call()
+
+    def _end_call(self) -> None:
+        with self._busy.get_lock():
+            self._busy.value = max(self._busy.value - 1, 0)
+
+    def set_idle(self) -> None:
+        """Сбрасывает флаги занятости и паузы (например, после перезапуска процесса)."""
+        self._busy.value = 0
+        self._paused.value = 0
+
+    @property
+    def busy(self) -> bool:
+        return bool(self._busy.value)
+
+    @property
+    def paused(self) -> bool:
+        """Приостановлено ли потребление из-за недоступности Ollama."""
+        return bool(self._paused.value)
+
+    @paused.setter
+    def paused(self, value: bool) -> None:
+        self._paused.value = int(value)
+
+    @property
+    def latency(self) -> float:
+        """Сглаженная (EWMA) задержка инференса в секундах."""
+        return self._latency.value
+
+    def snapshot(self) -> dict:
+        """Возвращает текущие значения счётчиков."""
+        return {
+            "processed": self._processed.value,
+            "failed": self._failed.value,
+            "local": self._local.value,
+            "busy": self.busy,
+            "paused": self.paused,
+            "latency": round(self.latency, 3),
+        }
+
+
+class DrainTimeout(BaseException):
+    """
+    Истёк дедлайн остановки во время обработки сообщения.
+
+    Наследуется от BaseException, чтобы не перехватываться общими
+    обработчиками `except Exception` в клиенте модели.
+    """
+
+
 # Определяем основной класс для обработки ML задач
 class MLWorker:
     """
@@ -29,15 +145,28 @@ class MLWorker:
     # Константы класса
     MAX_RETRIES = 3
     RETRY_DELAY = 0.5
+    DRAIN_TIMEOUT = float(os.getenv("WORKER_DRAIN_TIMEOUT", "10"))  # seconds
     RESULT_ENDPOINT = 'http://app:8080/api/predict/send_task_result'
+    RESULT_TIMEOUT = float(os.getenv("WORKER_RESULT_TIMEOUT", "5"))  # seconds
+    # Сколько задач с временными ошибками помнить (самые старые забываются)
+    MAX_TRACKED_ATTEMPTS = 1024
+    MIN_PAUSE = 1.0  # seconds, минимальная пауза потребления при недоступной Ollama
+    # Сколько изменённых предложений одной задачи отправлять в Ollama одновременно
+    SEGMENT_CONCURRENCY = int(os.getenv("WORKER_SEGMENT_CONCURRENCY", "4"))
 
-    def __init__(self, config: RabbitMQConfig, worker_id: str = "worker-1"):
+    def __init__(
+        self,
+        config: RabbitMQConfig,
+        worker_id: str = "worker-1",
+        stats: WorkerStats | None = None,
+    ):
         """
         Инициализация обработчика с заданной конфигурацией.
 
         Args:
             config: Объект конфигурации RabbitMQ
             worker_id: Идентификатор воркера
+            stats: Разделяемые счётчики (заполняются в режиме пула процессов)
         """
         # Сохраняем конфигурацию
         self.config = config
@@ -46,20 +175,76 @@ class MLWorker:
         # Инициализируем канал как None
         self.channel = None
         self.retry_count = 0
+        # Число неудачных попыток по task_id (для временных ошибок)
+        self._attempts: OrderedDict[str, int] = OrderedDict()
         self.worker_id = worker_id
+        self.stats = stats
+        # Словарь для быстрого пути без LLM (None, если не настроен)
+        self.spellchecker = get_spellchecker()
+        # Шаблоны промптов и параметры генерации моделей (кэш из API)
+        self.prompts = PromptRegistry()
+        # Пул HTTP-соединений к API для отправки результатов
+        self.http = requests.Session()
+        self.draining = False
+        self._stop_deadline = 0.0
+        self._in_flight = False
+        # Прервать по дедлайну можно только вызов модели: после отправки
+        # результата сообщение должно быть подтверждено, а не возвращено
+        self._interruptible = False
+        self._consumer_tags: list[str] = []
+        self._paused = False
+        # Посчитанные, но не доставленные в API результаты: delivery_tag -> payload
+        self._unsent: dict[int, dict] = {}
+
+    def install_signal_handlers(self) -> None:
+        """Переводит воркер в режим остановки по SIGTERM."""
+        signal.signal(signal.SIGTERM, self.request_stop)
+
+    def request_stop(self, signum=None, frame=None) -> None:
+        """
+        Обработчик сигнала остановки.
+
+        Только выставляет флаги: цикл потребления увидит их между
+        сообщениями. Если задача уже выполняется, взводится таймер,
+        по которому вызов модели будет прерван, а задача возвращена
+        в очередь. Отправку результата и подтверждение таймер не
+        прерывает.
+        """
+        if self.draining:
+            return
+        self.draining = True
+        self._stop_deadline = time.monotonic() + self.DRAIN_TIMEOUT
+        logger.info(
+            f"Stop requested, draining within {self.DRAIN_TIMEOUT:.0f}s"
+        )
+        if self._in_flight:
+            signal.signal(signal.SIGALRM, self._on_drain_deadline)
+            signal.setitimer(signal.ITIMER_REAL, self.DRAIN_TIMEOUT)
+
+    def _on_drain_deadline(self, signum, frame) -> None:
+        if self._interruptible:
+            raise DrainTimeout()
+
+    def _check_drain_deadline(self) -> None:
+        """Прерывает задачу, если дедлайн остановки уже прошёл."""
+        if self.draining and time.monotonic() >= self._stop_deadline:
+            raise DrainTimeout()
 
     def connect(self) -> None:
         """
         Устанавливает соединение с RabbitMQ с повторными попытками (бесконечный цикл).
-        При успехе создаёт канал и объявляет очередь с durable=True.
+        При успехе создаёт канал и объявляет обменники и очереди моделей.
         """
-        while True:
+        while not self.draining:
             try:
                 connection_params = self.config.get_connection_params()
                 self.connection = pika.BlockingConnection(connection_params)
                 self.channel = self.connection.channel()
-                # Очередь должна быть durable, чтобы не терять сообщения при перезапуске RabbitMQ
-                self.channel.queue_declare(queue=self.config.queue_name, durable=True)
+                self.channel.basic_qos(prefetch_count=self.config.prefetch_count)
+                # Теги доставки старого канала недействительны, брокер уже
+                # вернул эти сообщения в очередь
+                self._unsent.clear()
+                self.config.declare_topology(self.channel)
                 logger.info("Successfully connected to RabbitMQ")
                 break  # Выход из цикла при успехе
             except pika.exceptions.AMQPConnectionError as e:
@@ -81,7 +266,14 @@ class MLWorker:
             logger.error(f"Ошибка при закрытии соединений: {e}")
 
     def send_result(
-        self, task_id: str, prediction: str, status: str = "success"
+        self,
+        task_id: str,
+        prediction: str,
+        status: str = "success",
+        error: str | None = None,
+        segments: list[dict] | None = None,
+        metrics: dict | None = None,
+        traceparent: str | None = None,
     ) -> bool:
         """
         Отправка результатов обработки задачи на сервер.
@@ -90,37 +282,252 @@ class MLWorker:
             task_id: ID задачи
             prediction: Результат предсказания
             status: Статус выполнения ("success" или "error")
+            error: Описание ошибки для статуса "error"
+            segments: Результаты по предложениям [{"index", "text"}],
+                если задача пришла разбитой на предложения
+            metrics: Счётчики и длительности Ollama (llm.TIMING_FIELDS),
+                суммированные по вызовам модели
+            traceparent: Контекст спана обработки сообщения; сохраняется
+                вместе с буферизованным результатом, чтобы досылка
+                осталась в трассе задачи
+
+        Returns:
+            bool: Признак успешности отправки результата
+        """
+        payload = {
+            "task_id": task_id,
+            "prediction": prediction,
+            "worker_id": self.worker_id,
+            "status": status,
+            "error": error,
+            "segments": segments,
+            "metrics": metrics
+        }
+        with start_span(
+            "send_result", parent=traceparent, task_id=task_id, status=status
+        ) as span:
+            sent = self._post_result(payload, span.traceparent)
+            if not sent:
+                span.status = "error"
+            return sent
+
+    def _post_result(self, payload: dict, traceparent: str) -> bool:
+        """
+        Отправляет результат в API и учитывает длительность отправки.
+
+        Вынесено из send_result: его параметр metrics (счётчики Ollama)
+        перекрывает модуль метрик воркера.
+
+        Args:
+            payload: Тело запроса (см. send_result)
+            traceparent: Контекст спана отправки для HTTP-заголовка
 
         Returns:
             bool: Признак успешности отправки результата
         """
+        started = time.monotonic()
         try:
-            payload = {
-                "task_id": task_id,
-                "prediction": prediction,
-                "worker_id": self.worker_id,
-                "status": status
-            }
-            response = requests.post(
+            response = self.http.post(
                 self.RESULT_ENDPOINT,
-                json=payload
+                json=payload,
+                headers={TRACEPARENT_HEADER: traceparent, **api_headers()},
+                timeout=self.RESULT_TIMEOUT,
             )
             response.raise_for_status()
+            metrics.SEND_RESULT_DURATION.labels("ok").observe(
+                time.monotonic() - started
+            )
             return True
         except Exception as e:
             logger.error(f"Failed to send result: {e}")
+            metrics.SEND_RESULT_DURATION.labels("error").observe(
+                time.monotonic() - started
+            )
             return False
 
+    def _ack(self, channel, delivery_tag: int) -> None:
+        """Подтверждает сообщение и учитывает его в метриках."""
+        channel.basic_ack(delivery_tag=delivery_tag)
+        metrics.MESSAGES.labels("acked").inc()
+
+    def _nack(self, channel, delivery_tag: int) -> None:
+        """Возвращает сообщение в очередь и учитывает его в метриках."""
+        channel.basic_nack(delivery_tag=delivery_tag, requeue=True)
+        metrics.MESSAGES.labels("nacked").inc()
+
+    def _update_prefetch_gauge(self) -> None:
+        """Доля окна prefetch, занятая обрабатываемым и недоставленными."""
+        unacked = int(self._in_flight) + len(self._unsent)
+        metrics.PREFETCH_UTILISATION.set(
+            unacked / max(self.config.prefetch_count, 1)
+        )
+
+    def _flush_results(self) -> None:
+        """Повторно отправляет буферизованные результаты и подтверждает доставленные."""
+        for delivery_tag, outcome in list(self._unsent.items()):
+            task_id = outcome["task_id"]
+            if self.send_result(**outcome):
+                self._ack(self.channel, delivery_tag)
+                del self._unsent[delivery_tag]
+                logger.info(f"Buffered result for task {task_id} delivered")
+        self._update_prefetch_gauge()
+
+    def _infer(
+        self, task_id: str, text: str, model_name: str | None
+    ) -> InferenceResult:
+        """
+        Обрабатывает текст: словарём, если он справляется, иначе моделью.
+
+        Args:
+            task_id: ID задачи (для логов)
+            text: Текст для обработки
+            model_name: Имя модели в Ollama
+
+        Returns:
+            InferenceResult: Результат обработки
+
+        Raises:
+            NoBackendAvailable: Если все бэкенды Ollama недоступны
+        """
+        model = model_name or DEFAULT_MODEL_NAME
+        if self.stats:
+            self.stats.begin()
+        started = time.monotonic()
+        checked = None
+        if self.spellchecker:
+            with start_span("spellcheck", chars=len(text)) as span:
+                checked = self.spellchecker.check(text)
+                span.set_attributes(
+                    corrections=len(checked.corrections),
+                    needs_llm=checked.needs_llm,
+                )
+        if checked is not None and not checked.needs_llm:
+            if self.stats:
+                self.stats.finish_local()
+            metrics.INFERENCE_DURATION.labels(model, "dictionary").observe(
+                time.monotonic() - started
+            )
+            logger.info(
+                f"Task {task_id} answered from dictionary "
+                f"({len(checked.corrections)} corrections)"
+            )
+            return InferenceResult(TaskStatus.SUCCESS, text=checked.text)
+
+        spec = self.prompts.get(model)
+        started = time.monotonic()
+        ok = False
+        try:
+            with start_span("do_task", model=model, chars=len(text)) as span:
+                result = do_task(
+                    spec.render(text), model_name, spec.options_for(text)
+                )
+                ok = result.ok
+                span.set_attributes(
+                    result=result.status.value,
+                    first_token_latency=result.first_token_latency,
+                    **result.timings,
+                )
+                if not ok:
+                    span.status = "error"
+                    span.set_attributes(error=result.error)
+        finally:
+            duration = time.monotonic() - started
+            if self.stats:
+                self.stats.finish(duration, ok)
+        if ok:
+            metrics.INFERENCE_DURATION.labels(model, "ollama").observe(duration)
+            if result.first_token_latency is not None:
+                metrics.TIME_TO_FIRST_TOKEN.labels(model).observe(
+                    result.first_token_latency
+                )
+        return result
+
+    def _infer_segments(
+        self, task_id: str, segments: list[dict], model_name: str | None
+    ) -> tuple[InferenceResult, list[dict]]:
+        """
+        Обрабатывает изменённые предложения задачи.
+
+        Предложения независимы, поэтому отправляются в Ollama одновременно
+        (не более SEGMENT_CONCURRENCY запросов): задача ждёт самое долгое
+        предложение, а не сумму всех. Каждый вызов выполняется в копии
+        контекста, чтобы его спаны попали в трассу сообщения.
+
+        Args:
+            task_id: Идентификатор задачи (для логов)
+            segments: Предложения [{"index", "text"}]
+            model_name: Имя модели в Ollama
+
+        Returns:
+            tuple[InferenceResult, list[dict]]: Общий результат (тексты
+                предложений через пробел и суммарные счётчики Ollama) либо
+                первая по порядку ошибка; результаты предложений до неё
+        """
+        def infer(segment: dict) -> InferenceResult:
+            # Предложения, ещё ждущие в очереди пула, не начинаются после
+            # дедлайна остановки
+            self._check_drain_deadline()
+            return self._infer(task_id, segment['text'], model_name)
+
+        self._check_drain_deadline()
+        executor = ThreadPoolExecutor(
+            max_workers=max(1, min(self.SEGMENT_CONCURRENCY, len(segments)))
+        )
+        produced: list[dict] = []
+        timings: dict[str, int] = {}
+        try:
+            futures = [
+                executor.submit(contextvars.copy_context().run, infer, segment)
+                for segment in segments
+            ]
+            for segment, future in zip(segments, futures):
+                result = future.result()
+                if not result.ok:
+                    return result, produced
+                produced.append({'index': segment['index'], 'text': result.text})
+                for name, value in result.timings.items():
+                    timings[name] = timings.get(name, 0) + value
+        finally:
+            # При ошибке или дедлайне остановки не ждём остальные предложения
+            executor.shutdown(wait=False, cancel_futures=True)
+        return InferenceResult(
+            TaskStatus.SUCCESS,
+            text=" ".join(item['text'] for item in produced),
+            timings=timings,
+        ), produced
+
     def process_message(self, ch, method, properties, body):
         """
         Обработка полученного сообщения из очереди.
 
+        Обработка выполняется в спане, продолжающем трассу задачи
+        из заголовка traceparent сообщения.
+
         Args:
             ch: Объект канала RabbitMQ
             method: Метод доставки сообщения
             properties: Свойства сообщения
             body: Тело сообщения
         """
+        headers = getattr(properties, 'headers', None) or {}
+        with start_span(
+            "process_message",
+            parent=headers.get(TRACEPARENT_HEADER),
+            worker_id=self.worker_id,
+        ):
+            self._handle_message(ch, method, body)
+
+    def _handle_message(self, ch, method, body):
+        """Обрабатывает сообщение очереди (см. process_message)."""
+        metrics.MESSAGES.labels("consumed").inc()
+        if self.draining:
+            # Сообщение доставлено уже после запроса остановки — отдаём обратно
+            self._nack(ch, method.delivery_tag)
+            return
+
+        self._in_flight = True
+        metrics.TASKS_IN_FLIGHT.inc()
+        self._update_prefetch_gauge()
         try:
             # Логируем информацию о полученном сообщении
             logger.info(f"Processing message: {body}")
@@ -133,16 +540,87 @@ class MLWorker:
             text = features.get('text', '')
             model_name = data.get('model')
 
-            result = do_task(text, model_name)
+            task_id = data['task_id']
+            span = current_span()
+            span.set_attributes(task_id=task_id, model=model_name)
+            segments = features.get('segments')
+            produced = None
+            self._interruptible = True
+            try:
+                if segments is None:
+                    self._check_drain_deadline()
+                    result = self._infer(task_id, text, model_name)
+                else:
+                    # API прислал только изменённые предложения: каждое
+                    # обрабатывается отдельно и возвращается со своим индексом
+                    result, produced = self._infer_segments(
+                        task_id, segments, model_name
+                    )
+            finally:
+                self._interruptible = False
 
             logger.info(f"Result: {result}")
+            span.set_attributes(result=result.status.value)
+
+            if result.status == TaskStatus.RETRYABLE:
+                attempts = self._attempts.pop(task_id, 0) + 1
+                if attempts < self.MAX_RETRIES:
+                    self._attempts[task_id] = attempts
+                    while len(self._attempts) > self.MAX_TRACKED_ATTEMPTS:
+                        self._attempts.popitem(last=False)
+                    logger.warning(
+                        f"Task {task_id} failed ({result.error}), "
+                        f"attempt {attempts}/{self.MAX_RETRIES}, requeueing"
+                    )
+                    time.sleep(self.RETRY_DELAY)
+                    self._nack(ch, method.delivery_tag)
+                    return
+                logger.error(f"Max retries reached for task {task_id}")
+            self._attempts.pop(task_id, None)
+
+            if result.ok:
+                outcome = {
+                    "task_id": task_id,
+                    "prediction": result.text,
+                    "status": "success",
+                    "segments": produced,
+                    # Пусто, если задачу целиком решил словарь
+                    "metrics": result.timings or None,
+                }
+            else:
+                # Ошибка уходит в API отдельным статусом, а не текстом
+                # предсказания: пользователь видит сбой, а не «ответ модели»
+                outcome = {
+                    "task_id": task_id,
+                    "prediction": "",
+                    "status": "error",
+                    "error": result.error,
+                }
+            outcome["traceparent"] = span.traceparent
 
-            if self.send_result(data['task_id'], result, "success"):
-                ch.basic_ack(delivery_tag=method.delivery_tag)
+            if self.send_result(**outcome):
+                self._ack(ch, method.delivery_tag)
                 self.retry_count = 0
-                logger.info("Task completed successfully")
+                logger.info(
+                    f"Task {task_id} finished with status {outcome['status']}"
+                )
             else:
-                raise Exception("Failed to send result")
+                # Инференс уже выполнен: не пересчитываем задачу, а досылаем
+                # результат позже (сообщение остаётся неподтверждённым)
+                self._unsent[method.delivery_tag] = outcome
+                logger.warning(
+                    f"Result for task {task_id} buffered for resend"
+                )
+
+        except DrainTimeout:
+            logger.warning("Drain deadline reached, handing task back to the queue")
+            self._nack(ch, method.delivery_tag)
+
+        except NoBackendAvailable:
+            # Сообщение не виновато: возвращаем его без учёта попыток
+            # и перестаём забирать задачи, пока circuit breaker открыт
+            self._nack(ch, method.delivery_tag)
+            self.pause_consuming(backend_pool.retry_after())
 
         except Exception as e:
             logger.error(f"Error processing message: {e}")
@@ -154,33 +632,125 @@ class MLWorker:
                     delivery_tag=method.delivery_tag,
                     requeue=False
                 )
+                metrics.MESSAGES.labels("rejected").inc()
                 self.retry_count = 0
             else:
                 time.sleep(self.RETRY_DELAY)
-                ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+                self._nack(ch, method.delivery_tag)
+        finally:
+            self._in_flight = False
+            metrics.TASKS_IN_FLIGHT.dec()
+            self._update_prefetch_gauge()
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+    def _start_consumers(self) -> None:
+        """Подписывается на все очереди воркера."""
+        self._consumer_tags = [
+            self.channel.basic_consume(
+                queue=queue,
+                on_message_callback=self.process_message,
+                auto_ack=False
+            )
+            for queue in self.config.consumed_queues()
+        ]
+
+    def pause_consuming(self, delay: float) -> None:
+        """
+        Приостанавливает потребление на время, пока Ollama недоступна.
+
+        Подписки отменяются (неразобранные сообщения pika возвращает
+        брокеру), и задачи ждут в очереди, а не сгорают на мёртвом
+        бэкенде. Через delay секунд подписка восстанавливается, и первое
+        сообщение становится пробным запросом half-open.
+
+        Args:
+            delay: Время до повторной проверки бэкендов в секундах; не
+                меньше MIN_PAUSE, иначе при нулевом retry_after воркер
+                крутился бы в цикле пауза/возобновление
+        """
+        if self._paused or self.draining:
+            return
+        delay = max(delay, self.MIN_PAUSE)
+        for consumer_tag in self._consumer_tags:
+            self.channel.basic_cancel(consumer_tag)
+        self._consumer_tags = []
+        self._paused = True
+        if self.stats:
+            self.stats.paused = True
+        logger.warning(
+            f"All Ollama backends unavailable, pausing consumption for {delay:.1f}s"
+        )
+        self.connection.call_later(delay, self._resume_consuming)
+
+    def _resume_consuming(self) -> None:
+        if not self._paused:
+            return
+        self._paused = False
+        if self.stats:
+            self.stats.paused = False
+        if self.draining or not self.channel or not self.channel.is_open:
+            return
+        logger.info("Resuming consumption")
+        self._start_consumers()
+
+    def drain(self) -> None:
+        """
+        Корректно завершает потребление.
+
+        Отменяет подписку (неразобранные сообщения буфера pika возвращаются
+        брокеру), досылает буферизованные результаты до дедлайна, а то, что
+        доставить не удалось, возвращает в очередь.
+        """
+        try:
+            for consumer_tag in self._consumer_tags:
+                self.channel.basic_cancel(consumer_tag)
+            self._consumer_tags = []
+            self._flush_results()
+            while self._unsent and time.monotonic() < self._stop_deadline:
+                self.connection.sleep(self.RETRY_DELAY)
+                self._flush_results()
+            for delivery_tag in list(self._unsent):
+                self._nack(self.channel, delivery_tag)
+            if self._unsent:
+                logger.warning(
+                    f"{len(self._unsent)} undelivered results handed back to the queue"
+                )
+            self._unsent.clear()
+            logger.info("Drain completed")
+        except pika.exceptions.AMQPError as e:
+            # Канал уже закрыт: брокер сам вернёт неподтверждённые сообщения
+            logger.error(f"Error while draining: {e}")
 
     def start_consuming(self) -> None:
         """
         Запуск процесса получения сообщений из очереди.
 
         Note:
-            Блокирующая операция, прерывается по Ctrl+C
+            Блокирующая операция, завершается по SIGTERM (после дренажа)
+            или Ctrl+C
         """
         try:
             # Настраиваем потребление сообщений из очереди
-            self.channel.basic_consume(
-                queue=self.config.queue_name,
-                on_message_callback=self.process_message,
-                auto_ack=False
-            )
+            self._paused = False
+            self._start_consumers()
             # Логируем информацию о старте потребления сообщений
-            logger.info('Started consuming messages. Press Ctrl+C to exit.')
-            # Запускаем потребление сообщений
-            self.channel.start_consuming()
+            logger.info(
+                f'Started consuming from {self.config.consumed_queues()}. '
+                'Press Ctrl+C to exit.'
+            )
+            # Обрабатываем события короткими порциями, чтобы между ними
+            # проверять флаг остановки и досылать буферизованные результаты
+            while not self.draining:
+                self.connection.process_data_events(time_limit=1)
+                if self._unsent:
+                    self._flush_results()
         except KeyboardInterrupt:
             # Логируем информацию о завершении работы
             logger.info("Shutting down...")
+            self.request_stop()
         finally:
+            if self.draining and self.channel and self.channel.is_open:
+                self.drain()
             # Закрываем соединение при завершении работы
             self.cleanup()
 
@@ -3,12 +3,29 @@
 import streamlit as st
 import requests
 import os
-import time
 import pandas as pd
 
 API_BASE_URL = os.getenv("API_BASE_URL", "http://app:8080")
 
+# Заголовок со временем последней записи: API возвращает его на изменяющие
+# запросы, а клиент передаёт обратно, чтобы сразу видеть свои изменения
+LAST_WRITE_HEADER = "X-Last-Write"
+# Сколько секунд API ждёт итога задачи в одном запросе результата
+RESULT_WAIT = 5
+
 # ---------- Функции для работы с API ----------
+def auth_headers(token):
+    """Заголовки запроса с токеном и временем последней записи пользователя."""
+    headers = {"Authorization": f"Bearer {token}"}
+    if st.session_state.get("last_write"):
+        headers[LAST_WRITE_HEADER] = st.session_state.last_write
+    return headers
+
+def remember_write(response):
+    """Запоминает время записи из ответа API на изменяющий запрос."""
+    if response.headers.get(LAST_WRITE_HEADER):
+        st.session_state.last_write = response.headers[LAST_WRITE_HEADER]
+
 def register_user(username, email, full_name, password):
     """Регистрирует пользователя через API и возвращает пару `(data, error)`."""
     url = f"{API_BASE_URL}/api/auth/register"
@@ -62,7 +79,7 @@ def get_current_user(token):
 def get_balance(token):
     """Получает текущий баланс пользователя."""
     url = f"{API_BASE_URL}/api/balance/me"
-    headers = {"Authorization": f"Bearer {token}"}
+    headers = auth_headers(token)
     try:
         response = requests.get(url, headers=headers, timeout=10)
         if response.status_code == 200:
@@ -75,10 +92,11 @@ def get_balance(token):
 def replenish_balance(token, amount):
     """Пополняет баланс пользователя на указанную сумму."""
     url = f"{API_BASE_URL}/api/balance/replenish"
-    headers = {"Authorization": f"Bearer {token}"}
+    headers = auth_headers(token)
     payload = {"amount": amount}
     try:
         response = requests.post(url, json=payload, headers=headers, timeout=10)
+        remember_write(response)
         if response.status_code == 200:
             return response.json(), None
         else:
@@ -89,7 +107,7 @@ def replenish_balance(token, amount):
 def get_history(token):
     """Запрашивает историю ML-операций пользователя."""
     url = f"{API_BASE_URL}/api/history/me"
-    headers = {"Authorization": f"Bearer {token}"}
+    headers = auth_headers(token)
     try:
         response = requests.get(url, headers=headers, timeout=10)
         if response.status_code == 200:
@@ -102,13 +120,14 @@ def get_history(token):
 def send_predict_request(token, text, model_id=1):
     """Отправляет запрос на ML-предсказание и возвращает ответ API."""
     url = f"{API_BASE_URL}/api/predict/predict"
-    headers = {"Authorization": f"Bearer {token}"}
+    headers = auth_headers(token)
     payload = {
         "text": text,
         "model_id": model_id
     }
     try:
         response = requests.post(url, json=payload, headers=headers, timeout=10)
+        remember_write(response)
         if response.status_code == 200:
             return response.json(), None
         else:
@@ -116,12 +135,18 @@ def send_predict_request(token, text, model_id=1):
     except Exception as e:
         return None, f"Ошибка соединения: {e}"
 
-def get_prediction_result(token, task_id):
-    """Проверяет статус и результат ML-задачи по `task_id`."""
+def get_prediction_result(token, task_id, wait=0):
+    """Проверяет статус и результат ML-задачи по `task_id`.
+
+    С `wait` API отвечает сразу после завершения задачи, но не позже
+    чем через `wait` секунд.
+    """
     url = f"{API_BASE_URL}/api/predict/result/{task_id}"
-    headers = {"Authorization": f"Bearer {token}"}
+    headers = auth_headers(token)
     try:
-        response = requests.get(url, headers=headers, timeout=10)
+        response = requests.get(
+            url, headers=headers, params={"wait": wait}, timeout=wait + 10
+        )
         if response.status_code == 200:
             return response.json(), None
         else:
@@ -254,16 +279,15 @@ def show_main_page():
         if submitted and user_input:
             with st.spinner("Отправка запроса..."):
                 result, error = send_predict_request(token, user_input)
-                if result:
-                    # Ожидаем, что в ответе есть поле "task_id" (из MLPredictionResponse)
-                    # В текущей реализации бэкенд возвращает result с сообщением, но не task_id.
-                    # Проверим структуру: в ml.py return MLPredictionResponse(result=f"Task {task_id} queued...", model_name=...)
-                    # Значит, task_id нужно извлечь из строки. Это неудобно. Лучше исправить бэкенд, но пока сделаем костыль.
-                    # Предположим, что result["result"] содержит "Task <uuid> queued..."
-                    import re
-                    match = re.search(r'Task ([a-f0-9-]+) queued', result.get("result", ""))
-                    if match:
-                        st.session_state.current_task_id = match.group(1)
+                if result and result.get("status") == "completed":
+                    # Весь текст взят из кэша исправлений: ответ уже готов
+                    st.session_state.current_result = result
+                    st.session_state.waiting_for_result = False
+                    st.rerun()
+                elif result:
+                    task_id = result.get("task_id")
+                    if task_id:
+                        st.session_state.current_task_id = task_id
                         st.session_state.waiting_for_result = True
                         st.session_state.current_result = None
                         st.rerun()
@@ -278,19 +302,18 @@ def show_main_page():
         # Создаём placeholder для динамического обновления
         status_placeholder = st.empty()
         
-        max_attempts = 10
+        # Каждая попытка ждёт итога на стороне API до RESULT_WAIT секунд
+        max_attempts = 2
         for attempt in range(max_attempts):
             with status_placeholder.container():
                 st.info(f"⏳ Задача в очереди. ID: `{task_id}` (попытка {attempt+1}/{max_attempts})")
             
-            result_data, _ = get_prediction_result(token, task_id)
-            if result_data and result_data.get("status") == "completed":
+            result_data, _ = get_prediction_result(token, task_id, wait=RESULT_WAIT)
+            if result_data and result_data.get("status") in ("completed", "failed"):
                 st.session_state.current_result = result_data
                 st.session_state.waiting_for_result = False
                 st.rerun()
                 break
-            
-            time.sleep(1)
         
         # Если после всех попыток результат не получен
         if st.session_state.waiting_for_result:
@@ -300,8 +323,14 @@ def show_main_page():
 
     # Отображение результата, если он есть
     if st.session_state.current_result:
-        st.success("Результат получен:")
-        st.write(st.session_state.current_result.get("result", "Нет данных"))
+        if st.session_state.current_result.get("status") == "failed":
+            st.error(
+                "Не удалось выполнить задачу, средства возвращены на баланс: "
+                f"{st.session_state.current_result.get('error', 'неизвестная ошибка')}"
+            )
+        else:
+            st.success("Результат получен:")
+            st.write(st.session_state.current_result.get("result", "Нет данных"))
         if st.button("Очистить результат"):
             st.session_state.current_result = None
             st.rerun()